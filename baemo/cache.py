@@ -0,0 +1,210 @@
+"""
+baemo.cache
+~~~~~~~~~~~~~~~~~~~~~~~
+This module defines FindCache, a bounded LRU cache with entries that expire,
+used to read documents without querying the database, and IdFilter, a
+counting bloom filter of the ids of documents in a collection.
+"""
+
+import math
+import time
+import threading
+
+from collections import OrderedDict
+
+from .delimited import _mask
+from .delimited import _mix
+
+
+class FindCache(object):
+    """ A least recently used cache of raw documents with a time to live.
+
+    Entries are keyed by anything hashable and indexed by the id of the
+    document so every entry holding a document can be invalidated when it is
+    saved. Entries older than `ttl` seconds are dropped when read, the least
+    recently read entry is evicted when `max_entries` is reached. `hits`,
+    `misses`, `evictions` and `expirations` count what happened to reads and
+    entries since the cache was created or `clear`ed.
+    """
+
+    def __init__(self, max_entries=1024, ttl=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+
+        self.entries = OrderedDict()
+        self.ids = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def get(self, key, default=None):
+        """ return the value of key and mark it as recently read, default if
+        it is missing or expired """
+
+        with self._lock:
+            try:
+                value, id, expires = self.entries[key]
+            except KeyError:
+                self.misses += 1
+                return default
+
+            if expires is not None and expires <= time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return default
+
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, id=None):
+        """ set value for key, id is the id of the document in value """
+
+        expires = None
+        if self.ttl is not None:
+            expires = time.monotonic() + self.ttl
+
+        try:
+            hash(id)
+        except TypeError:
+            id = None
+
+        with self._lock:
+            if key in self.entries:
+                self._remove(key)
+
+            while self.entries and len(self.entries) >= self.max_entries:
+                self._remove(next(iter(self.entries)))
+                self.evictions += 1
+
+            if self.max_entries > 0:
+                self.entries[key] = (value, id, expires)
+                if id is not None:
+                    self.ids.setdefault(id, set()).add(key)
+
+    def invalidate(self, id):
+        """ remove every entry holding the document with id """
+
+        with self._lock:
+            for key in self.ids.pop(id, ()):
+                del self.entries[key]
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+            self.ids.clear()
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+            self.expirations = 0
+
+    def stats(self):
+        return {
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations
+        }
+
+    def _remove(self, key):
+        value, id, expires = self.entries.pop(key)
+        if id is not None:
+            keys = self.ids[id]
+            keys.discard(key)
+            if not keys:
+                del self.ids[id]
+
+
+class IdFilter(object):
+    """ A counting bloom filter of ids. An id that is not `in` the filter was
+    never added or was removed, an id that is may have been added, with a
+    false positive rate of about `error_rate` when `capacity` ids are added.
+
+    Each id sets `hashes` one byte counters so ids can be removed, counters
+    that reach 255 are never decremented again. Ids are hashed with `hash`,
+    filters are only valid in the process that built them. Ids that can not
+    be hashed are not added and are always `in` the filter.
+    """
+
+    def __init__(self, capacity=100000, error_rate=0.01):
+        capacity = max(1, capacity)
+        size = int(math.ceil(
+            -capacity * math.log(error_rate) / math.log(2) ** 2
+        ))
+
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = max(1, size)
+        self.hashes = max(1, int(round(self.size / capacity * math.log(2))))
+        self.counts = bytearray(self.size)
+
+        self._lock = threading.Lock()
+
+    def __contains__(self, id):
+
+        # ids that can not be hashed, such as queries, are never filtered
+        try:
+            positions = self._positions(id)
+        except TypeError:
+            return True
+
+        counts = self.counts
+        return all(counts[i] for i in positions)
+
+    def add(self, id):
+        try:
+            hash(id)
+        except TypeError:
+            return
+
+        with self._lock:
+            counts = self.counts
+            for i in self._positions(id):
+                if counts[i] < 255:
+                    counts[i] += 1
+
+    def update(self, ids):
+        for id in ids:
+            self.add(id)
+
+    def remove(self, id):
+        """ remove an id that was added, removing an id that was not added
+        may remove other ids """
+
+        try:
+            hash(id)
+        except TypeError:
+            return
+
+        if id not in self:
+            return
+
+        with self._lock:
+            counts = self.counts
+            for i in self._positions(id):
+                if counts[i] < 255:
+                    counts[i] -= 1
+
+    def clear(self):
+        with self._lock:
+            self.counts = bytearray(self.size)
+
+    def _positions(self, id):
+        """ return the counters of id by double hashing """
+
+        h1 = _mix(hash(id) & _mask)
+        h2 = _mix(h1 ^ 0x9e3779b97f4a7c15) | 1
+        size = self.size
+        return set((h1 + i * h2) % size for i in range(self.hashes))
@@ -1,11 +1,26 @@
 
+import bson
 import pymongo
 import copy
+import datetime
 
+
+from .delimited import DelimitedStr
 from .delimited import DelimitedDict
-from .connection import Connections
+from .entity import EntityMeta
+from .entity import Entities
 from .projection import Projection
+from .projection import CompiledProjection
 from .sort import Sort
+from .sort import CompiledSort
+from .raw import RawDocument
+from .driver import Operation
+from .driver import Driver
+from .driver import concurrently
+from .lookup import Lookup
+from .lookup import _value_key
+from .memo import DereferenceMemo
+from .session import Session
 from .exceptions import ModelTargetNotSet
 from .exceptions import DereferenceError
 from .exceptions import CollectionModelClassMismatch
@@ -23,6 +38,13 @@ class Collection(object):
 
     default_target = DelimitedDict()
 
+    # runs the database operations of find and save
+    driver = Driver()
+
+    # number of values found with one query when dereferencing references
+    # to this entity from a collection
+    dereference_batch_size = 1000
+
     def __init__(self, target=None):
 
         self.models = []
@@ -109,12 +131,12 @@ class Collection(object):
     # recall attributes
 
     def get_total_count(self):
-        connection = Connections.get(
-            self.__entity__["model"].connection,
-            self.__entity__["model"].collection
-        )
+        return self.driver.run(self._get_total_count())
 
-        return connection.count(self.target.collapse())
+    def _get_total_count(self):
+        return (yield Operation(self.__entity__["model"], "count", {
+            "filter": self.target.collapse()
+        }))
 
 
     def find(self,
@@ -128,6 +150,30 @@ class Collection(object):
              skip=None,
              default_skip=True,
              _as_reference=False):
+        return self.driver.run(self._find(
+            projection,
+            default_projection,
+            default_model_projection,
+            sort,
+            default_sort,
+            limit,
+            default_limit,
+            skip,
+            default_skip,
+            _as_reference
+        ))
+
+    def _find(self,
+              projection=None,
+              default_projection=True,
+              default_model_projection=False,
+              sort=None,
+              default_sort=True,
+              limit=None,
+              default_limit=True,
+              skip=None,
+              default_skip=True,
+              _as_reference=False):
 
         # if finding as a reference, update state of entity
         if _as_reference:
@@ -136,12 +182,6 @@ class Collection(object):
         if callable(getattr(self, "pre_find_hook", None)):
             self.pre_find_hook()
 
-        # determine connection
-        connection = Connections.get(
-            self.__entity__["model"].connection,
-            self.__entity__["model"].collection
-        )
-
         find_kwargs = {}
 
         # filter
@@ -149,28 +189,28 @@ class Collection(object):
             find_kwargs["filter"] = self.target.collapse()
 
         # determine total collection count
-        self.total_count = self.get_total_count()
+        self.total_count = yield from self._get_total_count()
 
         # projection
-        p = Projection()
+        p = CompiledProjection.compile()
         if projection is not None:
-            p.update(projection)
+            p = p.merge(projection)
         if self.find_projection and default_projection:
-            p.update(self.find_projection)
+            p = p.merge(self.find_projection)
         if default_model_projection:
-            model_default = self.__entity__["model"].find_projection.get()
+            model_default = self.__entity__["model"].find_projection
             if model_default:
-                p.update(model_default)
+                p = p.merge(model_default)
         flattened_projection = p.flatten()
         if flattened_projection:
             find_kwargs["projection"] = flattened_projection
 
         # sort
-        s = Sort()
+        s = CompiledSort.compile()
         if sort is not None:
-            s.update(sort)
+            s = s.merge(sort)
         if default_sort and self.sort:
-            s.update(self.sort)
+            s = s.merge(self.sort)
 
         find_kwargs["sort"] = s.flatten()
 
@@ -189,25 +229,326 @@ class Collection(object):
         if l is not None:
             find_kwargs["limit"] = l
 
+        # dereference references in the same query with $lookup
+        model_class = self.__entity__["model"]
+        lookups = None
+        if model_class.lookup and model_class.references and projection:
+            lookups = Lookup.compile(
+                model_class,
+                projection,
+                model_class.max_dereference_depth
+            )
+
+        if lookups:
+            collection = yield Operation(model_class, "aggregate", {
+                "pipeline": Lookup.pipeline(lookups, **find_kwargs)
+            })
+            found = [Lookup.pop(lookups, m) for m in collection]
+            models = self._hydrate(collection, None, p)
+            memo = DereferenceMemo(model_class.max_dereference_depth)
+            for model, documents in zip(models, found):
+                Lookup.place(model, lookups, documents, memo)
+            self.models.extend(models)
+
         # find
-        collection = connection.find(**find_kwargs)
+        else:
+            collection, codec_options = yield Operation(
+                model_class,
+                "find",
+                find_kwargs,
+                raw=DelimitedDict.container
+            )
+            models = self._hydrate(collection, codec_options, p)
+            self.models.extend(models)
+
+            # dereference nested models of every model found at once
+            if model_class.references and projection:
+                yield from self._dereference_entities(projection, models)
+
+        if callable(getattr(self, "post_find_hook", None)):
+            self.post_find_hook()
+
+        return self
+
+    def _hydrate(self, documents, codec_options, projection,
+                 as_reference=False):
+        """ return models of the documents found with projection, raw
+        documents decoded with codec_options unless it is None, found as
+        references when as_reference is True """
+
+        session = Session.current()
+
+        models = []
+        for m in documents:
+            if codec_options is not None:
+                m = RawDocument(m, codec_options)
 
-        for m in collection:
             model = self.__entity__["model"]()
+            if as_reference:
+                model._as_reference = True
             if callable(getattr(model, "pre_find_hook", None)):
                 model.pre_find_hook()
             model._post_find_hook(m)
             if callable(getattr(model, "post_find_hook", None)):
                 model.post_find_hook()
-            if model.references and projection:
-                model.dereference_entities(projection=projection)
-            self.models.append(model)
+            if session is not None:
+                session.add(model, projection)
+            models.append(model)
+
+        return models
+
+    def dereference_entities(self, projection):
+        return self.driver.run(self._dereference_entities(projection))
+
+    def _dereference_entities(self, projection, models=None, _memo=None):
+        """ dereference the references of models in projection, every model
+        in the collection when None. Each reference key is found with one
+        query for all models, referenced models found are dereferenced the
+        same way one level at a time """
+
+        # references are not dereferenced past the maximum depth or below a
+        # model referencing one of its ancestors
+        if _memo is None:
+            _memo = DereferenceMemo(
+                self.__entity__["model"].max_dereference_depth
+            )
 
-        if callable(getattr(self, "post_find_hook", None)):
-            self.post_find_hook()
+        if models is None:
+            models = self.models
+        models = [
+            m for m in models
+            if isinstance(m, EntityMeta) and _memo.descends(m)
+        ]
+
+        if not isinstance(projection, Projection):
+            projection = Projection(projection)
+
+        # independent references are found concurrently when the driver
+        # allows it and set in order
+        paths = []
+        operations = []
+        references = self.__entity__["model"].references.collapse()
+        for k, reference in references.items():
+            path = DelimitedDict.compile_path(k)
+            if path.has(projection):
+                paths.append(path)
+                operations.append(self._dereference_batch(
+                    models,
+                    path,
+                    reference,
+                    path(projection),
+                    _memo
+                ))
+
+        results = yield from concurrently(operations)
+        for path, (values, error) in zip(paths, results):
+            if error is not None:
+                raise error
+            for m, value in values:
+                path.set(m.attributes, value)
 
         return self
 
+    def _dereference_batch(self, models, path, reference, projection, memo):
+        """ return (model, value) pairs setting the reference at path of
+        models to the models found with projection, an int or a dict, in one
+        query per batch of distinct values. Local references find the values
+        at path, foreign references find the ids of models that have no value
+        at path. Values found with the same projection before in memo are not
+        found again """
+
+        entity = Entities.get(reference["entity"])
+        model_class = entity["model"]
+        collection_class = entity["collection"]
+        type_ = reference["type"]
+        many = type_ in ("local_many", "foreign_many")
+        local = type_ in ("local_one", "local_many")
+
+        if "foreign_key" in reference:
+            foreign_key = reference["foreign_key"]
+        else:
+            foreign_key = model_class.id_attribute
+        foreign_key_path = DelimitedDict.compile_path(foreign_key)
+        source_path = DelimitedDict.compile_path(model_class.id_attribute)
+
+        if type(projection) is not dict:
+            projection = None
+
+        # distinct values of every model
+        values = {}
+        parents = []
+        for m in models:
+            value = path(m.attributes, None)
+            if local and value:
+                targets = value if type_ == "local_many" else [value]
+            elif not local and not value:
+                value = source_path(m.attributes, None)
+                targets = [value]
+            else:
+                continue
+
+            parents.append((m, value, targets))
+            for v in targets:
+                values.setdefault(_value_key(v), v)
+
+        if not parents:
+            return []
+
+        # models of values found before are reused
+        reused = []
+        reused_identities = set()
+        targets = []
+        for v in values.values():
+            memo_models = memo.get(
+                memo.key(model_class, foreign_key, v, projection)
+            )
+            if memo_models is None:
+                targets.append(v)
+                continue
+            for f in memo_models:
+                identity = memo.identity(f)
+                if identity not in reused_identities:
+                    reused_identities.add(identity)
+                    reused.append(f)
+        new_values = targets
+
+        # ids missing from the id filter are not queried
+        id_filter = model_class.get_id_filter()
+        if id_filter is not None and foreign_key == model_class.id_attribute:
+            targets = [v for v in targets if v in id_filter]
+
+        # find projection of the referenced model, or collection for many
+        p = CompiledProjection.compile()
+        if projection is not None:
+            p = p.merge(projection)
+        if many:
+            if collection_class.find_projection:
+                p = p.merge(collection_class.find_projection)
+        elif model_class.find_projection:
+            p = p.merge(model_class.find_projection)
+        flattened_projection = p.flatten()
+
+        # models found are matched to values by foreign key
+        if p.type == "inclusive":
+            flattened_projection[foreign_key] = 1
+
+        found = collection_class()
+        found.models.extend(reused)
+        reused_ids = set(id(f) for f in reused)
+        size = collection_class.dereference_batch_size
+        for i in range(0, len(targets), size):
+            find_kwargs = {
+                "filter": {foreign_key: {"$in": targets[i:i + size]}}
+            }
+            if flattened_projection:
+                find_kwargs["projection"] = flattened_projection
+            documents, codec_options = yield Operation(
+                model_class,
+                "find",
+                find_kwargs,
+                raw=DelimitedDict.container
+            )
+            found.models.extend(
+                f for f in found._hydrate(documents, codec_options, p, True)
+                if memo.identity(f) not in reused_identities
+            )
+
+        if many and collection_class.sort:
+            found.sort_models(collection_class.sort)
+
+        # models found by value, foreign keys holding arrays match each value
+        by_value = {}
+        keys = []
+        for m in found:
+            value = foreign_key_path(m.attributes, None)
+            m_keys = set(
+                _value_key(v) for v in
+                (value if type(value) is list else [value])
+            )
+            keys.append(m_keys)
+            for k in m_keys:
+                by_value.setdefault(k, []).append(m)
+
+        # models found are below the first model referencing them
+        for m, value, m_targets in parents:
+            for v in m_targets:
+                for f in by_value.get(_value_key(v), ()):
+                    memo.add(m, f)
+
+        # dereference the next level of every model found at once
+        nested = bool(model_class.references and projection)
+        if nested:
+            yield from found._dereference_entities(
+                projection,
+                [f for f in found if id(f) not in reused_ids],
+                memo
+            )
+
+        # remember the models found by value, unless one of them was stopped
+        # before its references were dereferenced
+        for v in new_values:
+            memo_models = by_value.get(_value_key(v), [])
+            if not nested or all(memo.descends(f) for f in memo_models):
+                memo.set(
+                    memo.key(model_class, foreign_key, v, projection),
+                    memo_models
+                )
+
+        values = []
+        for m, value, targets in parents:
+
+            # one
+            if not many:
+                try:
+                    values.append((m, by_value[_value_key(value)][0]))
+
+                # dereference error
+                except KeyError:
+                    if local:
+                        values.append((m, DereferenceError(data={
+                            "model": model_class.__name__,
+                            "t": value
+                        })))
+                    else:
+                        values.append((m, None))
+                continue
+
+            # many, in the order found
+            target_keys = set(_value_key(v) for v in targets)
+            collection = collection_class().set_target(
+                value,
+                key=foreign_key
+            )
+            collection._as_reference = True
+            if callable(getattr(collection, "pre_find_hook", None)):
+                collection.pre_find_hook()
+            collection.models.extend(
+                f for f, f_keys in zip(found, keys)
+                if not f_keys.isdisjoint(target_keys)
+            )
+            collection.total_count = len(collection.models)
+
+            if collection_class.skip is not None:
+                collection.models = collection.models[collection_class.skip:]
+            if collection_class.limit is not None:
+                collection.models = collection.models[:collection_class.limit]
+
+            # determine dereference errors
+            if local:
+                for model_target in value:
+                    if _value_key(model_target) not in by_value:
+                        collection.add(DereferenceError(data={
+                            "model": collection_class.__name__,
+                            "target": model_target
+                        }))
+
+            if callable(getattr(collection, "post_find_hook", None)):
+                collection.post_find_hook()
+
+            values.append((m, collection))
+
+        return values
+
     # view attributes
 
     def ref(self, *args, **kwargs):
@@ -221,16 +562,11 @@ class Collection(object):
     def get(self, *args, projection=None, default=True,
             model_default=False, setup=False):
 
-        p = Projection()
+        p = CompiledProjection.compile()
         if default and self.get_projection:
-            p.merge(self.get_projection)
+            p = p.merge(self.get_projection)
         if projection:
-            if type(projection) is not Projection:
-                projection = Projection(projection)
-            p.merge(projection)
-
-        elif not projection and self.get_projection and default:
-            projection = self.get_projection
+            p = p.merge(projection)
 
         data = []
         for m in self:
@@ -287,11 +623,15 @@ class Collection(object):
     # persist updates
 
     def save(self, cascade=True):
+        return self.driver.run(self._save(cascade))
+
+    def _save(self, cascade=True):
 
         if callable(getattr(self, "pre_modify_hook", None)):
             self.pre_modify_hook()
 
         requests = []
+        updated = set()
 
         for m in self:
 
@@ -306,18 +646,30 @@ class Collection(object):
                 requests.append(pymongo.DeleteOne(m.target.get()))
 
                 if cascade:
-                    m.reference_entities(m.attributes, cascade)
+                    yield from m._reference_entities(m.attributes, cascade)
 
-            # update
-            elif m.target and m.updates:
+            # update, computed from the document when updates are not
+            # recorded, which also saves nested models
+            elif m.target and (m.updates or not m.record_updates):
+
+                updates = m.updates
+                if not m.record_updates:
+                    updates = yield from m._diff(cascade=cascade)
+                    if not updates:
+                        continue
 
                 if callable(getattr(m, "pre_update_hook", None)):
                     m.pre_update_hook()
 
-                requests.append(pymongo.UpdateOne(
-                                    m.target.get(),
-                                    m.flatten_updates(cascade=cascade))
-                                )
+                    # the hook may have changed the document
+                    if not m.record_updates:
+                        updates = yield from m._diff()
+
+                if m.record_updates:
+                    updates = yield from m._flatten_updates(cascade=cascade)
+
+                requests.append(pymongo.UpdateOne(m.target.get(), updates))
+                updated.add(id(m))
 
             # insert
             elif not m.target:
@@ -326,42 +678,50 @@ class Collection(object):
                     m.pre_insert_hook()
 
                 requests.append(pymongo.InsertOne(
-                                    m.reference_entities(
+                                    (yield from m._reference_entities(
                                         m.attributes,
                                         cascade=cascade
-                                    )
+                                    ))
                                 ))
 
             elif cascade:
-                m.reference_entities(
+                yield from m._reference_entities(
                     m.attributes,
                     cascade=cascade
                 )
 
         # execute requests with bulk write
         if requests:
-            connection = Connections.get(
-                self.__entity__["model"].connection,
-                self.__entity__["model"].collection
-            )
-            connection.bulk_write(requests)
+            yield Operation(self.__entity__["model"], "bulk_write", {
+                "requests": requests
+            })
+
+        session = Session.current()
+        cache = self.__entity__["model"].get_find_cache()
 
         for m in self:
 
+            # saved models are no longer valid in the find cache
+            if cache is not None and m.target:
+                cache.invalidate(m.get_id())
+
             # delete
             if m._delete and m.target:
+                if session is not None:
+                    session.evict(m)
                 if callable(getattr(m, "post_delete_hook", None)):
                     m.post_delete_hook()
 
             # update
-            elif m.target:
+            elif id(m) in updated:
                 m._post_update_hook()
                 if callable(getattr(m, "post_update_hook", None)):
                     m.post_update_hook()
 
             # insert
-            else:
+            elif not m.target:
                 m._post_insert_hook()
+                m._post_insert_cache_hook()
                 if callable(getattr(m, "post_insert_hook", None)):
                     m.post_insert_hook()
 
@@ -374,7 +734,7 @@ class Collection(object):
 
     def add(self, m):
         if type(m) is self.__entity__["model"].id_type:
-            m = self.__entity__["model"](m).find()
+            m = self.driver.run(self.__entity__["model"](m)._find())
 
         if type(m) in [self.__entity__["model"], DereferenceError]:
             self.models.append(m)
@@ -386,3 +746,84 @@ class Collection(object):
             raise CollectionModelNotPresent
         else:
             self.models.remove(m)
+
+    def sort_models(self, sort):
+        """ sort models in place by sort, a Sort or anything Collection.find
+        accepts as sort, without querying the database. Values are read once
+        per model and keys inside nested models are followed. Missing values
+        sort before every other value, values of different types sort in
+        MongoDB's type order and models with equal values keep their order.
+        Sort operators such as $natural are ignored. """
+
+        fields = [
+            (DelimitedStr(k).keys, v)
+            for k, v in CompiledSort.compile(sort).flatten()
+            if v in [-1, 1]
+        ]
+
+        vectors = [
+            tuple(self._sort_key(self._sort_value(m, keys))
+                  for keys, direction in fields)
+            for m in self.models
+        ]
+
+        # stable sort by each field from the last to the first
+        order = list(range(len(self.models)))
+        for i in reversed(range(len(fields))):
+            order.sort(key=lambda j: vectors[j][i], reverse=fields[i][1] == -1)
+
+        self.models = [self.models[j] for j in order]
+        return self
+
+    @classmethod
+    def _sort_value(cls, m, keys):
+        """ return the value of model m at keys, None if it is missing """
+
+        value = m
+        for needle in keys:
+            if isinstance(value, EntityMeta):
+                value = getattr(value, "attributes", None)
+                if value is None:
+                    return None
+                value = value.__dict__
+
+            if not isinstance(value, dict) or needle not in value:
+                return None
+            value = value[needle]
+
+        if isinstance(value, BaseException):
+            return None
+        return value
+
+    @classmethod
+    def _sort_key(cls, value):
+        """ return a key for value that orders values of different types the
+        way MongoDB does, values of types that cannot be ordered compare
+        equal to each other. NaN sorts before other numbers and datetimes are
+        compared in UTC, naive ones being UTC as pymongo returns them """
+
+        if value is None:
+            return (0,)
+        elif type(value) is bool:
+            return (7, value)
+        elif isinstance(value, (int, float)):
+            if value != value:
+                return (1, 0)
+            return (1, 1, value)
+        elif isinstance(value, str):
+            return (2, value)
+        elif isinstance(value, dict):
+            return (3,)
+        elif isinstance(value, list):
+            return (4,)
+        elif isinstance(value, bytes):
+            return (5, value)
+        elif isinstance(value, bson.ObjectId):
+            return (6, value)
+        elif isinstance(value, datetime.datetime):
+            offset = value.utcoffset()
+            if offset is not None:
+                value = (value - offset).replace(tzinfo=None)
+            return (8, value)
+        return (9,)
+
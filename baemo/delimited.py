@@ -7,54 +7,136 @@ using delimited notation.
 """
 
 import copy
+import threading
+import weakref
 
+from collections import Mapping
 from collections import MutableMapping
 from collections import OrderedDict
 
 
+# marks a missing value where None is a valid one
+_missing = object()
+
+_mask = (1 << 64) - 1
+
+
+def _mix(x):
+    """ splitmix64 finalizer, spreads the bits of a 64 bit integer """
+    x = (x ^ (x >> 30)) * 0xbf58476d1ce4e5b9 & _mask
+    x = (x ^ (x >> 27)) * 0x94d049bb133111eb & _mask
+    return x ^ (x >> 31)
+
+
 class DelimitedStr(object):
     """ Emulates a string and handles delimited strings. Allows for accessing
-    and modifying parts of the string by index or slice.
+    parts of the string by index or slice.
+
+    Instances are immutable and backed by a tuple of keys. Parsed strings are
+    interned in a bounded cache keyed by (string, delimiter) so repeated
+    lookups of the same key path do not split the string again. Slicing
+    returns a DelimitedStr built from the sliced tuple without joining and
+    re-splitting, and slices are memoized on the instance they were taken
+    from.
     """
 
-    delimiter = "."
+    __slots__ = ("keys", "delimiter", "_string", "_hash", "_slices")
+
+    default_delimiter = "."
 
-    def __init__(self, string=None, delimiter=None):
-        self.keys = []
-        if delimiter is not None:
-            self.delimiter = delimiter
-        if string is not None:
-            self.__call__(string)
+    # interned instances keyed by (string, delimiter), entries are only read
+    # without the lock, evicting and adding them holds it
+    cache = OrderedDict()
+    cache_size = 4096
+    _lock = threading.Lock()
+
+    def __new__(cls, string=None, delimiter=None):
+        if delimiter is None:
+            delimiter = cls.default_delimiter
 
-    def __call__(self, string=None):
         if string is None:
-            self.keys = []
-        else:
-            self.keys = string.split(self.delimiter)
+            return cls._from_keys((), delimiter)
+
+        if type(string) is cls:
+            if string.delimiter == delimiter:
+                return string
+            string = str(string)
+
+        cache_key = (string, delimiter)
+        try:
+            return cls.cache[cache_key]
+        except KeyError:
+            pass
+
+        new = cls._from_keys(tuple(string.split(delimiter)), delimiter, string)
+
+        with cls._lock:
+            while len(cls.cache) >= cls.cache_size:
+                cls.cache.popitem(last=False)
+            cls.cache[cache_key] = new
+
+        return new
+
+    @classmethod
+    def _from_keys(cls, keys, delimiter, string=None):
+        new = object.__new__(cls)
+        object.__setattr__(new, "keys", keys)
+        object.__setattr__(new, "delimiter", delimiter)
+        object.__setattr__(new, "_string", string)
+        object.__setattr__(new, "_hash", None)
+        object.__setattr__(new, "_slices", None)
+        return new
+
+    def __setattr__(self, name, value):
+        raise AttributeError("{} is immutable".format(type(self).__name__))
+
+    def __delattr__(self, name):
+        raise AttributeError("{} is immutable".format(type(self).__name__))
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return (self.__class__, (str(self), self.delimiter))
 
     def __eq__(self, other):
-        if isinstance(other, self.__class__):
-            return self.keys == other.keys
+        if type(other) is str:
+            return str(self) == other
+        if isinstance(other, DelimitedStr):
+            return self.keys == other.keys and \
+                self.delimiter == other.delimiter
         return False
 
     def __ne__(self, other):
         return not self.__eq__(other)
 
     def __hash__(self):
-        return hash((self.delimiter, str(self.keys)))
+        if self._hash is None:
+            object.__setattr__(self, "_hash", hash(str(self)))
+        return self._hash
 
     def __len__(self):
         return len(self.keys)
 
     def __bool__(self):
-        return bool(len(self.keys))
+        return bool(self.keys)
 
     def __str__(self):
-        return self.delimiter.join(self.keys)
+        if self._string is None:
+            object.__setattr__(self, "_string", self.delimiter.join(self.keys))
+        return self._string
+
+    def __repr__(self):
+        return "{}({!r})".format(type(self).__name__, str(self))
+
+    def __format__(self, format_spec):
+        return format(str(self), format_spec)
 
     def __iter__(self):
-        for k in self.keys:
-            yield k
+        return iter(self.keys)
 
     def __reversed__(self):
         return reversed(self.keys)
@@ -63,39 +145,219 @@ class DelimitedStr(object):
         return value in self.keys
 
     def __getitem__(self, index):
-        value = self.keys[index]
-        if type(value) is list:
-            value = self.delimiter.join(value)
+        if type(index) is not slice:
+            return self.keys[index]
+
+        slice_key = (index.start, index.stop, index.step)
+        if self._slices is None:
+            object.__setattr__(self, "_slices", {})
+        elif slice_key in self._slices:
+            return self._slices[slice_key]
+
+        value = self._from_keys(self.keys[index], self.delimiter)
+        self._slices[slice_key] = value
         return value
 
-    def __setitem__(self, index, value):
-        self.keys[index] = value
 
-    def __delitem__(self, index):
-        del self.keys[index]
+class DelimitedPath(object):
+    """ A delimited key compiled for repeated access to nested data, similar
+    to `operator.itemgetter`. The key is parsed once and every call walks the
+    data directly. Calls that fall off the fast path, missing keys or values
+    that are not containers, are resolved the same way `DelimitedDict.ref`,
+    `set` and `unset` resolve them so results and errors match.
+
+    Calling a path only reads, containers it returns from a copy-on-write
+    DelimitedDict may be shared with other copies and must not be modified.
+    `set` and `delete` go through the DelimitedDict when it shares containers.
+
+    Instances are created with `DelimitedDict.compile_path`.
+    """
+
+    __slots__ = ("key", "keys", "parents", "needle", "owner")
+
+    # compiled paths keyed by (DelimitedDict class, key)
+    cache = OrderedDict()
+    cache_size = 4096
+    _lock = threading.Lock()
+
+    def __init__(self, key, owner=None):
+        key = DelimitedStr(key)
+
+        self.key = key
+        self.keys = tuple(k for k in key.keys if k)
+        self.parents = tuple(k for k in key.keys[:-1] if k)
+        self.needle = key.keys[-1] if key.keys else None
+        self.owner = owner if owner is not None else DelimitedDict
+
+    def __repr__(self):
+        return "{}({!r})".format(type(self).__name__, str(self.key))
+
+    def __call__(self, data, *args):
+        """ return reference to value at path in data, or default if passed
+        and path is not found """
+
+        root = data.__dict__ if isinstance(data, DelimitedDict) else data
+        haystack = root
+
+        try:
+            for needle in self.keys:
+                haystack = haystack[needle]
+            return haystack
+        except (KeyError, TypeError, IndexError):
+            pass
+
+        return self.owner._ref(
+            root,
+            self.key,
+            False,
+            bool(args),
+            args[0] if args else None
+        )
+
+    def has(self, data):
+        if not self.keys:
+            return bool(data)
+        try:
+            self.__call__(data)
+            return True
+        except (KeyError, TypeError):
+            return False
+
+    def set(self, data, value, create=True):
+        if isinstance(data, DelimitedDict):
+            if data._shared or data._index is not None or \
+                    data._root is not None:
+                return data.set(self.key, value, create=create)
+            data._collapsed = None
+            root = data.__dict__
+        else:
+            root = data
+        haystack = root
+
+        try:
+            for needle in self.parents:
+                haystack = haystack[needle]
+        except (KeyError, TypeError, IndexError):
+            haystack = None
+
+        if not isinstance(haystack, self.owner.container):
+            haystack = self.owner._ref(root, self.key[:-1], create, False, None)
+
+        if not create and self.needle not in haystack:
+            raise KeyError(self.owner._format_keyerror(self.needle, self.key))
+
+        haystack[self.needle] = value
+        return True
+
+    def delete(self, data):
+        if isinstance(data, DelimitedDict):
+            if data._shared or data._index is not None or \
+                    data._root is not None:
+                return data.unset(self.key)
+            data._collapsed = None
+            root = data.__dict__
+        else:
+            root = data
+        haystack = root
+
+        try:
+            for needle in self.parents:
+                haystack = haystack[needle]
+        except (KeyError, TypeError, IndexError):
+            haystack = None
+
+        if not isinstance(haystack, self.owner.container):
+            haystack = self.owner._ref(root, self.key[:-1], False, False, None)
+
+        if self.needle not in haystack:
+            raise KeyError(self.owner._format_keyerror(self.needle, self.key))
+
+        del haystack[self.needle]
+        return True
 
 
 class DelimitedDict(MutableMapping):
     """ Emulates a dict and handles data with keys that are delimited strings.
     Allows for accessing and modifying nested data by delimited string.
+
+    The result of `collapse` is cached until the data is changed through
+    `__call__`, `set`, `push`, `pull`, `unset`, `update`, `set_many`,
+    `unset_many`, a compiled path or a `spawn`ed instance, or a container is
+    returned by `ref` and may be written to. Reading values that are not
+    containers with `ref` keeps the cache. Changes made directly to
+    containers shared with `copy.copy` instances are not seen by the cache.
+
+    When `copy_on_write` is True, `clone`, `merge` and `copy.deepcopy` share
+    nested containers instead of copying them. Shared containers are copied
+    along the written path the first time either side writes to them through
+    `ref`, `set`, `push`, `pull`, `unset`, `update`, `set_many` or
+    `unset_many`, so neither side sees the other's writes. Containers
+    returned by `get` are always private.
+
+    The index keeps a leaf count and a fingerprint for every nested
+    container. It is built on first use by `fingerprint`, `__hash__` or, when
+    `indexed` is True, `count`. Once built it is kept up to date by `set`,
+    `push`, `pull`, `unset`, `set_many`, `unset_many` and compiled paths, and
+    rebuilt after any other change the collapse cache would miss. Once
+    containers can be written without going through this instance, after
+    `ref` returns one, `spawn`, `copy.copy` or passing the instance to
+    another, the index is rebuilt every time it is read and `__eq__` compares
+    the data. Otherwise data with different fingerprints is unequal without
+    being compared.
     """
 
+    __slots__ = (
+        "__dict__", "__weakref__", "_shared", "_collapsed", "_index", "_root",
+        "_exposed"
+    )
+
     container = dict
 
+    # share nested containers between copies until one side writes to them
+    copy_on_write = False
+
+    # keep leaf counts per container for count, built on first use
+    indexed = False
+
     def __init__(self, data=None, expand=True):
         super().__init__()
+        self._shared = None
+        self._collapsed = None
+        self._index = None
+        self._root = None
+        self._exposed = False
         self.__call__(data=data, expand=expand)
 
     def __call__(self, data=None, expand=True):
+        self._collapsed = None
+        self._index = None
+        self._root = None
+        self._exposed = False
+
         if data is None:
             self.__dict__ = self.container()
+            self._shared = None
 
         elif isinstance(data, self.__class__):
             self.__dict__ = data.__dict__
+            self._shared = data._shared
+            self._exposed = data._exposed = True
 
         elif isinstance(data, self.container):
+            self._shared = None
+
+            # data without delimited keys is copied without expanding keys,
+            # copy on write shares its containers, such as the result of
+            # merge, until they are written
             if expand:
-                data = self._expand_delimited_notation(data)
+                if type(data) is not self.container or \
+                        self._has_delimited_keys(data):
+                    data = self._expand_delimited_notation(data)
+                elif self.copy_on_write:
+                    data = self._share(data)
+                    self._exposed = True
+                else:
+                    data = self._copy_containers(data)
             self.__dict__ = data
 
         else:
@@ -109,6 +371,10 @@ class DelimitedDict(MutableMapping):
 
     def __eq__(self, other):
         if isinstance(other, self.__class__):
+            if self.__dict__ is other.__dict__:
+                return True
+            if self.fingerprints_differ(other):
+                return False
             return self.__dict__ == other.__dict__
         return False
 
@@ -116,7 +382,7 @@ class DelimitedDict(MutableMapping):
         return not self.__eq__(other)
 
     def __hash__(self):
-        return hash(str(self.__dict__))
+        return self.fingerprint()
 
     def __bool__(self):
         return bool(self.__dict__)
@@ -148,9 +414,12 @@ class DelimitedDict(MutableMapping):
     def __copy__(self):
         new = self.__class__()
         new.__dict__.update(self.__dict__)
+        self._exposed = new._exposed = True
         return new
 
     def __deepcopy__(self, memo):
+        if self.copy_on_write:
+            return self.clone()
         new = self.__class__()
         new.__dict__.update(copy.deepcopy(self.__dict__))
         return new
@@ -176,69 +445,95 @@ class DelimitedDict(MutableMapping):
 
         if len(args) < 2:
             use_default_value = False
+            default_value = None
         else:
             use_default_value = True
             default_value = args[1]
 
-        haystack = self.__dict__
-
-        if type(key) is not DelimitedStr:
-            key = DelimitedStr(key)
-
-        for i, needle in enumerate(key, 1):
-
-            if needle:
-
-                if needle not in haystack:
-                    if create:
-                        haystack[needle] = self.container()
-
-                    else:
-                        if use_default_value:
-                            return default_value
-                        else:
-                            message = self._format_keyerror(needle, key)
-                            raise KeyError(message)
-
-                if i < len(key) and \
-                        not isinstance(haystack[needle], self.container):
-                    if create:
-                        haystack[needle] = self.container()
-
-                    else:
-                        if use_default_value:
-                            return default_value
-                        else:
-                            message = self._format_typeerror(needle, key, haystack[needle])
-                            raise TypeError(message)
-
-                if create and not isinstance(haystack[needle], self.container):
-                    haystack[needle] = self.container()
-
-                haystack = haystack[needle]
-
-        return haystack
+        # values that are not containers can not be written through
+        value = _missing
+        if not create:
+            value = self._ref(
+                self.__dict__,
+                key,
+                False,
+                use_default_value,
+                default_value
+            )
+            if type(value) in self._immutable_types:
+                return value
+
+        # references can be written to, copy shared containers first and
+        # drop the caches that would miss writes
+        if self._shared:
+            self._unshare(key, deep=True)
+            value = _missing
+        self._invalidate()
+        self._exposed = True
+
+        if value is _missing:
+            value = self._ref(
+                self.__dict__,
+                key,
+                create,
+                use_default_value,
+                default_value
+            )
+        return value
 
     def get(self, *args):
-        return copy.deepcopy(self.ref(*args))
+        if len(args) < 2:
+            value = self._ref(self.__dict__, args[0] if args else None,
+                              False, False, None)
+        else:
+            value = self._ref(self.__dict__, args[0], False, True, args[1])
+
+        if self.copy_on_write:
+            return self._copy_tree(value)
+        return copy.deepcopy(value)
 
     def has(self, key=None):
         """ Returns True if object has key, else False
         Returun False if no key specified and object.__dict__ is empty """
         try:
-            r = self.ref(key)
+            r = self._ref(self.__dict__, key, False, False, None)
             return False if key is None and not r else True
         except:
             return False
 
-    def spawn(self, *args, **kwargs):
+    def spawn(self, *args, create=False):
         """ create another instance whos __dict__ is a reference to this
-        instances __dict__, doppelganger instance """
-        return self.__class__(self.ref(*args, **kwargs), expand=False)
+        instances __dict__, doppelganger instance. Writes through the new
+        instance drop the caches of this one """
+
+        key = args[0] if args else None
+        if self._shared:
+            self._unshare(key, deep=True)
+        if create:
+            self._invalidate()
+
+        new = self.__class__(self._ref(
+            self.__dict__,
+            key,
+            create,
+            len(args) > 1,
+            args[1] if len(args) > 1 else None
+        ), expand=False)
+        new._root = weakref.ref(self)
+        self._exposed = new._exposed = True
+        return new
 
     def clone(self, key=None):
         """ create another instance whos __dict__ is a copy of this
         instances __dict__ """
+
+        if self.copy_on_write:
+            node = self._ref(self.__dict__, key, False, False, None)
+            if type(node) is self.container:
+                new = self.__class__(self._share(node), expand=False)
+                new._shared = set(map(id, self._children(new.__dict__)))
+                return new
+
         return self.__class__(self.get(key), expand=False)
 
     def set(self, key, value, create=True):
@@ -246,7 +541,13 @@ class DelimitedDict(MutableMapping):
         if type(key) is not DelimitedStr:
             key = DelimitedStr(key)
 
-        haystack = self.ref(key[:-1], create=create)
+        self._collapsed = None
+        self._invalidate_root()
+
+        if self._shared:
+            self._unshare(key[:-1])
+
+        haystack = self._ref(self.__dict__, key[:-1], create, False, None)
         needle = key[-1]
 
         if needle not in haystack:
@@ -256,6 +557,10 @@ class DelimitedDict(MutableMapping):
                 raise KeyError(self._format_keyerror(needle, key))
 
         haystack[needle] = value
+
+        if self._index is not None:
+            self._reindex(key)
+
         return True
 
     def push(self, key, value, create=True):
@@ -263,7 +568,13 @@ class DelimitedDict(MutableMapping):
         if type(key) is not DelimitedStr:
             key = DelimitedStr(key)
 
-        haystack = self.ref(key[:-1], create=create)
+        self._collapsed = None
+        self._invalidate_root()
+
+        if self._shared:
+            self._unshare(key)
+
+        haystack = self._ref(self.__dict__, key[:-1], create, False, None)
         needle = key[-1]
 
         if needle not in haystack:
@@ -280,6 +591,10 @@ class DelimitedDict(MutableMapping):
                 raise TypeError(message)
 
         haystack[needle].append(value)
+
+        if self._index is not None:
+            self._reindex(key)
+
         return True
 
     def pull(self, key, value, cleanup=False):
@@ -287,7 +602,13 @@ class DelimitedDict(MutableMapping):
         if type(key) is not DelimitedStr:
             key = DelimitedStr(key)
 
-        haystack = self.ref(key[:-1])
+        self._collapsed = None
+        self._invalidate_root()
+
+        if self._shared:
+            self._unshare(key)
+
+        haystack = self._ref(self.__dict__, key[:-1], False, False, None)
         needle = key[-1]
 
         if needle not in haystack:
@@ -308,6 +629,9 @@ class DelimitedDict(MutableMapping):
             if haystack[needle] == []:
                 del haystack[needle]
 
+        if self._index is not None:
+            self._reindex(key)
+
         return True
 
     def unset(self, key, cleanup=False):
@@ -315,7 +639,13 @@ class DelimitedDict(MutableMapping):
         if type(key) is not DelimitedStr:
             key = DelimitedStr(key)
 
-        haystack = self.ref(key[:-1])
+        self._collapsed = None
+        self._invalidate_root()
+
+        if self._shared:
+            self._unshare(key[:-1])
+
+        haystack = self._ref(self.__dict__, key[:-1], False, False, None)
         needle = key[-1]
 
         if needle not in haystack:
@@ -323,12 +653,74 @@ class DelimitedDict(MutableMapping):
 
         del haystack[needle]
 
+        # remove ancestors left empty, deepest first
         if cleanup:
-            for i, needle in enumerate(key, 1):
-                if i < len(key):
-                    cleanup_key = key[:(len(key) - i)]
-                    if self.has(cleanup_key) and self.get(cleanup_key) == self.container():
-                        self.unset(cleanup_key)
+            ancestors = []
+            haystack = self.__dict__
+            for needle in key.keys[:-1]:
+                if needle:
+                    ancestors.append((haystack, needle))
+                    haystack = haystack[needle]
+
+            for haystack, needle in reversed(ancestors):
+                if haystack[needle]:
+                    break
+                del haystack[needle]
+
+        if self._index is not None:
+            self._reindex(key)
+
+        return True
+
+    def set_many(self, data, create=True):
+        """ set every delimited key in data to its value, keys are grouped by
+        shared prefix so each parent container is walked once """
+
+        items = self._group_items(data.items())
+        self._collapsed = None
+        self._invalidate_root()
+
+        stack = [(None, self.__dict__, False)]
+        for key, parents, needle, value in items:
+            haystack = self._descend(stack, key, parents, create)
+
+            if needle not in haystack and not create:
+                key = DelimitedStr(key)
+                raise KeyError(self._format_keyerror(needle, key))
+
+            haystack[needle] = value
+
+            if self._index is not None:
+                self._reindex(key, parents, needle)
+
+        return True
+
+    def unset_many(self, keys, cleanup=False):
+        """ unset every delimited key in keys, keys are grouped by shared
+        prefix so each parent container is walked once """
+
+        items = self._group_items((key, None) for key in keys)
+        self._collapsed = None
+        self._invalidate_root()
+
+        stack = [(None, self.__dict__, False)]
+        for key, parents, needle, _ in items:
+            haystack = self._descend(stack, key, parents, False)
+
+            if needle not in haystack:
+                key = DelimitedStr(key)
+                raise KeyError(self._format_keyerror(needle, key))
+
+            del haystack[needle]
+
+            # remove ancestors left empty, deepest first
+            if cleanup:
+                while len(stack) > 1 and not stack[-1][1]:
+                    empty = stack.pop()[0]
+                    del stack[-1][1][empty]
+
+            if self._index is not None:
+                self._reindex(key, parents, needle)
 
         return True
 
@@ -341,14 +733,608 @@ class DelimitedDict(MutableMapping):
         elif isinstance(data, self.container):
             data = self._expand_delimited_notation(data)
 
+        if self.copy_on_write:
+            return self._merge_shared(data, self.__dict__, self._share())
+
         return self._merge(data, copy.deepcopy(self.__dict__))
 
     def update(self, data):
-        self.__dict__ = self.merge(data)
+        self._invalidate()
+
+        if self.copy_on_write:
+
+            if isinstance(data, self.__class__):
+                data = data.__dict__
+
+            elif isinstance(data, self.container):
+                data = self._expand_delimited_notation(data)
+
+            # containers copied along merged paths keep sharing their
+            # children with clones, they are marked so writes copy them
+            self.__dict__ = self._merge_shared(
+                data,
+                self.__dict__,
+                self._share()
+            )
+
+        else:
+            self.__dict__ = self.merge(data)
+
         return self.__dict__
 
+    def diff(self, data):
+        """ return the $set and $unset operators, with delimited keys, that
+        change this instance's data into data. Containers that are the same
+        object on both sides are skipped, changed containers are compared key
+        by key so only changed values are set """
+
+        if isinstance(data, DelimitedDict):
+            data = data.__dict__
+
+        elif isinstance(data, self.container):
+            if self._has_delimited_keys(data):
+                data = self._expand_delimited_notation(data)
+
+        else:
+            raise TypeError(self._format_typeerror(
+                data,
+                "data",
+                self.__class__.__name__
+            ))
+
+        container = self.container
+        set_ = container()
+        unset = container()
+        stack = [(iter(data.items()), self.__dict__, data, None)]
+
+        while stack:
+            items, d1, d2, parent_key = stack[-1]
+
+            for key, val in items:
+                old = d1.get(key, _missing)
+                if old is val:
+                    continue
+
+                new_key = "{}.{}".format(parent_key, key) \
+                    if parent_key else key
+
+                if type(old) is container and type(val) is container and \
+                        old and val:
+                    stack.append((iter(val.items()), old, val, new_key))
+                    break
+
+                if type(old) is not type(val) or old != val:
+                    set_[new_key] = val
+
+            else:
+                stack.pop()
+                for key in d1:
+                    if key not in d2:
+                        new_key = "{}.{}".format(parent_key, key) \
+                            if parent_key else key
+                        unset[new_key] = ""
+
+        updates = container()
+        if set_:
+            updates["$set"] = set_
+        if unset:
+            updates["$unset"] = unset
+        return updates
+
     def collapse(self):
-        return self._collapse_delimited_notation(self.__dict__)
+        if self._collapsed is None:
+            self._collapsed = self._collapse_delimited_notation(self.__dict__)
+        return self._collapsed.__class__(self._collapsed)
+
+    def iter_collapsed(self):
+        """ yield (delimited key, value) pairs of collapse without building
+        the collapsed container """
+        return self._iter_collapsed_delimited_notation(self.__dict__)
+
+    def iter_items(self, prefix=None):
+        """ yield (delimited key, value) pairs of collapse for prefix and the
+        keys under it, only the data under prefix is visited """
+
+        if type(prefix) is not DelimitedStr:
+            prefix = DelimitedStr(prefix)
+
+        parent_key = ".".join(k for k in prefix.keys if k)
+        if not parent_key:
+            return self.iter_collapsed()
+
+        value = self._ref(self.__dict__, prefix, False, True, _missing)
+
+        if value is _missing:
+            return iter(())
+        elif type(value) is self.container and value:
+            return self._iter_collapsed_delimited_notation(value, parent_key)
+        return iter([(parent_key, value)])
+
+    def paths(self, prefix=None):
+        """ return the keys of collapse for prefix and the keys under it """
+        return [key for key, _ in self.iter_items(prefix)]
+
+    def count(self, prefix=None):
+        """ return the number of keys of collapse for prefix and the keys
+        under it, uses the index when `indexed` is True """
+
+        if not self.indexed:
+            return sum(1 for _ in self.iter_items(prefix))
+
+        if self._index is None or self._exposed:
+            self._index = self._build_index(self.__dict__)
+
+        if type(prefix) is not DelimitedStr:
+            prefix = DelimitedStr(prefix)
+
+        node = self._index
+        for needle in prefix.keys:
+            if needle:
+                try:
+                    node = node[1][needle]
+                except (KeyError, TypeError):
+                    return 0
+
+        if node is self._index:
+            return node[0]
+        return self._index_count(node)
+
+    def fingerprint(self, key=None):
+        """ return a 64 bit hash of the data at key. Equal data has equal
+        fingerprints, fingerprints are kept with the index and updated along
+        the written path so unchanged data is not hashed again """
+
+        if self._index is None or self._exposed:
+            self._index = self._build_index(self.__dict__)
+
+        if type(key) is not DelimitedStr:
+            key = DelimitedStr(key)
+
+        node = self._index
+        try:
+            for needle in key.keys:
+                if needle:
+                    node = node[1][needle]
+        except (KeyError, TypeError):
+            # not indexed, such as mappings that are not containers
+            value = self._ref(self.__dict__, key, False, False, None)
+            return self._fingerprint(value)
+
+        return node[2] if type(node) is list else node
+
+    def fingerprints_differ(self, other, key=None):
+        """ return True when the fingerprints of the data at key kept by this
+        instance and other differ, in which case the data differ. False when
+        they are equal or either is not kept up to date, the data have to be
+        compared then """
+
+        fingerprint = self._kept_fingerprint(key)
+        if fingerprint is None:
+            return False
+
+        other_fingerprint = other._kept_fingerprint(key)
+        if other_fingerprint is None:
+            return False
+
+        return fingerprint != other_fingerprint
+
+    @classmethod
+    def compile_path(cls, key):
+        """ return a reusable DelimitedPath for key bound to this class,
+        compiled paths are cached per class so this can be called freely """
+
+        cache_key = (cls, key)
+        try:
+            return DelimitedPath.cache[cache_key]
+        except KeyError:
+            pass
+
+        path = DelimitedPath(key, owner=cls)
+
+        with DelimitedPath._lock:
+            while len(DelimitedPath.cache) >= DelimitedPath.cache_size:
+                DelimitedPath.cache.popitem(last=False)
+            DelimitedPath.cache[cache_key] = path
+
+        return path
+
+    def _kept_fingerprint(self, key=None):
+        """ return the fingerprint at key from the index, None when it is not
+        built, could be stale or does not reach key """
+
+        if self._index is None or self._exposed:
+            return None
+
+        if type(key) is not DelimitedStr:
+            key = DelimitedStr(key)
+
+        node = self._index
+        try:
+            for needle in key.keys:
+                if needle:
+                    node = node[1][needle]
+        except (KeyError, TypeError):
+            return None
+
+        return node[2] if type(node) is list else node
+
+    def _invalidate(self):
+        """ drop the collapse cache and the index, and those of the instance
+        this one was spawned from """
+
+        self._collapsed = None
+        self._index = None
+        self._invalidate_root()
+
+    def _invalidate_root(self):
+        if self._root is not None:
+            root = self._root()
+            if root is not None:
+                root._invalidate()
+
+    def _share(self, node=None):
+        """ mark the children of node as shared with another owner and return
+        a shallow copy of node for that owner, returns the shared set when
+        node is not passed """
+
+        if self._shared is None:
+            self._shared = set()
+
+        if node is None:
+            return self._shared
+
+        self._shared.update(map(id, self._children(node)))
+        return type(node)(node)
+
+    def _unshare(self, key, deep=False):
+        """ copy shared containers along key so they can be written, when deep
+        is True the container at key is made private entirely """
+
+        if type(key) is not DelimitedStr:
+            key = DelimitedStr(key)
+
+        shared = self._shared
+        haystack = self.__dict__
+        inherited = False
+
+        for needle in key.keys:
+            if not needle:
+                continue
+
+            try:
+                node = haystack[needle]
+            except (KeyError, TypeError, IndexError):
+                return
+
+            if type(node) is not self.container and type(node) is not list:
+                return
+
+            if inherited or id(node) in shared:
+                inherited = True
+                node = type(node)(node)
+                shared.update(map(id, self._children(node)))
+                haystack[needle] = node
+
+            haystack = node
+
+        if deep:
+            self._unshare_children(haystack, inherited)
+
+    def _unshare_children(self, node, inherited=False):
+        items = enumerate(node) if type(node) is list else node.items()
+        for k, child in list(items):
+            if type(child) is not self.container and type(child) is not list:
+                continue
+            if inherited or id(child) in self._shared:
+                node[k] = self._copy_tree(child)
+            else:
+                self._unshare_children(child)
+
+    @classmethod
+    def _children(cls, node):
+        values = node if type(node) is list else node.values()
+        for value in values:
+            if type(value) is cls.container or type(value) is list:
+                yield value
+
+    @classmethod
+    def _copy_tree(cls, value):
+        """ copy containers and lists, share immutable values, deep copy
+        everything else """
+
+        value_type = type(value)
+        immutable = cls._immutable_types
+
+        if value_type in immutable:
+            return value
+
+        elif value_type is dict:
+            return {
+                k: v if type(v) in immutable else cls._copy_tree(v)
+                for k, v in value.items()
+            }
+
+        elif value_type is list:
+            return [
+                v if type(v) in immutable else cls._copy_tree(v)
+                for v in value
+            ]
+
+        elif value_type is OrderedDict:
+            return OrderedDict(
+                (k, v if type(v) in immutable else cls._copy_tree(v))
+                for k, v in value.items()
+            )
+
+        return copy.deepcopy(value)
+
+    _immutable_types = frozenset([
+        str, int, float, bool, bytes, type(None)
+    ])
+
+    @classmethod
+    def _merge_shared(cls, d1, d2, shared=None):
+        """ d1 overwrites values in a copy of d2, containers that are not
+        written to are shared with d2 and marked in shared """
+
+        d2 = type(d2)(d2)
+        if shared is not None:
+            shared.update(map(id, cls._children(d2)))
+
+        for k in d1.keys():
+            if isinstance(d1[k], cls.container) and \
+                    k in d2 and isinstance(d2[k], cls.container):
+                d2[k] = cls._merge_shared(d1[k], d2[k], shared)
+            else:
+                d2[k] = d1[k]
+        return d2
+
+    @classmethod
+    def _ref(cls, haystack, key, create, use_default_value, default_value):
+
+        if type(key) is not DelimitedStr:
+            key = DelimitedStr(key)
+
+        length = len(key.keys)
+        for i, needle in enumerate(key.keys, 1):
+
+            if needle:
+
+                if needle not in haystack:
+                    if create:
+                        haystack[needle] = cls.container()
+
+                    else:
+                        if use_default_value:
+                            return default_value
+                        else:
+                            message = cls._format_keyerror(needle, key)
+                            raise KeyError(message)
+
+                if i < length and \
+                        not isinstance(haystack[needle], cls.container):
+                    if create:
+                        haystack[needle] = cls.container()
+
+                    else:
+                        if use_default_value:
+                            return default_value
+                        else:
+                            message = cls._format_typeerror(
+                                haystack[needle],
+                                needle,
+                                key
+                            )
+                            raise TypeError(message)
+
+                if create and not isinstance(haystack[needle], cls.container):
+                    haystack[needle] = cls.container()
+
+                haystack = haystack[needle]
+
+        return haystack
+
+    @classmethod
+    def _group_items(cls, items):
+        """ return (key, parents, needle, value) for items grouped by parent
+        path, items keep their order when one key is a prefix of another
+        since writing those is order dependent """
+
+        ordered = []
+        groups = {}
+        delimiter = DelimitedStr.default_delimiter
+
+        for key, value in items:
+            keys = key.keys if type(key) is DelimitedStr \
+                else key.split(delimiter)
+            parents = tuple(k for k in keys[:-1] if k)
+            item = (key, parents, keys[-1], value)
+            ordered.append(item)
+
+            try:
+                groups[parents].append(item)
+            except KeyError:
+                groups[parents] = [item]
+
+        paths = set(parents + (item[2],) for parents, group in groups.items()
+                    for item in group)
+        for parents in groups:
+            for i in range(1, len(parents) + 1):
+                if parents[:i] in paths:
+                    return ordered
+
+        return [item for group in groups.values() for item in group]
+
+    def _descend(self, stack, key, parents, create):
+        """ move stack, (needle, container, inherited) entries from the root,
+        to the parent container of key reusing the prefix it shares with the
+        previous key, shared containers are copied on the way down """
+
+        depth = 1
+        limit = min(len(stack), len(parents) + 1)
+        while depth < limit and stack[depth][0] == parents[depth - 1]:
+            depth += 1
+        del stack[depth:]
+
+        shared = self._shared
+        for needle in parents[depth - 1:]:
+            _, haystack, inherited = stack[-1]
+            node = haystack.get(needle)
+
+            if not isinstance(node, self.container):
+                if not create:
+                    # raises or returns the value at the parent path the
+                    # same way ref does
+                    key = DelimitedStr(key)
+                    return self._ref(self.__dict__, key[:-1], False, False,
+                                     None)
+                node = haystack[needle] = self.container()
+                inherited = False
+
+            elif shared and (inherited or id(node) in shared):
+                inherited = True
+                node = type(node)(node)
+                shared.update(map(id, self._children(node)))
+                haystack[needle] = node
+
+            stack.append((needle, node, inherited))
+
+        return stack[-1][1]
+
+    def _reindex(self, key, parents=None, needle=None):
+        """ update the index after the value at key was written, containers
+        created or copied along the way are indexed as they are found """
+
+        if parents is None:
+            if type(key) is not DelimitedStr:
+                key = DelimitedStr(key)
+            parents = tuple(k for k in key.keys[:-1] if k)
+            needle = key[-1]
+
+        container = self.container
+        haystack = self.__dict__
+        node = self._index
+        trail = []
+        path = parents + (needle,)
+
+        for i, needle in enumerate(path, 1):
+            children = node[1]
+            value = haystack.get(needle, _missing)
+            old = children.get(needle, _missing)
+
+            if value is _missing:
+                children.pop(needle, None)
+                new = _missing
+                break
+
+            if i == len(path) or type(old) is not list or \
+                    type(value) is not container:
+                if type(value) is container:
+                    new = self._build_index(value)
+                else:
+                    new = self._fingerprint(value)
+                children[needle] = new
+                break
+
+            trail.append((node, needle))
+            node = old
+            haystack = value
+
+        # update the container the value was written to, then its parents,
+        # an empty container counts as one key
+        delta = self._index_count(new) - self._index_count(old)
+        change = self._index_entry(needle, new) - \
+            self._index_entry(needle, old)
+
+        while True:
+            before = node[0] or 1
+            node[0] += delta
+            delta = (node[0] or 1) - before
+
+            fingerprint = node[2]
+            node[2] = (fingerprint + change) & _mask
+
+            if not trail:
+                break
+
+            node, needle = trail.pop()
+            change = self._index_entry(needle, node[1][needle]) - \
+                self._index_entry(needle, fingerprint)
+
+    @classmethod
+    def _build_index(cls, data):
+        """ return [count, children, fingerprint] for data, children maps each
+        key to the node of a nested container or the fingerprint of any other
+        value """
+
+        container = cls.container
+        entry = cls._index_entry
+        index = [0, {}, 0]
+        stack = [(iter(data.items()), index, None, None)]
+
+        while stack:
+            items, node, parent, parent_key = stack[-1]
+
+            for key, val in items:
+                if type(val) is container:
+                    child = node[1][key] = [0, {}, 0]
+                    stack.append((iter(val.items()), child, node, key))
+                    break
+
+                fingerprint = node[1][key] = cls._fingerprint(val)
+                node[0] += 1
+                node[2] += entry(key, fingerprint)
+
+            else:
+                stack.pop()
+                node[2] &= _mask
+                if parent is not None:
+                    parent[0] += node[0] or 1
+                    parent[2] += entry(parent_key, node)
+
+        return index
+
+    @classmethod
+    def _index_count(cls, node):
+        if node is _missing:
+            return 0
+        elif type(node) is not list:
+            return 1
+        return node[0] or 1
+
+    @classmethod
+    def _index_entry(cls, key, node):
+        """ return the share of a key and its node or fingerprint in the
+        fingerprint of the container holding it """
+
+        if node is _missing:
+            return 0
+        elif type(node) is list:
+            node = node[2]
+        return _mix((_mix(hash(key) & _mask) + node) & _mask)
+
+    @classmethod
+    def _fingerprint(cls, value):
+        """ return a 64 bit hash of value that is equal for equal values,
+        mappings are hashed like containers regardless of their type """
+
+        if isinstance(value, Mapping) and \
+                not isinstance(value, DelimitedDict):
+            fingerprint = 0
+            for k, v in value.items():
+                fingerprint += cls._index_entry(k, cls._fingerprint(v))
+            return fingerprint & _mask
+
+        elif type(value) in (list, tuple):
+            fingerprint = len(value)
+            for v in value:
+                fingerprint = _mix((fingerprint + cls._fingerprint(v)) & _mask)
+            return fingerprint
+
+        try:
+            return hash(value) & _mask
+        except TypeError:
+            return hash(type(value).__name__) & _mask
 
     @classmethod
     def _format_keyerror(cls, needle, key):
@@ -374,64 +1360,153 @@ class DelimitedDict(MutableMapping):
     def _merge(cls, d1, d2):
         """ d1 overwrites values in d2 """
 
-        for k in d1.keys():
-            if isinstance(d1[k], cls.container) and \
-                    k in d2 and isinstance(d2[k], cls.container):
-                d2[k] = cls._merge(d1[k], d2[k])
-            else:
-                d2[k] = d1[k]
+        stack = [(d1, d2)]
+        while stack:
+            d1_node, d2_node = stack.pop()
+            for k in d1_node.keys():
+                if isinstance(d1_node[k], cls.container) and \
+                        k in d2_node and isinstance(d2_node[k], cls.container):
+                    stack.append((d1_node[k], d2_node[k]))
+                else:
+                    d2_node[k] = d1_node[k]
         return d2
 
+    @classmethod
+    def _has_delimited_keys(cls, data):
+        """ return True if any key at any depth of data contains the
+        delimiter """
+
+        delimiter = DelimitedStr.default_delimiter
+        container = cls.container
+
+        stack = [data]
+        while stack:
+            for key, val in stack.pop().items():
+                if delimiter in key:
+                    return True
+                if type(val) is container:
+                    stack.append(val)
+        return False
+
+    @classmethod
+    def _copy_containers(cls, data):
+        """ return a copy of data with nested containers copied and other
+        values shared, as _expand_delimited_notation copies them """
+
+        container = cls.container
+        copied = container(data)
+
+        stack = [copied]
+        while stack:
+            node = stack.pop()
+            for key, val in node.items():
+                if type(val) is container:
+                    node[key] = container(val)
+                    stack.append(node[key])
+        return copied
+
     @classmethod
     def _expand_delimited_notation(cls, data):
-        ex = cls.container()
-        for key, val in data.items():
+        """ return a copy of data with delimited keys expanded into nested
+        containers """
 
-            if type(val) is cls.container:
-                ex_val = cls._expand_delimited_notation(val)
-            else:
-                ex_val = val
+        container = cls.container
+        delimiter = DelimitedStr.default_delimiter
+
+        # each frame is [items iterator, expanded container, key in parent]
+        ex = container()
+        stack = [[iter(data.items()), ex, None]]
+
+        while True:
+            frame = stack[-1]
+            ex = frame[1]
+
+            for key, val in frame[0]:
+                if type(val) is container:
+                    stack.append([iter(val.items()), container(), key])
+                    break
+                cls._expand_key(ex, key, val, delimiter)
 
-            if "." in key:
-                key = DelimitedStr(key)
-                ex_key = cls.container()
-                for i, k in enumerate(reversed(key), 1):
-                    if i == 1:
-                        ex_key[k] = ex_val
-                    elif i == len(key):
-                        if k not in ex:
-                            ex[k] = ex_key
-                        else:
-                            ex[k] = cls._merge(ex[k], ex_key)
-                    else:
-                        ex_temp = cls.container()
-                        ex_temp[k] = copy.copy(ex_key)
-                        ex_key = ex_temp
             else:
-                ex[key] = ex_val
+                stack.pop()
+                if not stack:
+                    return ex
+                cls._expand_key(stack[-1][1], frame[2], ex, delimiter)
+
+    @classmethod
+    def _expand_key(cls, ex, key, val, delimiter):
+        """ set val in ex for key, expanding key if it is delimited. values
+        already in ex take precedence over val for delimited keys """
+
+        if delimiter not in key:
+            ex[key] = val
+            return
 
-        return ex
+        # document keys are not interned, they would evict access paths
+        keys = key.split(delimiter)
+        last = len(keys) - 1
+
+        for i, k in enumerate(keys):
+            if k not in ex:
+                for k2 in reversed(keys[i + 1:]):
+                    val = cls.container([(k2, val)])
+                ex[k] = val
+                return
+
+            if not isinstance(ex[k], cls.container):
+                return
+
+            if i == last:
+                if isinstance(val, cls.container):
+                    cls._merge_missing(val, ex[k])
+                return
+
+            ex = ex[k]
 
     @classmethod
-    def _collapse_delimited_notation(cls, data, parent_key=None):
-        items = []
-        for key, val in data.items():
-            new_key = "{}.{}".format(parent_key, key) if parent_key else key
-            if type(val) is cls.container:
+    def _merge_missing(cls, d1, d2):
+        """ values in d1 are set in d2 where d2 does not have them """
+
+        stack = [(d1, d2)]
+        while stack:
+            d1_node, d2_node = stack.pop()
+            for k in d1_node.keys():
+                if k not in d2_node:
+                    d2_node[k] = d1_node[k]
+                elif isinstance(d1_node[k], cls.container) and \
+                        isinstance(d2_node[k], cls.container):
+                    stack.append((d1_node[k], d2_node[k]))
+        return d2
 
-                if len(val):
-                    items.extend(
-                        cls._collapse_delimited_notation(val, new_key).items()
-                    )
+    @classmethod
+    def _iter_collapsed_delimited_notation(cls, data, parent_key=None):
+        """ yield (delimited key, value) pairs for every leaf of data in
+        order, empty containers are leaves """
 
-                # empty container
-                else:
-                    items.append((new_key, val))
+        container = cls.container
+        stack = [(iter(data.items()), parent_key)]
+
+        while stack:
+            items, parent_key = stack[-1]
+
+            for key, val in items:
+                new_key = "{}.{}".format(parent_key, key) \
+                    if parent_key else key
+
+                if type(val) is container and val:
+                    stack.append((iter(val.items()), new_key))
+                    break
+
+                yield new_key, val
 
             else:
-                items.append((new_key, val))
+                stack.pop()
 
-        return data.__class__(items)
+    @classmethod
+    def _collapse_delimited_notation(cls, data, parent_key=None):
+        return data.__class__(
+            cls._iter_collapsed_delimited_notation(data, parent_key)
+        )
 
 
 class DelimitedOrderedDict(DelimitedDict):
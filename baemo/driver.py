@@ -0,0 +1,268 @@
+"""
+baemo.driver
+~~~~~~~~~~~~~~~~~~~~~~~~
+This module defines Operation and the drivers that run them. Models and
+collections read and write documents with generators that yield Operations
+and receive their results, Driver runs them with pymongo, AsyncDriver and
+ExecutorDriver run them from a coroutine. Generators that do not depend on
+each other are yielded together as a Concurrent and run concurrently when
+the driver allows it.
+"""
+
+import asyncio
+import functools
+import threading
+import contextvars
+
+from concurrent.futures import ThreadPoolExecutor
+
+from .connection import Connections
+from .raw import with_raw_documents
+
+
+class Operation(object):
+    """ A call of the pymongo collection method `method` with `kwargs` on the
+    collection of `model`, a model class. When `raw` is a document class
+    documents are found as RawBSONDocuments and the result is a tuple of the
+    documents and the codec options decoding them into `raw`. The results of
+    `find` and `aggregate` are lists.
+    """
+
+    __slots__ = ("model", "method", "kwargs", "raw")
+
+    def __init__(self, model, method, kwargs=None, raw=None):
+        self.model = model
+        self.method = method
+        self.kwargs = kwargs or {}
+        self.raw = raw
+
+    def __repr__(self):
+        return "{}({}, {!r}, {!r})".format(
+            type(self).__name__,
+            self.model.__name__,
+            self.method,
+            self.kwargs
+        )
+
+
+class Concurrent(object):
+    """ Generators of operations that do not depend on each other. The result
+    is a list of (value, error) tuples in the order of the generators, value
+    is the return value of a generator and error the exception it raised or
+    None. Every generator runs to completion whatever the others raise.
+    """
+
+    __slots__ = ("operations",)
+
+    def __init__(self, operations):
+        self.operations = list(operations)
+
+
+def concurrently(operations):
+    """ run generators of operations with Concurrent and return their
+    (value, error) tuples, a single generator is run in place """
+
+    if len(operations) == 1:
+        try:
+            return [((yield from operations[0]), None)]
+        except Exception as e:
+            return [(None, e)]
+
+    if not operations:
+        return []
+
+    return (yield Concurrent(operations))
+
+
+class Driver(object):
+    """ Runs operations with the pymongo collections of their models. `run`
+    sends the result of each operation back into the generator, or throws the
+    exception it raised, and returns the value the generator returns.
+
+    Concurrent generators are run one after another unless `max_workers` is
+    set, then they are run in a pool of that many threads created when first
+    needed. Concurrent generators yielded from a pool thread run in that
+    thread so nested references can not exhaust the pool.
+    """
+
+    def __init__(self, max_workers=None):
+        self.max_workers = max_workers
+        self._executor = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def run(self, operations):
+        result = None
+        error = None
+        while True:
+            try:
+                if error is None:
+                    operation = operations.send(result)
+                else:
+                    operation = operations.throw(error)
+            except StopIteration as e:
+                return e.value
+
+            result = None
+            error = None
+            if isinstance(operation, Concurrent):
+                result = self.run_concurrent(operation)
+                continue
+
+            try:
+                result = self.execute(operation)
+            except Exception as e:
+                error = e
+
+    def run_concurrent(self, concurrent):
+        if not self.max_workers or getattr(self._local, "worker", False):
+            return [self._result(o) for o in concurrent.operations]
+
+        executor = self._get_executor()
+        futures = [
+            executor.submit(
+                contextvars.copy_context().run,
+                self._worker_result,
+                o
+            ) for o in concurrent.operations
+        ]
+        return [f.result() for f in futures]
+
+    def _result(self, operations):
+        try:
+            return self.run(operations), None
+        except Exception as e:
+            return None, e
+
+    def _worker_result(self, operations):
+        self._local.worker = True
+        try:
+            return self._result(operations)
+        finally:
+            self._local.worker = False
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix="baemo"
+                )
+            return self._executor
+
+    def execute(self, operation):
+        connection, codec_options = self._connection(operation)
+
+        result = getattr(connection, operation.method)(**operation.kwargs)
+        if operation.method in ("find", "aggregate"):
+            result = list(result)
+
+        if operation.raw is not None:
+            return result, codec_options
+        return result
+
+    @staticmethod
+    def _connection(operation):
+        connection = Connections.get(
+            operation.model.connection,
+            operation.model.collection
+        )
+
+        codec_options = None
+        if operation.raw is not None:
+            connection, codec_options = with_raw_documents(
+                connection,
+                operation.raw
+            )
+        return connection, codec_options
+
+
+class AsyncDriver(Driver):
+    """ Runs operations from a coroutine with asyncio collections, such as
+    motor or the pymongo asyncio client, whose methods return awaitables and
+    whose `find` returns a cursor with an awaitable `to_list`. Operations of
+    models with a synchronous driver are run in the default executor,
+    Concurrent generators are run as tasks of the running loop.
+    """
+
+    async def run(self, operations):
+        result = None
+        error = None
+        while True:
+            try:
+                if error is None:
+                    operation = operations.send(result)
+                else:
+                    operation = operations.throw(error)
+            except StopIteration as e:
+                return e.value
+
+            result = None
+            error = None
+            if isinstance(operation, Concurrent):
+                result = await self.run_concurrent(operation)
+                continue
+
+            try:
+                driver = getattr(operation.model, "driver", self)
+                if isinstance(driver, AsyncDriver):
+                    result = await driver.execute(operation)
+                else:
+                    result = await asyncio.get_running_loop().run_in_executor(
+                        None,
+                        functools.partial(driver.execute, operation)
+                    )
+            except Exception as e:
+                error = e
+
+    async def run_concurrent(self, concurrent):
+        return list(await asyncio.gather(
+            *[self._result(o) for o in concurrent.operations]
+        ))
+
+    async def _result(self, operations):
+        try:
+            return await self.run(operations), None
+        except Exception as e:
+            return None, e
+
+    async def execute(self, operation):
+        connection, codec_options = self._connection(operation)
+
+        result = getattr(connection, operation.method)(**operation.kwargs)
+        if operation.method == "find":
+            result = await result.to_list(None)
+        elif operation.method == "aggregate":
+            result = await (await _maybe_await(result)).to_list(None)
+        else:
+            result = await result
+
+        if operation.raw is not None:
+            return result, codec_options
+        return result
+
+
+class ExecutorDriver(AsyncDriver):
+    """ Runs operations from a coroutine with pymongo in `executor`, the
+    default executor of the running loop when None, so pymongo connections
+    can be used without blocking the loop.
+    """
+
+    def __init__(self, executor=None):
+        super().__init__()
+        self.executor = executor
+
+    async def execute(self, operation):
+        return await asyncio.get_running_loop().run_in_executor(
+            self.executor,
+            functools.partial(Driver.execute, self, operation)
+        )
+
+
+async def _maybe_await(value):
+    """ motor returns aggregate cursors, the pymongo asyncio client returns
+    awaitables of them """
+
+    if hasattr(value, "__await__"):
+        return await value
+    return value
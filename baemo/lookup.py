@@ -0,0 +1,318 @@
+"""
+baemo.lookup
+~~~~~~~~~~~~~~~~~~~~~~~~
+This module defines Lookup, the $lookup stage of an aggregation dereferencing
+a reference, so documents are found with their references in one query and
+hydrated into the same models and collections `dereference_entities` sets.
+"""
+
+import bson
+import threading
+
+from collections import OrderedDict
+
+from .delimited import DelimitedDict
+from .delimited import _missing
+from .entity import Entities
+from .projection import Projection
+from .projection import CompiledProjection
+from .sort import CompiledSort
+from .session import Session
+from .exceptions import DereferenceError
+
+
+class Lookup(object):
+    """ The $lookup of the reference at `key` of a model class dereferenced
+    with `projection`, 2 or a nested projection. Documents found are stored
+    under `name` in the parent document until they are hydrated, nested
+    projections become the pipeline of the stage and `children` hold the
+    lookups of the next level.
+
+    Lookups of a model class, projection and number of `levels` of nested
+    references are compiled once and cached, `compile` returns None when a
+    reference can not be looked up because its entity uses another
+    connection than the documents referencing it.
+    """
+
+    # lookups keyed by (model class, projection key, levels)
+    cache = OrderedDict()
+    cache_size = 4096
+    _lock = threading.Lock()
+
+    def __init__(self, key, reference, projection, name, levels=None):
+        self.key = key
+        self.path = DelimitedDict.compile_path(key)
+        self.name = name
+
+        entity = Entities.get(reference["entity"])
+        self.model_class = entity["model"]
+        self.collection_class = entity["collection"]
+        self.type = reference["type"]
+        self.many = self.type in ("local_many", "foreign_many")
+        self.local = self.type in ("local_one", "local_many")
+
+        if "foreign_key" in reference:
+            self.foreign_key = reference["foreign_key"]
+        else:
+            self.foreign_key = self.model_class.id_attribute
+        self.foreign_key_path = DelimitedDict.compile_path(self.foreign_key)
+
+        # local references match the value at key, foreign references match
+        # the id of the parent
+        if self.local:
+            self.local_field = key
+        else:
+            self.local_field = self.model_class.id_attribute
+        self.source_path = DelimitedDict.compile_path(
+            self.model_class.id_attribute
+        )
+
+        nested = projection if type(projection) is dict else None
+        self.nested = nested
+
+        # find projection of the referenced model, or collection for many
+        p = CompiledProjection.compile()
+        if nested is not None:
+            p = p.merge(nested)
+        if self.many:
+            if self.collection_class.find_projection:
+                p = p.merge(self.collection_class.find_projection)
+        elif self.model_class.find_projection:
+            p = p.merge(self.model_class.find_projection)
+        self.projection = p
+
+        self.flattened_projection = p.flatten()
+        if p.type == "inclusive":
+            self.flattened_projection[self.foreign_key] = 1
+
+        # models found are complete unless their references are cut by
+        # levels, only complete models are shared
+        self.children = []
+        self.complete = True
+        if nested and self.model_class.references:
+            if levels is not None:
+                levels -= 1
+            self.children = self.compile(self.model_class, nested, levels)
+            self.complete = levels != 0
+
+    @classmethod
+    def compile(cls, model_class, projection, levels=None):
+        """ return the lookups of the references of model_class in
+        projection, None if one of them can not be looked up. At most levels
+        of nested references are looked up, None for no limit """
+
+        if levels == 0:
+            return []
+
+        p = CompiledProjection.compile(projection)
+
+        cache_key = (model_class, p.key, levels)
+        try:
+            return cls.cache[cache_key]
+        except KeyError:
+            pass
+
+        projection = Projection(p.get())
+
+        lookups = []
+        references = model_class.references.collapse()
+        for i, (k, reference) in enumerate(references.items()):
+            path = DelimitedDict.compile_path(k)
+            if not path.has(projection):
+                continue
+
+            entity = Entities.get(reference["entity"])
+            if entity["model"].connection != model_class.connection:
+                lookups = None
+                break
+
+            lookup = cls(
+                k,
+                reference,
+                path(projection),
+                "_lookup_{}".format(i),
+                levels
+            )
+            if lookup.children is None:
+                lookups = None
+                break
+            lookups.append(lookup)
+
+        with cls._lock:
+            while len(cls.cache) >= cls.cache_size:
+                cls.cache.popitem(last=False)
+            cls.cache[cache_key] = lookups
+
+        return lookups
+
+    @classmethod
+    def pipeline(cls, lookups, filter=None, projection=None, sort=None,
+                 skip=None, limit=None):
+        """ return the aggregation pipeline finding documents matching filter
+        with their references dereferenced by lookups """
+
+        pipeline = [{"$match": filter or {}}]
+        if sort:
+            pipeline.append({"$sort": OrderedDict(sort)})
+        if skip:
+            pipeline.append({"$skip": skip})
+        if limit:
+            pipeline.append({"$limit": limit})
+        if projection:
+            pipeline.append({"$project": projection})
+        pipeline.extend(lookup.stage() for lookup in lookups)
+        return pipeline
+
+    def stage(self):
+        """ return the $lookup stage, with a pipeline when the documents
+        found are sorted, limited, projected or dereferenced themselves """
+
+        pipeline = []
+
+        # $lookup matches a missing local field to documents missing the
+        # foreign key, which is only possible when it is not the id
+        if self.local and self.foreign_key != self.model_class.id_attribute:
+            pipeline.append({"$match": {self.foreign_key: {"$ne": None}}})
+
+        if self.many:
+            sort = CompiledSort.compile(self.collection_class.sort).flatten()
+            if sort:
+                pipeline.append({"$sort": OrderedDict(sort)})
+            if self.collection_class.skip:
+                pipeline.append({"$skip": self.collection_class.skip})
+            if self.collection_class.limit:
+                pipeline.append({"$limit": self.collection_class.limit})
+        if self.flattened_projection:
+            pipeline.append({"$project": self.flattened_projection})
+        pipeline.extend(child.stage() for child in self.children)
+
+        stage = {
+            "from": self.model_class.collection,
+            "localField": self.local_field,
+            "foreignField": self.foreign_key,
+            "as": self.name
+        }
+        if pipeline:
+            stage["pipeline"] = pipeline
+        return {"$lookup": stage}
+
+    @classmethod
+    def pop(cls, lookups, document):
+        """ remove and return the documents found by lookups from document """
+        return [document.pop(lookup.name, None) or [] for lookup in lookups]
+
+    @classmethod
+    def place(cls, model, lookups, found, memo=None):
+        """ set the references of model dereferenced from the documents found
+        by lookups, in order. Documents found more than once with the same
+        projection are hydrated once per memo """
+
+        for lookup, documents in zip(lookups, found):
+            value = lookup.value(model, documents, memo)
+            if value is not _missing:
+                lookup.path.set(model.attributes, value)
+
+    def value(self, parent, documents, memo=None):
+        """ return the value of the reference of parent dereferenced from the
+        documents found, _missing when there is nothing to set """
+
+        value = self.path(parent.attributes, None)
+        if self.local != bool(value):
+            return _missing
+
+        models = [self.hydrate(document, memo) for document in documents]
+
+        # one
+        if not self.many:
+            if models:
+                return models[0]
+
+            # dereference error
+            if self.local:
+                return DereferenceError(data={
+                    "model": self.model_class.__name__,
+                    "t": value
+                })
+            return None
+
+        # many
+        if not self.local:
+            value = self.source_path(parent.attributes, None)
+
+        collection = self.collection_class().set_target(
+            value,
+            key=self.foreign_key
+        )
+        collection._as_reference = True
+        if callable(getattr(collection, "pre_find_hook", None)):
+            collection.pre_find_hook()
+        collection.models.extend(models)
+        collection.total_count = len(models)
+
+        # determine dereference errors
+        if self.local:
+            found = set()
+            for m in models:
+                v = self.foreign_key_path(m.attributes, None)
+                found.update(
+                    _value_key(v) for v in (v if type(v) is list else [v])
+                )
+            for model_target in value:
+                if _value_key(model_target) not in found:
+                    collection.add(DereferenceError(data={
+                        "model": self.collection_class.__name__,
+                        "target": model_target
+                    }))
+
+        if callable(getattr(collection, "post_find_hook", None)):
+            collection.post_find_hook()
+
+        return collection
+
+    def hydrate(self, document, memo=None):
+        """ return the model of a document found, with its own references
+        dereferenced """
+
+        # the model of a document hydrated before with the same projection
+        key = None
+        id_attribute = self.model_class.id_attribute
+        if memo is not None and self.complete and id_attribute in document:
+            key = memo.key(
+                self.model_class,
+                id_attribute,
+                document[id_attribute],
+                self.nested
+            )
+            models = memo.get(key)
+            if models:
+                return models[0]
+
+        found = self.pop(self.children, document)
+
+        model = self.model_class()
+        model._as_reference = True
+        if callable(getattr(model, "pre_find_hook", None)):
+            model.pre_find_hook()
+        model._post_find_hook(document)
+        if callable(getattr(model, "post_find_hook", None)):
+            model.post_find_hook()
+
+        session = Session.current()
+        if session is not None:
+            session.add(model, self.projection)
+
+        self.place(model, self.children, found, memo)
+
+        if key is not None:
+            memo.set(key, [model])
+        return model
+
+
+def _value_key(value):
+    """ return a hashable key for a referenced value """
+
+    try:
+        hash(value)
+        return value
+    except TypeError:
+        return bson.encode({"v": value})
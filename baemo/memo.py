@@ -0,0 +1,117 @@
+"""
+baemo.memo
+~~~~~~~~~~~~~~~~~~~~~~~~
+This module defines DereferenceMemo, the models found while dereferencing the
+references of one find or dereference_entities, so documents referenced more
+than once in a graph of references are found once and nested references stop
+at a maximum depth or when a model references one of its ancestors.
+"""
+
+import copy
+
+from .projection import CompiledProjection
+from .lookup import _value_key
+
+
+class DereferenceMemo(object):
+    """ The models found for references while one operation dereferences,
+    keyed by (model class, foreign key, value, projection). A value found
+    again with the same projection reuses the models found the first time,
+    only models whose own references were dereferenced with the projection
+    are kept so a model stopped at `max_depth` or by a cycle is not reused
+    where it would have been dereferenced further.
+
+    Each model dereferenced has a depth, the number of references followed
+    to find it, and the ancestors it was found through. The references of a
+    model are not dereferenced when it is `max_depth` deep or when it is one
+    of its own ancestors. A memo is passed to the references of a model with
+    `enter`, which shares the models found and the ancestors of every model.
+    """
+
+    def __init__(self, max_depth=None):
+        self.max_depth = max_depth
+
+        # models found keyed by (model class, foreign key, value, projection)
+        self.models = {}
+
+        # (model, depth, ancestors) of models found keyed by id of the model
+        self.chains = {}
+
+        # depth and ancestors of models not in chains
+        self.depth = 0
+        self.ancestors = frozenset()
+
+    @staticmethod
+    def key(model_class, foreign_key, value, projection=None):
+        """ return the key of the models of model_class found with value at
+        foreign_key and projection, an int or a nested projection """
+
+        if type(projection) is not dict:
+            projection = None
+
+        return (
+            model_class,
+            foreign_key,
+            _value_key(value),
+            CompiledProjection.compile(projection)
+        )
+
+    @staticmethod
+    def identity(model):
+        return (type(model), _value_key(model.get_id()))
+
+    def get(self, key):
+        """ return the models found for key, None if it was not found yet """
+        return self.models.get(key)
+
+    def set(self, key, models):
+        self.models[key] = models
+
+    def chain(self, model):
+        """ return the depth and ancestors of model """
+
+        try:
+            return self.chains[id(model)][1:]
+        except KeyError:
+            return self.depth, self.ancestors
+
+    def add(self, parent, model):
+        """ record that model was found through a reference of parent, a
+        model found through references of several models keeps the first """
+
+        if id(model) in self.chains:
+            return
+
+        depth, ancestors = self.chain(parent)
+        self.chains[id(model)] = (
+            model,
+            depth + 1,
+            ancestors | {self.identity(parent)}
+        )
+
+    def levels(self, model):
+        """ return the number of levels of references of model that can be
+        dereferenced, None when there is no limit and 0 when model is one of
+        its own ancestors """
+
+        depth, ancestors = self.chain(model)
+        if self.identity(model) in ancestors:
+            return 0
+        if self.max_depth is None:
+            return None
+        return max(self.max_depth - depth, 0)
+
+    def descends(self, model):
+        """ return whether the references of model are dereferenced """
+        return self.levels(model) != 0
+
+    def enter(self, model):
+        """ return the memo of the references of model, one level deeper with
+        model as an ancestor """
+
+        depth, ancestors = self.chain(model)
+
+        memo = copy.copy(self)
+        memo.depth = depth + 1
+        memo.ancestors = ancestors | {self.identity(model)}
+        return memo
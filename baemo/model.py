@@ -2,14 +2,26 @@
 import bson
 import copy
 
+
 from .delimited import DelimitedStr
 from .delimited import DelimitedDict
-from .connection import Connections
+from .delimited import _missing
 from .entity import EntityMeta
 from .entity import Entities
 from .references import References
 from .projection import Projection
+from .projection import CompiledProjection
 from .collection import Collection
+from .raw import RawDocument
+from .session import Session
+from .cache import FindCache
+from .cache import IdFilter
+from .lookup import Lookup
+from .memo import DereferenceMemo
+from .driver import Operation
+from .driver import Driver
+from .driver import ExecutorDriver
+from .driver import concurrently
 from .exceptions import ModelNotFound
 from .exceptions import ModelNotUpdated
 from .exceptions import ModelNotDeleted
@@ -52,6 +64,45 @@ class Model(object):
     # default attributes
     default_attributes = DelimitedDict()
 
+    # record updates as they are made, when False updates are computed on
+    # save from the difference between the original and current attributes
+    record_updates = True
+
+    # keep fingerprints of attributes and original, built when a document is
+    # found or saved, models with different attributes are then unequal and
+    # set records changed values without comparing them
+    fingerprints = False
+
+    # find documents as raw bson and decode values when they are first read
+    lazy = False
+
+    # find cache policy, a dict with max_entries and ttl in seconds, when set
+    # documents found are cached per entity and saving a model invalidates
+    # the cached documents with its id
+    find_cache = None
+
+    # not found cache policy, a dict with max_entries and ttl in seconds, when
+    # set targets that were not found are not queried again until they
+    # expire or a model with the id of the target is inserted
+    not_found_cache = None
+
+    # id filter sizing, a dict with capacity and error_rate, used by
+    # build_id_filter
+    id_filter = None
+
+    # dereference references with $lookup stages in the query finding the
+    # documents referencing them, nested projections and local references
+    # with a foreign key other than the id need MongoDB 5.0
+    lookup = False
+
+    # maximum number of nested references dereferenced below a model found,
+    # None for no limit. References of a model referencing one of its
+    # ancestors are never dereferenced
+    max_dereference_depth = None
+
+    # runs the database operations of find, save and dereference_entities
+    driver = Driver()
+
     def __init__(self, target=None):
         """ Setup the model and prepare for use, create instance attributes and
         use defaults or arguments if set
@@ -144,6 +195,10 @@ class Model(object):
         """ find a document in the datbase and set the document in
         self.attributes.
         """
+        return self.driver.run(self._find(projection, default, _as_reference))
+
+    def _find(self, projection=None, default=True, _as_reference=False,
+              _memo=None):
 
         # if finding as a reference, update state of entity
         if _as_reference:
@@ -164,26 +219,104 @@ class Model(object):
             kwargs["filter"] = self.target.collapse()
 
         # projection
-        p = Projection()
+        p = CompiledProjection.compile()
         if projection is not None:
-            p.merge(projection)
+            p = p.merge(projection)
         if self.find_projection and default:
-            p.merge(self.find_projection)
+            p = p.merge(self.find_projection)
         flattened_projection = p.flatten()
         if flattened_projection:
             self._projection = flattened_projection
             kwargs["projection"] = flattened_projection
 
-        # find
-        connection = Connections.get(
-            self.connection,
-            self.collection
-        )
+        # the id when the target is only an id
+        target_id = None
+        if list(kwargs["filter"]) == [self.id_attribute]:
+            target_id = kwargs["filter"][self.id_attribute]
+
+        # models already found in the session are not queried again, self
+        # shares the state of the model found and replaces it in the session
+        session = Session.current()
+        if session is not None and target_id is not None:
+            m = session.get(type(self), target_id, p)
+            if m is not None:
+                as_reference = self._as_reference
+                self.__dict__.update(copy.copy(m.__dict__))
+                self._as_reference = as_reference
+                session.add(self, p)
+                return self
+
+        # ids missing from the id filter are not in the collection
+        id_filter = self.get_id_filter()
+        if id_filter is not None and target_id is not None and \
+                target_id not in id_filter:
+            raise ModelNotFound(data=self.target.collapse())
 
-        m = connection.find_one(**kwargs)
+        # targets recently not found are not queried again
+        not_found_cache = self.get_not_found_cache()
+        if not_found_cache is not None:
+            not_found_key = (
+                self.connection,
+                self.collection,
+                bson.encode(kwargs["filter"])
+            )
+            if not_found_cache.get(not_found_key):
+                raise ModelNotFound(data=self.target.collapse())
+
+        # models found while dereferencing, shared with nested references
+        memo = _memo
+        if memo is None and self.references and projection:
+            memo = DereferenceMemo(self.max_dereference_depth)
+
+        # dereference references in the same query with $lookup
+        lookups = None
+        if self.lookup and self.references and projection:
+            lookups = Lookup.compile(type(self), projection, memo.levels(self))
+
+        # read through the find cache, documents found with their references
+        # are not cached
+        cache = self.get_find_cache() if not lookups else None
+        m = None
+        if cache is not None:
+            cache_key = (
+                self.connection,
+                self.collection,
+                bson.encode(kwargs["filter"]),
+                tuple(flattened_projection.items())
+            )
+            m = cache.get(cache_key)
 
         if m is None:
-            raise ModelNotFound(data=self.target.collapse())
+            if lookups:
+                documents = yield Operation(type(self), "aggregate", {
+                    "pipeline": Lookup.pipeline(lookups, limit=1, **kwargs)
+                })
+                m = documents[0] if documents else None
+            else:
+                m, codec_options = yield Operation(
+                    type(self),
+                    "find_one",
+                    kwargs,
+                    raw=self.attributes.container
+                )
+
+            if m is None:
+                if not_found_cache is not None:
+                    not_found_cache.set(not_found_key, True, target_id)
+                raise ModelNotFound(data=self.target.collapse())
+
+            # documents are indexed by id to be invalidated when saved, the
+            # target is the id when the projection excludes it
+            found_id = m.get(self.id_attribute, target_id)
+            if cache is not None and found_id is not None:
+                cache.set(cache_key, (m, codec_options), found_id)
+        else:
+            m, codec_options = m
+
+        if lookups:
+            found = Lookup.pop(lookups, m)
+        else:
+            m = RawDocument(m, codec_options)
 
         # post find hook
         self._post_find_hook(m)
@@ -191,97 +324,223 @@ class Model(object):
             self.post_find_hook()
 
         # dereference nested models
-        if self.references and projection:
-            self.dereference_entities(projection=projection)
+        if lookups:
+            if memo.descends(self):
+                Lookup.place(self, lookups, found, memo)
+        elif self.references and projection:
+            yield from self._dereference_entities(projection, memo)
 
-        return self
+        if session is not None:
+            session.add(self, p)
 
-    def dereference_entities(self, projection):
+        return self
 
-        for k, reference in self.references.collapse().items():
-            entity = Entities.get(reference["entity"])
-            type_ = reference["type"]
+    @classmethod
+    def get_find_cache(cls):
+        """ return the FindCache of found documents of this entity, None if
+        find_cache is not set """
+        return cls._get_cache("find_cache")
+
+    @classmethod
+    def get_not_found_cache(cls):
+        """ return the FindCache of targets of this entity that were not
+        found, None if not_found_cache is not set """
+        return cls._get_cache("not_found_cache")
+
+    @classmethod
+    def _get_cache(cls, option):
+        policy = getattr(cls, option)
+        if not policy:
+            return None
 
-            if "foreign_key" in reference:
-                foreign_key = reference["foreign_key"]
-            else:
-                foreign_key = entity["model"].id_attribute
+        cache = cls.__dict__.get("_" + option)
+        if cache is None:
+            cache = FindCache(**policy)
+            setattr(cls, "_" + option, cache)
+        return cache
+
+    @classmethod
+    def get_id_filter(cls):
+        """ return the IdFilter of this entity, None until it is built with
+        build_id_filter """
+        return cls.__dict__.get("_id_filter")
+
+    @classmethod
+    def build_id_filter(cls):
+        """ build the IdFilter of this entity from the ids in the collection,
+        sized by the id_filter option or twice the number of documents. Once
+        built `find` raises ModelNotFound for ids that are not in the filter
+        without querying the database and inserting models adds their ids.
+        Deleted ids stay in the filter and ids inserted by other processes
+        are only seen when the filter is built again """
+        return cls.driver.run(cls._build_id_filter())
+
+    @classmethod
+    def _build_id_filter(cls):
+        options = dict(cls.id_filter or {})
+        if "capacity" not in options:
+            options["capacity"] = 2 * (yield Operation(
+                cls,
+                "count_documents",
+                {"filter": {}}
+            ))
+
+        documents = yield Operation(cls, "find", {
+            "filter": {},
+            "projection": {cls.id_attribute: 1}
+        })
+
+        id_filter = IdFilter(**options)
+        id_filter.update(document[cls.id_attribute] for document in documents)
+
+        cls._id_filter = id_filter
+        return id_filter
 
+    def dereference_entities(self, projection):
+        return self.driver.run(self._dereference_entities(projection))
 
-            if k in projection and \
-            (type(projection.get(k) is dict or projection.get(k) == 2)):
+    def _dereference_entities(self, projection, _memo=None):
 
-                # setup kwargs
-                kwargs = {}
+        if not isinstance(projection, Projection):
+            projection = Projection(projection)
 
-                kwargs["_as_reference"] = True
+        # references are not dereferenced past the maximum depth or below a
+        # model referencing one of its ancestors
+        if _memo is None:
+            _memo = DereferenceMemo(self.max_dereference_depth)
+        if not _memo.descends(self):
+            return self
 
-                if type(projection.get(k)) is dict:
-                    kwargs["projection"] = projection.get(k)
+        # independent references are found concurrently when the driver
+        # allows it and set in order
+        paths = []
+        operations = []
+        for k, reference in self.references.collapse().items():
+            path = self.attributes.compile_path(k)
+            if path.has(projection):
+                paths.append(path)
+                operations.append(self._dereference_reference(
+                    path,
+                    reference,
+                    projection,
+                    _memo
+                ))
+
+        results = yield from concurrently(operations)
+        for path, (value, error) in zip(paths, results):
+            if error is not None:
+                raise error
+            if value is not _missing:
+                path.set(self.attributes, value)
 
-                # local reference
-                if k in self.attributes and self.attributes[k]:
+        return self
 
-                    # one
-                    if type_ == "local_one":
-                        try:
-                            self.attributes[k] = entity["model"]({
-                                foreign_key: self.attributes[k]
-                            }).find(**kwargs)
+    def _dereference_reference(self, path, reference, projection, memo):
+        """ return the dereferenced value of the reference at path, _missing
+        when there is nothing to set """
 
-                        # dereference error
-                        except:
-                            error = DereferenceError(data={
-                                "model": entity["model"].__name__,
-                                "t": self.attributes[k]
-                            })
-                            self.attributes[k] = error
+        entity = Entities.get(reference["entity"])
+        type_ = reference["type"]
 
-                    # many
-                    elif type_ == "local_many":
+        if "foreign_key" in reference:
+            foreign_key = reference["foreign_key"]
+        else:
+            foreign_key = entity["model"].id_attribute
+
+        # many, found like the references of a collection of this model
+        if type_ in ("local_many", "foreign_many"):
+            values = yield from entity["collection"]()._dereference_batch(
+                [self],
+                path,
+                reference,
+                path(projection),
+                memo
+            )
+            if values:
+                return values[0][1]
+            return _missing
+
+        value = path(self.attributes, None)
+
+        # local reference
+        if value:
+
+            # one
+            if type_ == "local_one":
+                model = yield from self._dereference_one(
+                    entity["model"],
+                    foreign_key,
+                    value,
+                    path(projection),
+                    memo
+                )
 
-                        collection = entity["collection"]().set_target(
-                            self.attributes[k],
-                            key=foreign_key
-                        ).find(**kwargs)
+                # dereference error
+                if model is None:
+                    return DereferenceError(data={
+                        "model": entity["model"].__name__,
+                        "t": value
+                    })
 
-                        # determine dereference errors
-                        models_found = collection.get_ids()
-                        for model_target in self.attributes[k]:
-                            if model_target not in models_found:
-                                error = DereferenceError(data={
-                                    "model": entity["collection"].__name__,
-                                    "target": model_target
-                                })
-                                collection.add(error)
+                return model
 
-                        self.attributes[k] = collection
+        # foreign reference
+        else:
+            source = entity["model"].id_attribute
+
+            # one
+            if type_ == "foreign_one":
+                return (yield from self._dereference_one(
+                    entity["model"],
+                    foreign_key,
+                    self.get(source),
+                    path(projection),
+                    memo
+                ))
+
+        return _missing
+
+    def _dereference_one(self, model_class, foreign_key, value, projection,
+                         memo):
+        """ return the model of model_class with value at foreign_key found
+        with projection, an int or a dict, None when it can not be found.
+        Values found with the same projection before in memo are not found
+        again """
+
+        key = memo.key(model_class, foreign_key, value, projection)
+        models = memo.get(key)
+        if models is not None:
+            return models[0] if models else None
+
+        # setup kwargs
+        kwargs = {}
 
-                # foreign reference
-                else:
-                    source = entity["model"].id_attribute
+        kwargs["_as_reference"] = True
 
-                    # one
-                    if type_ == "foreign_one":
-                        try:
-                            self.attributes[k] = entity["model"]({
-                                foreign_key: self.get(source)
-                            }).find(**kwargs)
+        if type(projection) is dict:
+            kwargs["projection"] = copy.deepcopy(projection)
 
-                        # dereference error
-                        except:
-                            self.attributes[k] = None
+        kwargs["_memo"] = memo.enter(self)
 
-                    # many
-                    elif type_ == "foreign_many":
-                        collection = entity["collection"]().set_target(
-                            self.get(source),
-                            key=foreign_key
-                        ).find(**kwargs)
+        try:
+            model = model_class({foreign_key: value})
+            model = yield from model._find(**kwargs)
+            models = [model]
+
+        # dereference error, only models not found are remembered
+        except ModelNotFound:
+            models = []
+        except Exception:
+            return None
 
-                        self.attributes[k] = collection
+        # models stopped before their references were dereferenced are not
+        # reused where they would be dereferenced
+        if not models or type(projection) is not dict or \
+                not model_class.references or \
+                kwargs["_memo"].descends(models[0]):
+            memo.set(key, models)
 
-        return self
+        return models[0] if models else None
 
     # view attributes
 
@@ -292,12 +551,13 @@ class Model(object):
         local_key = key
         for i, needle in enumerate(key, 1):
             local_key = key[:i]
+            path = self.attributes.compile_path(local_key)
 
             if needle:
                 if i < len(key) \
                         and self.attributes.has(local_key) \
-                        and isinstance(self.attributes.ref(local_key), EntityMeta): # noqa
-                    return self.attributes.ref(local_key).ref(
+                        and isinstance(path(self.attributes), EntityMeta): # noqa
+                    return path(self.attributes).ref(
                         key[i:],
                         create=create
                     )
@@ -311,15 +571,16 @@ class Model(object):
 
         for i, needle in enumerate(key, 1):
             local_key = key[:i]
+            path = self.attributes.compile_path(local_key)
 
             if not self.attributes.has(local_key):
                 return False
 
-            elif i < len(key) and isinstance(self.attributes.ref(local_key), EntityMeta): # noqa
+            elif i < len(key) and isinstance(path(self.attributes), EntityMeta): # noqa
 
-                return self.attributes.ref(local_key).has(key=key[i:])
+                return path(self.attributes).has(key=key[i:])
 
-            elif i < len(key) and type(self.attributes.ref(local_key)) is not dict: # noqa
+            elif i < len(key) and type(path(self.attributes)) is not dict: # noqa
                 return False
 
         return True
@@ -341,91 +602,138 @@ class Model(object):
         # setup projection
         if not setup:
 
-            if projection and type(projection) is not Projection:
-                projection = Projection(projection)
+            if projection and type(projection) not in [Projection,
+                                                       CompiledProjection]:
+                projection = CompiledProjection.compile(projection)
 
                 if self.get_projection and default:
-                    _projection = copy.deepcopy(self.get_projection)
-                    _projection.update(projection)
-                    projection = _projection
+                    projection = self.get_projection.compile().merge(
+                        projection
+                    )
 
             elif not projection and self.get_projection and default:
                 projection = self.get_projection
 
-        # setup haystack
-        attr = copy.deepcopy(self.attributes)
-        haystack = attr
+        if projection:
+            projection = CompiledProjection.compile(projection)
+            projection_type = projection.type
+        else:
+            projection = None
+            projection_type = None
 
         # setup needle
         if type(key) is not DelimitedStr:
             key = DelimitedStr(key)
 
-        for i, needle in enumerate(key, 1):
-            if not haystack.has(needle) and use_default_value:
-                return default_value
+        # walk to key, narrowing the projection along the way
+        haystack = self.attributes.__dict__
+        for i, needle in enumerate(key.keys, 1):
+            if not needle:
+                continue
+
+            if not isinstance(haystack, dict) or needle not in haystack:
+                return self.attributes._ref(
+                    self.attributes.__dict__,
+                    key,
+                    False,
+                    use_default_value,
+                    default_value if use_default_value else None
+                )
 
-            elif isinstance(haystack.ref(needle), EntityMeta):
-                if projection and projection.has(needle):
-                    projection = projection.clone(needle)
+            haystack = haystack[needle]
+            projection = self._narrow_projection(
+                projection,
+                projection_type,
+                needle
+            )
 
+            if isinstance(haystack, EntityMeta):
                 args[0] = key[i:]
-
-                return haystack.ref(needle).get(
+                return haystack.get(
                     *args,
                     projection=projection,
                     setup=True
                 )
 
-            elif isinstance(haystack.ref(needle), BaseException):
-                return haystack.ref(needle).get()
+            elif isinstance(haystack, BaseException):
+                return haystack.get()
 
-            # return haystack as dot notation container
-            elif isinstance(haystack.ref(needle), dict):
-                haystack = haystack.clone(needle)
+        if isinstance(haystack, dict):
+            return self._apply_projection(
+                haystack,
+                projection,
+                projection_type
+            )
 
-            # return value
-            else:
-                haystack = haystack.ref(needle)
+        return DelimitedDict._copy_tree(haystack)
 
-        if type(haystack) in [dict, DelimitedDict]:
-            data = {}
-            for k, v in haystack.items():
-                local_key = ".".join(key.keys + [k]) if key else k
+    @classmethod
+    def _narrow_projection(cls, projection, projection_type, needle):
+        """ return the projection of the value at needle when it is read
+        directly, None when everything under it is included """
 
-                if args:
-                    args[0] = local_key
-                else:
-                    args = [local_key]
+        if projection is None:
+            return None
+
+        value = projection.fields.get(needle)
+        if isinstance(value, CompiledProjection):
+            return value
+        elif value in [0, 1] or \
+                (value is None and projection_type == "exclusive"):
+            return None
+
+        # nothing under needle is included
+        return CompiledProjection.compile()
+
+    @classmethod
+    def _apply_projection(cls, data, projection, projection_type):
+        """ return a copy of container data with projection applied in a
+        single walk. Nested entities are passed the projection under their
+        key and dereference errors are replaced by their data """
+
+        immutable = DelimitedDict._immutable_types
+
+        applied = {}
+        stack = [(data, applied, projection)]
+        while stack:
+            data, output, projection = stack.pop()
+            for k, v in data.items():
 
                 # no projection or include or missing from
                 # exclusive projection
-                if not projection or \
-                        (not projection.has(local_key) and projection.validate() == "exclusive") or \
-                        (projection.has(local_key) and projection.get(local_key) == 1):
+                if projection is not None:
+                    value = projection.fields.get(k)
+                    if isinstance(value, CompiledProjection):
+                        child_projection = value
+                    elif value == 1 or \
+                            (value is None and
+                             projection_type == "exclusive"):
+                        child_projection = None
+                    else:
+                        continue
+                else:
+                    child_projection = None
 
-                    data[k] = self.get(
-                        *args,
-                        setup=True
-                    )
+                if type(v) in immutable:
+                    output[k] = v
+
+                elif isinstance(v, dict):
+                    output[k] = {}
+                    stack.append((v, output[k], child_projection))
 
-                # exclude
-                elif projection.has(local_key) and \
-                        projection.get(local_key) == 0:
-                    continue
-
-                # include with projection
-                elif projection.has(local_key) and \
-                        type(projection.get(local_key)) is dict:
-                    data[k] = self.get(
-                        *args,
-                        projection=projection,
+                elif isinstance(v, EntityMeta):
+                    output[k] = v.get(
+                        projection=child_projection,
                         setup=True
                     )
 
-            return data
+                elif isinstance(v, BaseException):
+                    output[k] = v.get()
 
-        else:
-            return copy.deepcopy(haystack)
+                else:
+                    output[k] = DelimitedDict._copy_tree(v)
+
+        return applied
 
     # update attributes
 
@@ -444,6 +752,7 @@ class Model(object):
 
         for i, needle in enumerate(key, 1):
             local_key = key[:i]
+            path = self.attributes.compile_path(local_key)
 
             if not self.attributes.has(local_key):
                 if not create:
@@ -452,9 +761,9 @@ class Model(object):
                     )
 
             elif i < len(key) and \
-                    isinstance(self.attributes.ref(local_key), EntityMeta):
+                    isinstance(path(self.attributes), EntityMeta):
 
-                return self.attributes.ref(local_key).set(
+                return path(self.attributes).set(
                     key=key[i:],
                     value=value,
                     create=create,
@@ -462,11 +771,11 @@ class Model(object):
                 )
 
             elif i < len(key) and \
-                    type(self.attributes.ref(local_key)) is not dict:
+                    type(path(self.attributes)) is not dict:
 
                 if not create:
                     message = self.attributes._format_typeerror(
-                        self.attributes.ref(local_key),
+                        path(self.attributes),
                         needle,
                         key
                     )
@@ -474,10 +783,11 @@ class Model(object):
 
         self.attributes.set(key, value, create=create)
 
-        if record:
+        if record and self.record_updates:
             if not self.original or not \
                     self.original.has(key) or \
-                    self.original.ref(key) != value:
+                    self.original.fingerprints_differ(self.attributes, key) or \
+                    self.original.compile_path(key)(self.original) != value:
 
                 self.record_update(
                     "$set",
@@ -499,35 +809,36 @@ class Model(object):
 
             for i, needle in enumerate(key, 1):
                 local_key = key[:i]
+                path = self.attributes.compile_path(local_key)
 
                 if not self.attributes.has(local_key):
                     message = self.attributes._format_keyerror(needle, key)
                     raise KeyError(message)
 
                 elif i < len(key) and \
-                        isinstance(self.attributes.ref(local_key), EntityMeta):
-                    return self.attributes.ref(local_key).unset(
+                        isinstance(path(self.attributes), EntityMeta):
+                    return path(self.attributes).unset(
                         key=key[i:],
                         record=record,
                         force=force
                     )
 
                 elif i < len(key) and \
-                        isinstance(self.attributes.ref(local_key),
+                        isinstance(path(self.attributes),
                                    DereferenceError):
 
                     message = self.attributes._format_typeerror(
-                        self.attributes.ref(local_key),
+                        path(self.attributes),
                         needle,
                         key
                     )
                     raise TypeError(message)
 
                 elif i < len(key) and \
-                        type(self.attributes.ref(local_key)) is not dict:
+                        type(path(self.attributes)) is not dict:
 
                     message = self.attributes._format_typeerror(
-                        self.attributes.ref(local_key),
+                        path(self.attributes),
                         needle,
                         key
                     )
@@ -541,7 +852,7 @@ class Model(object):
             else:
                 raise
 
-        if record:
+        if record and self.record_updates:
             if not self.original or self.original.has(key):
                 self.record_update("$unset", copy.copy(key), "")
 
@@ -559,6 +870,7 @@ class Model(object):
 
         for i, needle in enumerate(key, 1):
             local_key = key[:i]
+            path = self.attributes.compile_path(local_key)
 
             if not self.attributes.has(local_key):
                 if not create:
@@ -566,8 +878,8 @@ class Model(object):
                     raise KeyError(message)
 
             elif i < len(key) and \
-                    isinstance(self.attributes.ref(local_key), EntityMeta):
-                return self.attributes.ref(local_key).push(
+                    isinstance(path(self.attributes), EntityMeta):
+                return path(self.attributes).push(
                     key=key[i:],
                     value=value,
                     create=create,
@@ -575,10 +887,10 @@ class Model(object):
                 )
 
             elif i < len(key) and \
-                    type(self.attributes.ref(local_key)) is not dict:
+                    type(path(self.attributes)) is not dict:
                 if not create:
                     message = self.attributes._format_typeerror(
-                        self.attributes.ref(local_key),
+                        path(self.attributes),
                         needle,
                         key
                     )
@@ -586,7 +898,7 @@ class Model(object):
 
         self.attributes.push(key, value, create=create)
 
-        if record:
+        if record and self.record_updates:
             self.record_update("$push", copy.copy(key), copy.deepcopy(value))
 
         return self
@@ -604,14 +916,15 @@ class Model(object):
 
             for i, needle in enumerate(key, 1):
                 local_key = key[:i]
+                path = self.attributes.compile_path(local_key)
 
                 if not self.attributes.has(local_key):
                     message = self.attributes._format_keyerror(needle, key)
                     raise KeyError(message)
 
                 elif i < len(key) and \
-                        isinstance(self.attributes.ref(local_key), EntityMeta):
-                    return self.attributes.ref(local_key).pull(
+                        isinstance(path(self.attributes), EntityMeta):
+                    return path(self.attributes).pull(
                         key=key[i:],
                         value=value,
                         record=record,
@@ -620,9 +933,9 @@ class Model(object):
                     )
 
                 elif i < len(key) and \
-                        type(self.attributes.ref(local_key)) is not dict:
+                        type(path(self.attributes)) is not dict:
                     message = self.attributes._format_typeerror(
-                        self.attributes.ref(local_key),
+                        path(self.attributes),
                         needle,
                         key
                     )
@@ -636,7 +949,7 @@ class Model(object):
             else:
                 raise
 
-        if record:
+        if record and self.record_updates:
             if not self.original or \
                     self.original.has(key) and value in self.original.get(key):
                 self.record_update(
@@ -780,11 +1093,14 @@ class Model(object):
         }
 
     def save(self, cascade=True, default=True):
+        return self.driver.run(self._save(cascade, default))
 
-        connection = Connections.get(
-            self.connection,
-            self.collection
-        )
+    def _save(self, cascade=True, default=True):
+
+        # compute updates from the document when they are not recorded
+        updates = self.updates
+        if not self.record_updates and self.target and not self._delete:
+            updates = yield from self._diff(cascade=cascade)
 
         # delete
         if self._delete:
@@ -796,7 +1112,9 @@ class Model(object):
                 self.pre_delete_hook()
 
             # run operation
-            m = connection.find_one_and_delete(self.target.collapse())
+            m = yield Operation(type(self), "find_one_and_delete", {
+                "filter": self.target.collapse()
+            })
 
             # cache operation
             self.cache_operation("delete", self.target.collapse())
@@ -804,28 +1122,41 @@ class Model(object):
             if m is None:
                 raise ModelNotDeleted(data=self.target.collapse())
 
+            session = Session.current()
+            if session is not None:
+                session.evict(self)
+
+            cache = self.get_find_cache()
+            if cache is not None:
+                cache.invalidate(self.get_id())
+
             # cache result
             self.cache_result()
 
             if cascade:
-                self.reference_entities(self.attributes)
+                yield from self._reference_entities(self.attributes)
 
             if callable(getattr(self, "post_delete_hook", None)):
                 self.post_delete_hook()
 
         # update
-        elif self.target and self.updates:
+        elif self.target and updates:
 
             if callable(getattr(self, "pre_update_hook", None)):
                 self.pre_update_hook()
 
+                # the hook may have changed the document
+                if not self.record_updates:
+                    updates = yield from self._diff()
+
             # run operation
-            updates = self.flatten_updates(cascade=cascade)
+            if self.record_updates:
+                updates = yield from self._flatten_updates(cascade=cascade)
 
-            m = connection.find_one_and_update(
-                self.target.collapse(),
-                updates
-            )
+            m = yield Operation(type(self), "find_one_and_update", {
+                "filter": self.target.collapse(),
+                "update": updates
+            })
 
             # cache operation
             self.cache_operation("update", self.target.collapse(), updates)
@@ -833,6 +1164,10 @@ class Model(object):
             if m is None:
                 raise ModelNotUpdated(data=self.target.collapse())
 
+            cache = self.get_find_cache()
+            if cache is not None:
+                cache.invalidate(self.get_id())
+
             # cache result
             self.cache_result(self.target.collapse(), m)
 
@@ -853,30 +1188,69 @@ class Model(object):
             # cache operation
             self.cache_operation("insert", None, {"$set": self.attributes.get()})
 
-            m = connection.insert_one(
-                self.reference_entities(self.attributes, cascade)
-            )
+            m = yield Operation(type(self), "insert_one", {
+                "document": (yield from self._reference_entities(
+                    self.attributes,
+                    cascade
+                ))
+            })
 
             # cache result
             self.cache_result(self.target.collapse(), self.attributes.get())
 
             self._post_insert_hook()
+            self._post_insert_cache_hook()
             if callable(getattr(self, "post_insert_hook", None)):
                 self.post_insert_hook()
 
-        # cascade save to nested models
-        elif cascade:
-            self.reference_entities(self.attributes, cascade)
+        # cascade save to nested models, already saved by _diff when updates
+        # are not recorded
+        elif cascade and self.record_updates:
+            yield from self._reference_entities(self.attributes, cascade)
 
         return self
 
     def flatten_updates(self, cascade=True):
+        return self.driver.run(self._flatten_updates(cascade))
+
+    def _flatten_updates(self, cascade=True):
         flattened = {}
-        for method, updates in self.reference_entities(self.updates).items():
+        referenced = yield from self._reference_entities(self.updates)
+        for method, updates in referenced.items():
             flattened[method] = DelimitedDict(updates).collapse()
         return flattened
 
+    def diff(self, cascade=False):
+        """ return updates in MongoDB operator syntax that change the original
+        state of the document into the current state, dereferenced entities
+        are replaced with their foreign keys and saved if cascade is True """
+        return self.driver.run(self._diff(cascade))
+
+    def _diff(self, cascade=False):
+        attributes = self.attributes
+        if self.references:
+            attributes = self._drop_placeholders((
+                yield from self._reference_entities(attributes, cascade)
+            ))
+        return self.original.diff(attributes)
+
     def reference_entities(self, data, cascade=True):
+        return self.driver.run(self._reference_entities(data, cascade))
+
+    def _reference_entities(self, data, cascade=True):
+
+        # nested models are saved before their keys are read
+        if cascade:
+            references = self.references.collapse()
+            for k, v in data.collapse().items():
+                if k in references and isinstance(v, EntityMeta):
+                    yield from v._save(cascade=cascade)
+
+        return self._referenced(data)
+
+    def _referenced(self, data):
+        """ return data with dereferenced entities replaced with their
+        foreign keys """
 
         referenced = DelimitedDict()
         references = self.references.collapse()
@@ -887,9 +1261,6 @@ class Model(object):
             # value in data is dereferenced entity
             if k in references and isinstance(v, EntityMeta):
 
-                if cascade:
-                    v.save(cascade=cascade)
-
                 reference = references[k]
                 entity = Entities.get(reference["entity"])
 
@@ -910,6 +1281,26 @@ class Model(object):
 
         return referenced
 
+    def _drop_placeholders(self, referenced):
+        """ return referenced data as it is stored, failed local references
+        keep their target and foreign references are left out """
+
+        for k, reference in self.references.collapse().items():
+            if not referenced.has(k):
+                continue
+            if reference["type"] in ("foreign_one", "foreign_many"):
+                referenced.unset(k)
+            elif isinstance(referenced.ref(k), DereferenceError):
+                referenced.set(k, referenced.ref(k).data["t"])
+
+        return referenced
+
+    def _stored_attributes(self):
+        """ return attributes as they are stored """
+        if not self.references:
+            return self.attributes
+        return self._drop_placeholders(self._referenced(self.attributes))
+
     # hooks
 
     def _pre_insert_hook(self, default=True):
@@ -919,15 +1310,84 @@ class Model(object):
     def _post_insert_hook(self):
         if self.has(self.id_attribute):
             self.set_target(self.attributes.get(self.id_attribute))
-        self.original(copy.deepcopy(self.attributes))
+        self.original(self._stored_attributes().get(), expand=False)
         self.updates.clear()
+        self._build_fingerprints()
+
+    def _post_insert_cache_hook(self):
+        id_filter = self.get_id_filter()
+        if id_filter is not None:
+            id_filter.add(self.get_id())
+
+        not_found_cache = self.get_not_found_cache()
+        if not_found_cache is not None:
+            not_found_cache.invalidate(self.get_id())
 
     def _post_find_hook(self, data):
+        # documents from the database never have delimited keys, raw
+        # documents are decoded in one pass unless lazy and are not copied,
+        # original reads the same bytes
+        if isinstance(data, RawDocument):
+            original = RawDocument(data.raw, data.codec_options)
+            if not self.lazy:
+                data = data.decode()
+            self.attributes(data, expand=False)
+            self.original(original, expand=False)
+        else:
+            self.attributes(data)
+            self.original(self.attributes.get(), expand=False)
+
         if self.id_attribute in data:
             self.set_target(data[self.id_attribute])
-        self.attributes(data)
-        self.original(copy.deepcopy(data))
+
+        self._build_fingerprints()
+
+    def _build_fingerprints(self):
+        """ build the fingerprints of attributes and original when the
+        fingerprints option is set, lazy documents are not fingerprinted so
+        they are not decoded """
+
+        if self.fingerprints and not self.lazy:
+            self.attributes.fingerprint()
+            self.original.fingerprint()
 
     def _post_update_hook(self):
-        self.original(copy.deepcopy(self.attributes))
+        self.original(self._stored_attributes().get(), expand=False)
         self.updates.clear()
+        self._build_fingerprints()
+
+
+class AsyncModel(Model):
+    """
+    AsyncModel is a Model with awaitable find, save, dereference_entities,
+    flatten_updates, diff and reference_entities, sharing the target,
+    projection, update recording and hook logic of Model.
+    Database operations are run by an AsyncDriver, ExecutorDriver runs them
+    with pymongo in the default executor, set `driver` to an AsyncDriver to
+    use an asyncio client. Entities use it as a model base class,
+    `Entity(name, {"bases": AsyncModel})`.
+    """
+
+    # runs the database operations of find, save, dereference_entities and
+    # the cascaded saves of flatten_updates, diff and reference_entities
+    driver = ExecutorDriver()
+
+    async def find(self, projection=None, default=True, _as_reference=False):
+        return await self.driver.run(
+            self._find(projection, default, _as_reference)
+        )
+
+    async def dereference_entities(self, projection):
+        return await self.driver.run(self._dereference_entities(projection))
+
+    async def save(self, cascade=True, default=True):
+        return await self.driver.run(self._save(cascade, default))
+
+    async def flatten_updates(self, cascade=True):
+        return await self.driver.run(self._flatten_updates(cascade))
+
+    async def diff(self, cascade=False):
+        return await self.driver.run(self._diff(cascade))
+
+    async def reference_entities(self, data, cascade=True):
+        return await self.driver.run(self._reference_entities(data, cascade))
@@ -1,6 +1,9 @@
 
-import copy
+import threading
 
+from collections import OrderedDict
+
+from .delimited import DelimitedStr
 from .delimited import DelimitedDict
 from .exceptions import ProjectionMalformed
 from .exceptions import ProjectionTypeMismatch
@@ -27,6 +30,9 @@ class Projection(DelimitedDict):
     def flatten(self):
         return self._flatten(self)
 
+    def compile(self):
+        return CompiledProjection.compile(self)
+
     def merge(self, data):
         if type(data) is not Projection:
             data = Projection(data)
@@ -42,52 +48,11 @@ class Projection(DelimitedDict):
         self.__dict__ = self.merge(data).__dict__
 
     @classmethod
-    def _validate(cls, p, parent_type=None):
-
-        # check for invalid values
-        for k, v in p.items():
-            if v not in [-1, 0, 1, 2] and type(v) not in [dict, Projection]:
-                raise ProjectionMalformed(k, v)
-
-        # checking for -1, 1, 2, dict, Projection
-        if any(v == 1 for v in p.values()) and \
-                all(v in [-1, 1, 2] or
-                    type(v) in [dict, Projection] for v in p.values()):
-            local_type = "inclusive"
-
-        # checking for -1, 0, 2, dict, Projection
-        elif any(v == 0 for v in p.values()) and \
-                all(v in [-1, 0, 2] or
-                    type(v) in [dict, Projection] for v in p.values()):
-            local_type = "exclusive"
-
-        # checking for -1, 2, dict, Projection
-        elif all(v in [-1, 2] or
-                 type(v) in [dict, Projection] for v in p.values()):
-            local_type = None
-
-        # values are valid but types are mixed
-        else:
-            raise ProjectionTypeMismatch
-
-        # check type recursively
-        for value in p.values():
-            if type(value) is dict:
-
-                try:
-                    child_type = cls._validate(value, parent_type)
-                except ProjectionMalformed as e:
-                    raise ProjectionMalformed(
-                        "{}.{}".format(k, e.args[0]), e.args[1]
-                    )
-
-                if child_type and local_type and child_type != local_type:
-                    raise ProjectionTypeMismatch
+    def _validate(cls, p):
+        """ return the type of projection p, "inclusive", "exclusive" or None,
+        validated in a single pass """
 
-                if child_type and not local_type:
-                    local_type = child_type
-
-        return local_type
+        return CompiledProjection.compile(p).type
 
     @classmethod
     def _flatten(cls, projection):
@@ -96,27 +61,7 @@ class Projection(DelimitedDict):
         # 1 = include
         # 2 = resolve reference
         # Projection = resolve reference and pass projection forward
-        projection_type = projection.validate()
-        projection = copy.copy(projection)
-        flattened = copy.copy(projection)
-
-        # inclusive
-        # 2 ----------> 1
-        # Projection -> 1
-        if projection_type == "inclusive":
-            for key, val in projection.items():
-                if val == 2 or type(val) in [dict, Projection]:
-                    flattened[key] = 1
-
-        # exclusive, None
-        # 2 ----------> [ remove ]
-        # Projection -> [ remove ]
-        elif projection_type in ["exclusive", None]:
-            for key, val in projection.items():
-                if val == 2 or type(val) in [dict, Projection]:
-                    del flattened[key]
-
-        return flattened.get()
+        return CompiledProjection.compile(projection).flatten()
 
     @classmethod
     def _merge(cls, projection1, projection2):
@@ -135,3 +80,269 @@ class Projection(DelimitedDict):
                 projection2[key] = projection1[key]
 
         return projection2
+
+
+class CompiledProjection(object):
+    """ An immutable, validated projection. Nested projections are compiled
+    projections themselves, the type and flattened form are computed once.
+
+    Compiled projections are interned in a bounded cache keyed by content,
+    so compiling an equal projection again costs a single walk of its keys
+    and returns the same instance. Merges are memoized by the contents of
+    both sides, merging a default projection with the same per call
+    projection is a cache hit.
+
+    Instances are created with `Projection.compile` or
+    `CompiledProjection.compile`.
+    """
+
+    __slots__ = ("key", "fields", "type", "_flattened", "_hash")
+
+    # compiled projections keyed by content
+    cache = OrderedDict()
+    cache_size = 4096
+
+    # merged projections keyed by (key, key)
+    merge_cache = OrderedDict()
+    merge_cache_size = 4096
+
+    # held while evicting and adding entries of either cache
+    _lock = threading.Lock()
+
+    def __setattr__(self, name, value):
+        raise AttributeError("{} is immutable".format(type(self).__name__))
+
+    def __delattr__(self, name):
+        raise AttributeError("{} is immutable".format(type(self).__name__))
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return (self.__class__.compile, (self.get(),))
+
+    def __repr__(self):
+        return "{}({!r})".format(type(self).__name__, self.get())
+
+    def __eq__(self, other):
+        if isinstance(other, CompiledProjection):
+            return self.key == other.key
+        if isinstance(other, DelimitedDict):
+            return self.get() == other.__dict__
+        if isinstance(other, dict):
+            return self.get() == other
+        return NotImplemented
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        if result is NotImplemented:
+            return result
+        return not result
+
+    def __hash__(self):
+        return self._hash
+
+    def __len__(self):
+        return len(self.fields)
+
+    def __iter__(self):
+        return iter(self.fields)
+
+    def __contains__(self, key):
+        return key in self.fields
+
+    def __getitem__(self, key):
+        return self.fields[key]
+
+    def items(self):
+        return self.fields.items()
+
+    def keys(self):
+        return self.fields.keys()
+
+    def values(self):
+        return self.fields.values()
+
+    def has(self, key):
+        try:
+            self.ref(key)
+            return True
+        except KeyError:
+            return False
+
+    def ref(self, key):
+        """ return the value or compiled projection at delimited key """
+
+        value = self
+        for needle in DelimitedStr(key).keys:
+            if not isinstance(value, CompiledProjection):
+                raise KeyError(key)
+            value = value.fields[needle]
+        return value
+
+    def get(self, key=None, *args):
+        """ return the projection, or the value at delimited key, as plain
+        data """
+
+        try:
+            value = self.ref(key) if key is not None else self
+        except KeyError:
+            if args:
+                return args[0]
+            raise
+
+        if not isinstance(value, CompiledProjection):
+            return value
+
+        data = {}
+        stack = [(value, data)]
+        while stack:
+            node, d = stack.pop()
+            for k, v in node.fields.items():
+                if isinstance(v, CompiledProjection):
+                    d[k] = {}
+                    stack.append((v, d[k]))
+                else:
+                    d[k] = v
+        return data
+
+    def flatten(self):
+        return dict(self._flattened)
+
+    def merge(self, data):
+        """ return the compiled projection of data merged into this one, keys
+        of data replace keys of this projection and -1 deletes them """
+
+        data = self.compile(data)
+
+        cache_key = (self.key, data.key)
+        try:
+            return CompiledProjection.merge_cache[cache_key]
+        except KeyError:
+            pass
+
+        if self.type and data.type and self.type != data.type:
+            raise ProjectionTypeMismatch
+
+        merged = Projection._merge(
+            Projection(data.get()),
+            Projection(self.get())
+        )
+        merged = self.compile(merged)
+
+        with CompiledProjection._lock:
+            while len(CompiledProjection.merge_cache) >= \
+                    CompiledProjection.merge_cache_size:
+                CompiledProjection.merge_cache.popitem(last=False)
+            CompiledProjection.merge_cache[cache_key] = merged
+
+        return merged
+
+    @classmethod
+    def compile(cls, data=None):
+        """ return the compiled projection of data, a Projection, dict or
+        compiled projection """
+
+        if isinstance(data, CompiledProjection):
+            return data
+
+        if data is None:
+            data = {}
+        elif isinstance(data, DelimitedDict):
+            data = data.__dict__
+        elif not isinstance(data, dict):
+            raise TypeError("expected dict or Projection, got {}".format(
+                type(data).__name__
+            ))
+        elif Projection._has_delimited_keys(data):
+            data = Projection._expand_delimited_notation(data)
+
+        return cls._from_key(cls._content_key(data))
+
+    @classmethod
+    def _content_key(cls, data, parent_key=None):
+        """ return a hashable key for the contents of projection data, raises
+        ProjectionMalformed for values that are not -1, 0, 1, 2 or nested
+        projections """
+
+        key = []
+        for k, v in data.items():
+            if isinstance(v, CompiledProjection):
+                key.append((k, v.key))
+
+            elif isinstance(v, (dict, DelimitedDict)):
+                if isinstance(v, DelimitedDict):
+                    v = v.__dict__
+                child_key = k if parent_key is None else \
+                    "{}.{}".format(parent_key, k)
+                key.append((k, cls._content_key(v, child_key)))
+
+            elif type(v) not in (tuple, list) and v in (-1, 0, 1, 2):
+                key.append((k, v))
+
+            else:
+                raise ProjectionMalformed(
+                    k if parent_key is None else "{}.{}".format(parent_key, k),
+                    v
+                )
+        return tuple(key)
+
+    @classmethod
+    def _from_key(cls, key):
+        try:
+            return cls.cache[key]
+        except KeyError:
+            pass
+
+        fields = {}
+        flattened = {}
+        types = set()
+        for k, v in key:
+
+            # nested projection
+            if type(v) is tuple:
+                v = cls._from_key(v)
+                types.add(v.type)
+
+            elif v == 1:
+                types.add("inclusive")
+            elif v == 0:
+                types.add("exclusive")
+
+            fields[k] = v
+
+        if "inclusive" in types and "exclusive" in types:
+            raise ProjectionTypeMismatch
+
+        if "inclusive" in types:
+            type_ = "inclusive"
+        elif "exclusive" in types:
+            type_ = "exclusive"
+        else:
+            type_ = None
+
+        # inclusive, 2 and projections become 1
+        # exclusive and None, 2 and projections are removed
+        for k, v in fields.items():
+            if isinstance(v, CompiledProjection) or v == 2:
+                if type_ == "inclusive":
+                    flattened[k] = 1
+            else:
+                flattened[k] = v
+
+        new = object.__new__(cls)
+        object.__setattr__(new, "key", key)
+        object.__setattr__(new, "fields", fields)
+        object.__setattr__(new, "type", type_)
+        object.__setattr__(new, "_flattened", flattened)
+        object.__setattr__(new, "_hash", hash(key))
+
+        with cls._lock:
+            while len(cls.cache) >= cls.cache_size:
+                cls.cache.popitem(last=False)
+            cls.cache[key] = new
+
+        return new
@@ -0,0 +1,214 @@
+"""
+baemo.raw
+~~~~~~~~~~~~~~~~~~~~~~~~~
+This module defines RawDocument, a dict over the bytes of a BSON document that
+decodes values the first time they are read.
+"""
+
+import bson
+import copy
+
+from bson.codec_options import DEFAULT_CODEC_OPTIONS
+from bson.raw_bson import RawBSONDocument
+from bson.raw_bson import DEFAULT_RAW_BSON_OPTIONS
+
+
+class RawDocument(dict):
+    """ A dict backed by a pymongo RawBSONDocument. Top level values are
+    decoded into plain dicts and lists the first time they are read by key,
+    values that are never read are never decoded. Iterating, comparing,
+    copying or writing decodes the remaining values first, after which the
+    instance behaves like a plain dict.
+
+    The raw bytes are kept in `raw` until then and can be used as an
+    immutable snapshot of the document. C extensions that read dicts
+    directly, such as the bson encoder, only see the values decoded so far,
+    call `load` or pass `dict(document)` instead.
+    """
+
+    __slots__ = ("raw", "codec_options")
+
+    def __init__(self, data=None, codec_options=None):
+        super().__init__()
+
+        if codec_options is None:
+            codec_options = DEFAULT_CODEC_OPTIONS
+        self.codec_options = codec_options
+        self.raw = None
+
+        if isinstance(data, RawDocument):
+            self.raw = data.raw
+            dict.update(self, dict.items(data))
+
+        elif isinstance(data, RawBSONDocument):
+            self.raw = data
+
+        elif isinstance(data, (bytes, memoryview)):
+            self.raw = RawBSONDocument(data, DEFAULT_RAW_BSON_OPTIONS)
+
+        elif data is not None:
+            dict.update(self, data)
+
+    def __getitem__(self, key):
+        try:
+            return dict.__getitem__(self, key)
+        except KeyError:
+            if self.raw is None:
+                raise
+
+        value = self._decode(self.raw[key])
+        dict.__setitem__(self, key, value)
+        return value
+
+    def __contains__(self, key):
+        if dict.__contains__(self, key):
+            return True
+        return self.raw is not None and key in self.raw
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __len__(self):
+        if self.raw is not None:
+            return len(self.raw)
+        return dict.__len__(self)
+
+    def __iter__(self):
+        self.load()
+        return dict.__iter__(self)
+
+    def __eq__(self, other):
+        self.load()
+        if isinstance(other, RawDocument):
+            other.load()
+        return dict.__eq__(self, other)
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    __hash__ = None
+
+    def __repr__(self):
+        self.load()
+        return dict.__repr__(self)
+
+    def __copy__(self):
+        return type(self)(self, self.codec_options)
+
+    def __deepcopy__(self, memo):
+        """ return a plain dict, values that were not read are decoded from
+        the raw bytes instead of copied """
+
+        if self.raw is None:
+            return copy.deepcopy(dict(dict.items(self)), memo)
+
+        new = {}
+        for key in self.raw:
+            if dict.__contains__(self, key):
+                new[key] = copy.deepcopy(dict.__getitem__(self, key), memo)
+            else:
+                new[key] = self._decode(self.raw[key])
+        return new
+
+    def __reduce__(self):
+        self.load()
+        return (dict, (dict(dict.items(self)),))
+
+    def keys(self):
+        self.load()
+        return dict.keys(self)
+
+    def items(self):
+        self.load()
+        return dict.items(self)
+
+    def values(self):
+        self.load()
+        return dict.values(self)
+
+    def copy(self):
+        return self.__copy__()
+
+    def load(self):
+        """ decode every value that has not been read yet, keeping the order
+        of the document """
+
+        if self.raw is None:
+            return self
+
+        raw = self.raw
+        self.raw = None
+
+        items = []
+        for key in raw:
+            if dict.__contains__(self, key):
+                items.append((key, dict.__getitem__(self, key)))
+            else:
+                items.append((key, self._decode(raw[key])))
+
+        dict.clear(self)
+        dict.update(self, items)
+        return self
+
+    def decode(self):
+        """ return the whole document decoded from the raw bytes in a single
+        pass, as codec_options.document_class """
+
+        if self.raw is None:
+            return copy.deepcopy(self)
+        return bson.decode(self.raw.raw, self.codec_options)
+
+    def _decode(self, value):
+        if isinstance(value, RawBSONDocument):
+            return bson.decode(value.raw, self.codec_options)
+        elif type(value) is list:
+            return [self._decode(v) for v in value]
+        return value
+
+    # writes decode the whole document first
+
+    def __setitem__(self, key, value):
+        self.load()
+        dict.__setitem__(self, key, value)
+
+    def __delitem__(self, key):
+        self.load()
+        dict.__delitem__(self, key)
+
+    def pop(self, *args):
+        self.load()
+        return dict.pop(self, *args)
+
+    def popitem(self):
+        self.load()
+        return dict.popitem(self)
+
+    def setdefault(self, key, default=None):
+        self.load()
+        return dict.setdefault(self, key, default)
+
+    def update(self, *args, **kwargs):
+        self.load()
+        dict.update(self, *args, **kwargs)
+
+    def clear(self):
+        self.raw = None
+        dict.clear(self)
+
+
+def with_raw_documents(connection, document_class=dict):
+    """ return connection set to find RawBSONDocuments, and the codec options
+    of connection set to decode them into document_class """
+
+    codec_options = connection.codec_options
+    connection = connection.with_options(
+        codec_options=codec_options.with_options(
+            document_class=RawBSONDocument
+        )
+    )
+    return connection, codec_options.with_options(
+        document_class=document_class
+    )
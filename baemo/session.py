@@ -0,0 +1,113 @@
+"""
+baemo.session
+~~~~~~~~~~~~~~~~~~~~~~~~~
+This module defines Session, an identity map of the models found while it is
+active.
+"""
+
+import weakref
+import contextvars
+
+
+# the active session of the current thread or task
+_current = contextvars.ContextVar("baemo_session", default=None)
+
+# matches any projection in Session.get
+_any = object()
+
+
+class Session(object):
+    """ An identity map of models keyed by (model class, id). While a session
+    is active `Model.find` for a target that is only an id does not query
+    the database when a model was already found in the session with the same
+    projection, the model `find` is called on shares the target, attributes,
+    original and updates of that model so changes made through either are
+    seen by both. `Model.find` and `Collection.find` add the models they
+    find, deleting a model evicts it.
+
+    Models are held by weak reference and drop out of the session when they
+    are no longer used elsewhere. Sessions are activated with `with` and are
+    local to the thread or task that activated them.
+    """
+
+    def __init__(self):
+        self.models = {}
+        self._tokens = []
+
+    def __enter__(self):
+        self._tokens.append(_current.set(self))
+        return self
+
+    def __exit__(self, *exc):
+        _current.reset(self._tokens.pop())
+
+    def __len__(self):
+        return len(self.models)
+
+    def __contains__(self, model):
+        return self.get(type(model), model.get_id(), _any) is model
+
+    @classmethod
+    def current(cls):
+        """ return the active session or None """
+        return _current.get()
+
+    def get(self, model_class, id, projection=None):
+        """ return the model of model_class with id found with projection,
+        None if it is not in the session """
+
+        try:
+            ref, found_projection = self.models[(model_class, id)]
+        except (KeyError, TypeError):
+            return None
+
+        if projection is not _any and found_projection != projection:
+            return None
+        return ref()
+
+    def add(self, model, projection=None):
+        """ add model found with projection to the session, replacing the
+        model with the same id """
+
+        key = (type(model), model.get_id())
+        if key[1] is None:
+            return
+
+        try:
+            hash(key)
+        except TypeError:
+            return
+
+        self.models[key] = (
+            weakref.ref(model, self._forget(self.models, key)),
+            projection
+        )
+
+    def evict(self, model, id=None):
+        """ remove model from the session, or the model of class model with
+        id when id is passed """
+
+        if id is None:
+            key = (type(model), model.get_id())
+        else:
+            key = (model, id)
+
+        try:
+            del self.models[key]
+        except (KeyError, TypeError):
+            pass
+
+    def clear(self):
+        self.models.clear()
+
+    @staticmethod
+    def _forget(models, key):
+        """ return a weakref callback removing key from models if it still
+        refers to the collected model """
+
+        def forget(ref):
+            entry = models.get(key)
+            if entry is not None and entry[0] is ref:
+                del models[key]
+
+        return forget
@@ -1,6 +1,9 @@
 
+import threading
+
 from collections import OrderedDict
 
+from .delimited import DelimitedStr
 from .delimited import DelimitedOrderedDict
 from .exceptions import SortMalformed
 
@@ -51,6 +54,9 @@ class Sort(DelimitedOrderedDict):
     def validate(self):
         return self._validate(self.__dict__)
 
+    def compile(self):
+        return CompiledSort.compile(self)
+
     @classmethod
     def _wrap(cls, data):
         for k, v in data.items():
@@ -66,21 +72,221 @@ class Sort(DelimitedOrderedDict):
 
     @classmethod
     def _flatten(cls, sort, remove=None):
-        """ requires sort or something that can be collapsed """
+        """ requires sort or something that can be collapsed, keys of remove
+        are dropped along with the keys under them """
 
         c = sort.collapse()
         if remove is not None:
-            for sep_k in remove.collapse().keys():
-                for col_k in c.keys():
-                    if col_k.startswith(sep_k):
-                        del c[col_k]
-                        break
+            for sep_k in remove.paths():
+                for col_k in sort.paths(sep_k):
+                    c.pop(col_k, None)
         return list(c.items())
 
     @classmethod
     def _validate(cls, data):
-        data = cls._collapse_delimited_notation(data)
-        for t in data.items():
+        for t in cls._iter_collapsed_delimited_notation(data):
             if t[1] not in [-1, 1] and type(t[1]) not in [OrderedDict, SortOperator]:
                 raise SortMalformed(t[0], t[1])
         return True
+
+
+class CompiledSort(object):
+    """ An immutable, validated sort holding its flattened pymongo sort list.
+
+    Compiled sorts are interned in a bounded cache keyed by content, sort
+    lists without delimited keys are compiled without building a Sort.
+    Merges are memoized by the contents of both sides, merging the default
+    sort of a collection with the same per query sort is a cache hit.
+
+    Instances are created with `Sort.compile` or `CompiledSort.compile`.
+    """
+
+    __slots__ = ("key", "items", "_hash")
+
+    # compiled sorts keyed by content
+    cache = OrderedDict()
+    cache_size = 4096
+
+    # merged sorts keyed by (key, key)
+    merge_cache = OrderedDict()
+    merge_cache_size = 4096
+
+    # held while evicting and adding entries of either cache
+    _lock = threading.Lock()
+
+    def __setattr__(self, name, value):
+        raise AttributeError("{} is immutable".format(type(self).__name__))
+
+    def __delattr__(self, name):
+        raise AttributeError("{} is immutable".format(type(self).__name__))
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return (self.__class__.compile, (list(self.items),))
+
+    def __repr__(self):
+        return "{}({!r})".format(type(self).__name__, list(self.items))
+
+    def __eq__(self, other):
+        if isinstance(other, CompiledSort):
+            return self.key == other.key
+        return NotImplemented
+
+    def __ne__(self, other):
+        if isinstance(other, CompiledSort):
+            return self.key != other.key
+        return NotImplemented
+
+    def __hash__(self):
+        return self._hash
+
+    def __len__(self):
+        return len(self.items)
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def flatten(self, remove=None):
+        """ return the pymongo sort list, keys of remove are dropped along
+        with the keys under them """
+
+        if remove is None:
+            return list(self.items)
+
+        delimiter = DelimitedStr.default_delimiter
+        removed = set(k for k, v in self.compile(remove).items)
+
+        flattened = []
+        for k, v in self.items:
+            prefix = None
+            for needle in k.split(delimiter):
+                prefix = needle if prefix is None else \
+                    "{}{}{}".format(prefix, delimiter, needle)
+                if prefix in removed:
+                    break
+            else:
+                flattened.append((k, v))
+        return flattened
+
+    def merge(self, data):
+        """ return the compiled sort of data merged into this one, keys of
+        data replace keys of this sort and new keys are added after them """
+
+        data = self.compile(data)
+
+        cache_key = (self.key, data.key)
+        try:
+            return CompiledSort.merge_cache[cache_key]
+        except KeyError:
+            pass
+
+        merged = Sort(list(self.items))
+        merged.update(list(data.items))
+        merged = self.compile(merged)
+
+        with CompiledSort._lock:
+            while len(CompiledSort.merge_cache) >= \
+                    CompiledSort.merge_cache_size:
+                CompiledSort.merge_cache.popitem(last=False)
+            CompiledSort.merge_cache[cache_key] = merged
+
+        return merged
+
+    @classmethod
+    def compile(cls, data=None):
+        """ return the compiled sort of data, a Sort, OrderedDict, list of
+        (key, direction) tuples, a single tuple or a compiled sort """
+
+        if isinstance(data, CompiledSort):
+            return data
+
+        if data is None:
+            items = ()
+
+        elif isinstance(data, Sort):
+            items = tuple(data.collapse().items())
+
+        else:
+            if type(data) is tuple:
+                data = [data]
+            elif isinstance(data, dict):
+                data = list(data.items())
+
+            items = cls._flat_items(data)
+            if items is None:
+                items = tuple(Sort(data).collapse().items())
+
+        key = []
+        for k, v in items:
+            if isinstance(v, OrderedDict):
+                v = (type(v), tuple(v.items()))
+            elif v not in [-1, 1]:
+                raise SortMalformed(k, v)
+            key.append((k, v))
+        key = tuple(key)
+
+        try:
+            return cls.cache[key]
+        except KeyError:
+            pass
+
+        new = object.__new__(cls)
+        object.__setattr__(new, "key", key)
+        object.__setattr__(new, "items", items)
+        object.__setattr__(new, "_hash", hash(key))
+
+        with cls._lock:
+            while len(cls.cache) >= cls.cache_size:
+                cls.cache.popitem(last=False)
+            cls.cache[key] = new
+
+        return new
+
+    @classmethod
+    def _flat_items(cls, data):
+        """ return data, a list of (key, direction) tuples, as a tuple if a
+        Sort would flatten it unchanged, otherwise None. That is when keys
+        are not repeated, no key is under another and keys under the same
+        parent are next to each other """
+
+        delimiter = DelimitedStr.default_delimiter
+
+        keys = set()
+        parents = set()
+        closed = set()
+        previous = ()
+
+        for t in data:
+            if type(t) is not tuple or len(t) != 2 or \
+                    type(t[1]) is not int or t[1] not in (-1, 1):
+                return None
+
+            key = t[0]
+            if type(key) is not str or key in keys or key in parents:
+                return None
+
+            if delimiter in key:
+                needles = key.split(delimiter)
+                if "" in needles:
+                    return None
+
+                current = []
+                for i in range(1, len(needles)):
+                    parent = delimiter.join(needles[:i])
+                    if parent in keys or parent in closed:
+                        return None
+                    current.append(parent)
+            else:
+                current = []
+
+            closed.update(p for p in previous if p not in current)
+            parents.update(current)
+            keys.add(key)
+            previous = current
+
+        return tuple(data)
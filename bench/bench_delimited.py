@@ -0,0 +1,122 @@
+# baemo benchmarks
+# run from the repository root: python bench/bench_delimited.py
+
+import sys; sys.path.append(".") # noqa
+
+import timeit
+
+from baemo.delimited import DelimitedDict
+
+
+def bench(label, stmt, setup, number=200):
+    seconds = min(timeit.repeat(
+        stmt,
+        setup,
+        number=number,
+        repeat=5,
+        globals=globals()
+    ))
+    print("{:<40} {:>10.2f} us".format(label, seconds / number * 1e6))
+
+
+def document(width=20, depth=3):
+    if depth == 0:
+        return "v"
+    return {"k{}".format(i): document(width, depth - 1) for i in range(width)}
+
+
+if __name__ == "__main__":
+
+    bench(
+        "DelimitedDict(flat document)",
+        "DelimitedDict(data)",
+        "data = document(width=200, depth=1)",
+        number=2000
+    )
+    bench(
+        "DelimitedDict(nested document)",
+        "DelimitedDict(data)",
+        "data = document()"
+    )
+    bench(
+        "DelimitedDict(delimited keys)",
+        "DelimitedDict(data)",
+        "data = DelimitedDict(document()).collapse()",
+        number=20
+    )
+    bench(
+        "DelimitedDict.collapse()",
+        "d.collapse()",
+        "d = DelimitedDict(document())",
+        number=20
+    )
+
+    setup = (
+        "d = DelimitedDict(document()); "
+        "data = {k: 1 for k in d.collapse()}"
+    )
+    bench(
+        "set() every collapsed key",
+        "for k, v in data.items(): d.set(k, v)",
+        setup,
+        number=20
+    )
+    bench(
+        "set_many(collapsed document)",
+        "d.set_many(data)",
+        setup,
+        number=20
+    )
+    bench(
+        "unset(cleanup=True) every collapsed key",
+        "d(document())\nfor k in data: d.unset(k, cleanup=True)",
+        setup,
+        number=20
+    )
+    bench(
+        "unset_many(collapsed keys, cleanup=True)",
+        "d(document())\nd.unset_many(data, cleanup=True)",
+        setup,
+        number=20
+    )
+
+    bench(
+        "set('k1.k1.k1', 1) then hash()",
+        "d.set('k1.k1.k1', 1); hash(d)",
+        "d = DelimitedDict(document()); hash(d)",
+        number=200
+    )
+
+    for indexed in [False, True]:
+        DelimitedDict.indexed = indexed
+        print("indexed = {}".format(indexed))
+
+        bench(
+            "count('k1')",
+            "d.count('k1')",
+            "d = DelimitedDict(document()); d.count()",
+            number=200
+        )
+        bench(
+            "set('k1.k1.k1', {...}) then count('k1')",
+            "d.set('k1.k1.k1', {'k': 1}); d.count('k1')",
+            "d = DelimitedDict(document()); d.count()",
+            number=200
+        )
+
+    DelimitedDict.indexed = False
+
+    setup = "d = DelimitedDict(document())"
+
+    for copy_on_write in [False, True]:
+        DelimitedDict.copy_on_write = copy_on_write
+        print("copy_on_write = {}".format(copy_on_write))
+
+        bench("DelimitedDict.get()", "d.get()", setup)
+        bench("DelimitedDict.clone()", "d.clone()", setup)
+        bench("DelimitedDict.merge({...})", "d.merge({'k1.k1.k1': 1})", setup)
+        bench(
+            "clone() then set('k1.k1.k1', 1)",
+            "d.clone().set('k1.k1.k1', 1)",
+            setup
+        )
@@ -0,0 +1,79 @@
+# baemo benchmarks
+# run from the repository root: python bench/bench_model_find.py
+
+import sys; sys.path.append(".") # noqa
+
+import bson
+import timeit
+
+from bson.codec_options import DEFAULT_CODEC_OPTIONS
+from bson.raw_bson import RawBSONDocument
+
+from baemo.model import Model
+from baemo.raw import RawDocument
+
+
+def bench(label, stmt, setup, number=2000):
+    seconds = min(timeit.repeat(
+        stmt,
+        setup,
+        number=number,
+        repeat=5,
+        globals=globals()
+    ))
+    print("{:<40} {:>8.2f} us".format(label, seconds / number * 1e6))
+
+
+document = {
+    "k{}".format(i): {
+        "k1": "v",
+        "k2": [{"k3": j} for j in range(5)],
+        "k4": {"k5": {"k6": i}}
+    } for i in range(50)
+}
+document["_id"] = bson.ObjectId()
+raw = RawBSONDocument(bson.encode(document))
+
+
+if __name__ == "__main__":
+    bench(
+        "_post_find_hook(dict)",
+        "Model()._post_find_hook(bson.decode(raw.raw))",
+        ""
+    )
+
+    bench(
+        "_post_find_hook(RawDocument)",
+        "Model()._post_find_hook(RawDocument(raw, DEFAULT_CODEC_OPTIONS))",
+        ""
+    )
+
+    bench(
+        "default + per call projection",
+        "p.compile().merge({'k1': 1, 'k2': {'k3': 1}}).flatten()",
+        "from baemo.projection import Projection; "
+        "p = Projection({'k4': 1, 'k5': 2, 'k2': {'k6': 1}})",
+        number=20000
+    )
+
+    bench(
+        "Model.get()",
+        "m.get()",
+        "m = Model(); m.attributes(bson.decode(raw.raw))",
+        number=200
+    )
+
+    bench(
+        "Model.get(projection)",
+        "m.get(projection={'k1': 0, 'k2': {'k4': 0}})",
+        "m = Model(); m.attributes(bson.decode(raw.raw))",
+        number=200
+    )
+
+    bench(
+        "default + per query sort",
+        "s.compile().merge([('k1', 1), ('k2.k3', -1)]).flatten()",
+        "from baemo.sort import Sort; "
+        "s = Sort([('k4', 1), ('k2.k5', -1)])",
+        number=20000
+    )
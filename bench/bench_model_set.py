@@ -0,0 +1,56 @@
+# baemo benchmarks
+# run from the repository root: python bench/bench_model_set.py
+
+import sys; sys.path.append(".") # noqa
+
+import timeit
+
+from baemo.delimited import DelimitedStr
+from baemo.delimited import DelimitedDict
+from baemo.model import Model
+
+
+def bench(label, stmt, setup, number=20000):
+    seconds = min(timeit.repeat(
+        stmt,
+        setup,
+        number=number,
+        repeat=5,
+        globals=globals()
+    ))
+    print("{:<40} {:>8.2f} us".format(label, seconds / number * 1e6))
+
+
+if __name__ == "__main__":
+    bench(
+        "DelimitedStr('a.b.c.d')",
+        "DelimitedStr('a.b.c.d')",
+        "",
+        number=200000
+    )
+
+    bench(
+        "DelimitedStr('a.b.c.d')[:2]",
+        "k[:2]",
+        "k = DelimitedStr('a.b.c.d')",
+        number=200000
+    )
+
+    bench(
+        "DelimitedDict.ref('a.b.c.d')",
+        "d.ref('a.b.c.d')",
+        "d = DelimitedDict({'a.b.c.d': 1})",
+        number=200000
+    )
+
+    bench(
+        "Model.set('a.b.c.d', value)",
+        "m.set('a.b.c.d', 1)",
+        "m = Model()"
+    )
+
+    bench(
+        "Model.set('a.b.c.d', value, record=False)",
+        "m.set('a.b.c.d', 1, record=False)",
+        "m = Model()"
+    )
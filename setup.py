@@ -24,6 +24,7 @@ setuptools.setup(
     author="Christopher Antonellis",
     author_email="christopher.antonellis@gmail.com",
     license="MIT",
+    python_requires=">=3.8",
     packages=[
         "baemo"
     ],
@@ -42,6 +43,6 @@ setuptools.setup(
         "License :: OSI Approved :: MIT License",
         "Natural Language :: English",
         "Programming Language :: Python :: 3",
-        "Programming Language :: Python :: 3.6"
+        "Programming Language :: Python :: 3.8"
     ]
 )
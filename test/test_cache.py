@@ -0,0 +1,143 @@
+import sys; sys.path.append("../")
+
+import unittest
+
+from baemo.cache import FindCache
+from baemo.cache import IdFilter
+
+
+class TestFindCache(unittest.TestCase):
+
+    # get
+
+    def test_get(self):
+        c = FindCache()
+        c.set("k", "v")
+        self.assertEqual(c.get("k"), "v")
+        self.assertEqual(c.hits, 1)
+
+    def test_get__missing_key(self):
+        c = FindCache()
+        self.assertIsNone(c.get("k"))
+        self.assertEqual(c.get("k", "default"), "default")
+        self.assertEqual(c.misses, 2)
+
+    def test_get__expired_entry(self):
+        c = FindCache(ttl=0)
+        c.set("k", "v")
+        self.assertIsNone(c.get("k"))
+        self.assertNotIn("k", c)
+        self.assertEqual(c.expirations, 1)
+        self.assertEqual(c.misses, 1)
+
+    # set
+
+    def test_set__evicts_least_recently_read(self):
+        c = FindCache(max_entries=2)
+        c.set("k1", "v")
+        c.set("k2", "v")
+        c.get("k1")
+        c.set("k3", "v")
+        self.assertIn("k1", c)
+        self.assertNotIn("k2", c)
+        self.assertIn("k3", c)
+        self.assertEqual(c.evictions, 1)
+
+    def test_set__replaces_entry(self):
+        c = FindCache(max_entries=2)
+        c.set("k1", "v", id=1)
+        c.set("k1", "foo", id=2)
+        self.assertEqual(c.get("k1"), "foo")
+        self.assertEqual(c.ids, {2: {"k1"}})
+        self.assertEqual(c.evictions, 0)
+
+    def test_set__unhashable_id(self):
+        c = FindCache()
+        c.set("k", "v", id={"foo": "bar"})
+        self.assertEqual(c.get("k"), "v")
+        self.assertEqual(c.ids, {})
+
+    # invalidate
+
+    def test_invalidate(self):
+        c = FindCache()
+        c.set("k1", "v", id=1)
+        c.set("k2", "v", id=1)
+        c.set("k3", "v", id=2)
+        c.invalidate(1)
+        self.assertEqual(list(c.entries), ["k3"])
+        c.invalidate(3)
+        self.assertEqual(len(c), 1)
+
+    # clear
+
+    def test_clear(self):
+        c = FindCache()
+        c.set("k", "v", id=1)
+        c.get("k")
+        c.clear()
+        self.assertEqual(c.stats(), {
+            "entries": 0,
+            "hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "expirations": 0
+        })
+
+
+class TestIdFilter(unittest.TestCase):
+
+    # add
+
+    def test_add(self):
+        f = IdFilter(capacity=100)
+        self.assertNotIn("k", f)
+        f.add("k")
+        self.assertIn("k", f)
+
+    def test_update(self):
+        f = IdFilter(capacity=1000)
+        f.update(range(1000))
+        for i in range(1000):
+            self.assertIn(i, f)
+
+    def test_error_rate(self):
+        f = IdFilter(capacity=1000, error_rate=0.01)
+        f.update(range(1000))
+        false_positives = sum(1 for i in range(1000, 11000) if i in f)
+        self.assertLess(false_positives, 300)
+
+    def test_add__unhashable_id(self):
+        f = IdFilter(capacity=100)
+        f.add({"k": "v"})
+        f.remove({"k": "v"})
+        self.assertIn({"$in": ["k"]}, f)
+        self.assertEqual(sum(f.counts), 0)
+
+    # remove
+
+    def test_remove(self):
+        f = IdFilter(capacity=100)
+        f.add("k1")
+        f.add("k2")
+        f.remove("k1")
+        self.assertNotIn("k1", f)
+        self.assertIn("k2", f)
+
+    def test_remove__missing_id(self):
+        f = IdFilter(capacity=100)
+        f.add("k1")
+        f.remove("k2")
+        self.assertIn("k1", f)
+
+    # clear
+
+    def test_clear(self):
+        f = IdFilter(capacity=100)
+        f.add("k")
+        f.clear()
+        self.assertNotIn("k", f)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -5,6 +5,7 @@ import unittest
 import copy
 import pymongo
 import bson
+import datetime
 
 from collections import OrderedDict
 
@@ -13,6 +14,8 @@ from baemo.sort import Sort
 from baemo.model import Model
 from baemo.collection import Collection
 from baemo.entity import Entity
+from baemo.raw import RawDocument
+from baemo.driver import Driver
 
 from baemo.exceptions import ModelNotFound
 from baemo.exceptions import ModelTargetNotSet
@@ -21,6 +24,17 @@ from baemo.exceptions import CollectionModelNotPresent
 from baemo.exceptions import DereferenceError
 
 
+class RecordingDriver(Driver):
+
+    def __init__(self):
+        super().__init__()
+        self.methods = []
+
+    def execute(self, operation):
+        self.methods.append(operation.method)
+        return super().execute(operation)
+
+
 class TestCollection(unittest.TestCase):
 
     def setUp(self):
@@ -563,6 +577,38 @@ class TestCollection(unittest.TestCase):
 
         self.assertEqual(c.total_count, 3)
 
+    def test_find__decodes_attributes(self):
+        m1 = TestModel()
+        m1.set({"k1": "v1", "k2": {"k3": "v"}})
+        m1.save()
+        c = TestCollection().find()
+
+        self.assertEqual(len(c), 1)
+        self.assertEqual(type(c[0].attributes.__dict__), dict)
+        self.assertEqual(type(c[0].original.__dict__), RawDocument)
+        self.assertEqual(c[0], m1)
+
+    def test_find__lazy_True(self):
+        TestModel, TestCollection = Entity("Test", {
+            "connection": connection_name,
+            "collection": collection_name,
+            "lazy": True
+        })
+
+        m1 = TestModel()
+        m1.set({"k1": "v1", "k2": {"k3": "v"}})
+        m1.save()
+        m2 = TestModel()
+        m2.set({"k1": "v2", "k2": {"k3": "v"}})
+        m2.save()
+        c = TestCollection().find()
+
+        self.assertEqual(len(c), 2)
+        for m in c:
+            self.assertEqual(type(m.attributes.__dict__), RawDocument)
+        self.assertEqual(c[0].get("k1"), "v1")
+        self.assertEqual(c[1], m2)
+
     # ref
 
     def test_ref(self):
@@ -757,6 +803,60 @@ class TestCollection(unittest.TestCase):
     def test_save__update(self):
         pass
 
+    def test_save__update__record_updates_False(self):
+        global connection_name, collection_name
+
+        TestModel, TestCollection = Entity("Test", {
+            "connection": connection_name,
+            "collection": collection_name,
+            "record_updates": False
+        })
+
+        m1 = TestModel()
+        m1.set("k", "v")
+        m1.save()
+        m1.set("k", "foo")
+
+        m2 = TestModel()
+        m2.set("k", "v")
+        m2.save()
+
+        c = TestCollection()
+        c.add(m1)
+        c.add(m2)
+        c.save()
+
+        self.assertEqual(TestModel(m1.get_id()).find().get("k"), "foo")
+        self.assertEqual(m1.diff(), {})
+
+    def test_save__update__post_update_hook__only_updated_models(self):
+        global connection_name, collection_name
+
+        class ModelAbstract(object):
+            def post_update_hook(self):
+                self.updated = True
+
+        TestModel, TestCollection = Entity("Test", {
+            "connection": connection_name,
+            "collection": collection_name,
+            "bases": ModelAbstract
+        })
+
+        m1 = TestModel()
+        m1.save()
+        m1.set("k", "v")
+
+        m2 = TestModel()
+        m2.save()
+
+        c = TestCollection()
+        c.add(m1)
+        c.add(m2)
+        c.save()
+
+        self.assertTrue(getattr(m1, "updated", False))
+        self.assertFalse(getattr(m2, "updated", False))
+
     def test_save__delete(self):
         global TestModel, TestCollection
 
@@ -847,6 +947,80 @@ class TestCollection(unittest.TestCase):
         with self.assertRaises(CollectionModelNotPresent):
             TestCollection().remove(Model())
 
+    # sort_models
+
+    def _sort_models_collection(self, values):
+        c = TestCollection()
+        for i, value in enumerate(values):
+            m = TestModel()
+            m.set("i", i)
+            if value is not None:
+                m.set(value)
+            c.add(m)
+        return c
+
+    def test_sort_models(self):
+        c = self._sort_models_collection([{"k": 2}, {"k": 1}, {"k": 3}])
+        self.assertIs(c.sort_models(("k", 1)), c)
+        self.assertEqual([m.get("i") for m in c], [1, 0, 2])
+        c.sort_models([("k", -1)])
+        self.assertEqual([m.get("i") for m in c], [2, 0, 1])
+
+    def test_sort_models__Sort_param__multiple_keys_keep_order(self):
+        c = self._sort_models_collection([
+            {"k1": 1, "k2": 1},
+            {"k1": 0, "k2": 1},
+            {"k1": 1, "k2": 2},
+            {"k1": 1, "k2": 1}
+        ])
+        c.sort_models(Sort([("k2", -1), ("k1", 1)]))
+        self.assertEqual([m.get("i") for m in c], [2, 1, 0, 3])
+
+    def test_sort_models__missing_values(self):
+        c = self._sort_models_collection([{"k": 1}, None, {"k": None}])
+        c.sort_models(("k", 1))
+        self.assertEqual([m.get("i") for m in c], [1, 2, 0])
+        c.sort_models(("k", -1))
+        self.assertEqual([m.get("i") for m in c], [0, 1, 2])
+
+    def test_sort_models__mixed_types(self):
+        c = self._sort_models_collection([
+            {"k": "v"}, {"k": True}, {"k": 2}, {"k": {"k": 1}}, {"k": 1.5}
+        ])
+        c.sort_models(("k", 1))
+        self.assertEqual([m.get("i") for m in c], [4, 2, 0, 3, 1])
+
+    def test_sort_models__naive_and_aware_datetimes(self):
+        utc = datetime.timezone.utc
+        c = self._sort_models_collection([
+            {"k": datetime.datetime(2018, 1, 2)},
+            {"k": datetime.datetime(2018, 1, 1, 23, tzinfo=utc)},
+            {"k": datetime.datetime(
+                2018, 1, 2, 1, tzinfo=datetime.timezone(
+                    datetime.timedelta(hours=2)))}
+        ])
+        c.sort_models(("k", 1))
+        self.assertEqual([m.get("i") for m in c], [1, 2, 0])
+
+    def test_sort_models__nan(self):
+        c = self._sort_models_collection([
+            {"k": 1}, {"k": float("nan")}, {"k": -1}
+        ])
+        c.sort_models(("k", 1))
+        self.assertEqual([m.get("i") for m in c], [1, 2, 0])
+
+    def test_sort_models__delimited_key__nested_model(self):
+        children = []
+        for value in [2, 1]:
+            child = TestModel()
+            child.set("k2", value)
+            children.append({"k1": child})
+        children.append({"k1": DereferenceError()})
+
+        c = self._sort_models_collection(children)
+        c.sort_models(("k1.k2", 1))
+        self.assertEqual([m.get("i") for m in c], [2, 1, 0])
+
     # dereference_entities
 
     def test_dereference_entities__local_many(self):
@@ -1010,6 +1184,362 @@ class TestCollection(unittest.TestCase):
             self.assertIn("k2", m.get())
             self.assertNotIn("k3", m.get())
 
+    def test_dereference_entities__local_one__batched(self):
+        driver = RecordingDriver()
+        TestModel, TestCollection = Entity("Test", {
+            "connection": connection_name,
+            "collection": collection_name,
+            "references": {
+                "r": {
+                    "entity": "Test",
+                    "type": "local_one"
+                }
+            }
+        }, {
+            "driver": driver
+        })
+
+        original = TestModel()
+        original.set("k", "v")
+        original.save()
+
+        missing = bson.ObjectId()
+        for target in [original.get_id(), original.get_id(), missing]:
+            m = TestModel()
+            m.set("r", target)
+            m.set("parent", True)
+            m.save()
+
+        c = TestCollection({"parent": True}).find(
+            projection={"r": 2}
+        )
+        self.assertEqual(driver.methods, ["count", "find", "find"])
+
+        self.assertEqual(type(c[0].attributes["r"]), TestModel)
+        self.assertEqual(c[0].attributes["r"].get("k"), "v")
+        self.assertIs(c[0].attributes["r"], c[1].attributes["r"])
+        self.assertEqual(type(c[2].attributes["r"]), DereferenceError)
+        self.assertEqual(
+            c[2].attributes["r"].data,
+            {"model": "TestModel", "t": missing}
+        )
+
+    def test_dereference_entities__batched__hooks_see_as_reference(self):
+
+        class ModelAbstract(object):
+            def pre_find_hook(self):
+                self.pre_as_reference = self._as_reference
+
+            def post_find_hook(self):
+                self.post_as_reference = self._as_reference
+
+        TestModel, TestCollection = Entity("Test", {
+            "connection": connection_name,
+            "collection": collection_name,
+            "bases": ModelAbstract,
+            "references": {
+                "r": {
+                    "entity": "Test",
+                    "type": "local_one"
+                }
+            }
+        })
+
+        original = TestModel()
+        original.save()
+
+        m = TestModel()
+        m.set("r", original.get_id())
+        m.save()
+
+        c = TestCollection({"r": original.get_id()}).find(
+            projection={"r": 2}
+        )
+        self.assertFalse(c[0].pre_as_reference)
+        self.assertTrue(c[0].attributes["r"].pre_as_reference)
+        self.assertTrue(c[0].attributes["r"].post_as_reference)
+
+    def test_dereference_entities__local_many__batched(self):
+        driver = RecordingDriver()
+        TestModel, TestCollection = Entity("Test", {
+            "connection": connection_name,
+            "collection": collection_name,
+            "references": {
+                "r": {
+                    "entity": "Test",
+                    "type": "local_many"
+                }
+            }
+        }, {
+            "driver": driver,
+            "dereference_batch_size": 2
+        })
+
+        ids = []
+        for i in range(3):
+            m = TestModel()
+            m.set("k", i)
+            m.save()
+            ids.append(m.get_id())
+
+        missing = bson.ObjectId()
+        m1 = TestModel()
+        m1.set("r", [ids[0], ids[1], missing])
+        m1.set("parent", True)
+        m1.save()
+        m2 = TestModel()
+        m2.set("r", [ids[1], ids[2]])
+        m2.set("parent", True)
+        m2.save()
+
+        c = TestCollection({"parent": True}).find(
+            projection={"r": {"k": 1}}
+        )
+
+        # one query per batch of distinct values
+        self.assertEqual(driver.methods, ["count", "find", "find", "find"])
+
+        r1 = c[0].attributes["r"]
+        self.assertEqual(type(r1), TestCollection)
+        self.assertEqual([m.get("k") for m in r1[:2]], [0, 1])
+        self.assertEqual(type(r1[2]), DereferenceError)
+        self.assertEqual(r1.get_target(), {"_id": {"$in": m1.get("r")}})
+
+        r2 = c[1].attributes["r"]
+        self.assertEqual([m.get("k") for m in r2], [1, 2])
+        self.assertEqual(r2[0].get(), {"_id": ids[1], "k": 1})
+
+    def test_dereference_entities__nested_batched(self):
+        driver = RecordingDriver()
+        TestModel, TestCollection = Entity("Test", {
+            "connection": connection_name,
+            "collection": collection_name,
+            "references": {
+                "r": {
+                    "entity": "Test",
+                    "type": "local_one"
+                }
+            }
+        }, {
+            "driver": driver
+        })
+
+        grandchild = TestModel()
+        grandchild.set("k", "v")
+        grandchild.save()
+
+        child = TestModel()
+        child.set("r", grandchild.get_id())
+        child.save()
+
+        for i in range(3):
+            m = TestModel()
+            m.set("r", child.get_id())
+            m.set("parent", True)
+            m.save()
+
+        c = TestCollection({"parent": True}).find(
+            projection={"r": {"r": 2}}
+        )
+
+        # one query per level
+        self.assertEqual(driver.methods, ["count", "find", "find", "find"])
+        for m in c:
+            self.assertEqual(m.attributes["r"].attributes["r"].get("k"), "v")
+
+    def test_dereference_entities__foreign_many__batched(self):
+        items_collection_name = "{}_items".format(collection_name)
+        self.addCleanup(
+            Connections.get(connection_name).drop_collection,
+            items_collection_name
+        )
+
+        driver = RecordingDriver()
+        ItemModel, ItemCollection = Entity("Item", {
+            "connection": connection_name,
+            "collection": items_collection_name
+        })
+        OrderModel, OrderCollection = Entity("Order", {
+            "connection": connection_name,
+            "collection": collection_name,
+            "references": {
+                "lines": {
+                    "entity": "Item",
+                    "type": "foreign_many",
+                    "foreign_key": "order"
+                }
+            }
+        }, {
+            "driver": driver
+        })
+
+        orders = []
+        for i in range(5):
+            order = OrderModel()
+            order.save()
+            orders.append(order)
+            for j in range(i):
+                item = ItemModel()
+                item.set({"order": order.get_id(), "k": j})
+                item.save()
+
+        c = OrderCollection().find(projection={"lines": {"k": 1}})
+
+        # one query for the orders, one for the items of every order
+        self.assertEqual(driver.methods, ["count", "find", "find"])
+
+        for i, order in enumerate(c):
+            items = order.attributes["lines"]
+            self.assertEqual(type(items), ItemCollection)
+            self.assertEqual([m.get("k") for m in items], list(range(i)))
+            self.assertEqual(
+                items.get_target(),
+                {"order": {"$in": [order.get_id()]}}
+            )
+
+    def test_dereference_entities__foreign_one__batched(self):
+        items_collection_name = "{}_items".format(collection_name)
+        self.addCleanup(
+            Connections.get(connection_name).drop_collection,
+            items_collection_name
+        )
+
+        driver = RecordingDriver()
+        ItemModel, ItemCollection = Entity("Item", {
+            "connection": connection_name,
+            "collection": items_collection_name
+        })
+        OrderModel, OrderCollection = Entity("Order", {
+            "connection": connection_name,
+            "collection": collection_name,
+            "references": {
+                "item": {
+                    "entity": "Item",
+                    "type": "foreign_one",
+                    "foreign_key": "order"
+                }
+            }
+        }, {
+            "driver": driver
+        })
+
+        order1 = OrderModel()
+        order1.save()
+        order2 = OrderModel()
+        order2.save()
+
+        item = ItemModel()
+        item.set("order", order1.get_id())
+        item.save()
+
+        c = OrderCollection().find(projection={"item": 2})
+        self.assertEqual(driver.methods, ["count", "find", "find"])
+        self.assertEqual(c[0].attributes["item"].get_id(), item.get_id())
+        self.assertIsNone(c[1].attributes["item"])
+
+    def test_dereference_entities__memo(self):
+        driver = RecordingDriver()
+        TestModel, TestCollection = Entity("Test", {
+            "connection": connection_name,
+            "collection": collection_name,
+            "references": {
+                "author": {"entity": "Test", "type": "local_one"},
+                "editor": {"entity": "Test", "type": "local_one"},
+                "organization": {"entity": "Test", "type": "local_one"}
+            }
+        }, {
+            "driver": driver
+        })
+
+        organization = TestModel()
+        organization.save()
+
+        author = TestModel()
+        author.set("organization", organization.get_id())
+        author.save()
+
+        for i in range(3):
+            m = TestModel()
+            m.set({
+                "author": author.get_id(),
+                "editor": author.get_id(),
+                "post": True
+            })
+            m.save()
+
+        c = TestCollection({"post": True}).find(projection={
+            "author": {"organization": 2},
+            "editor": {"organization": 2}
+        })
+
+        # editors are the authors found before
+        self.assertEqual(driver.methods, ["count", "find", "find", "find"])
+        for m in c:
+            self.assertIs(m.attributes["author"], c[0].attributes["editor"])
+        self.assertEqual(
+            c[0].get("editor.organization._id"),
+            organization.get_id()
+        )
+
+    def test_dereference_entities__cycle(self):
+        TestModel, TestCollection = Entity("Test", {
+            "connection": connection_name,
+            "collection": collection_name,
+            "references": {
+                "children": {
+                    "entity": "Test",
+                    "type": "foreign_many",
+                    "foreign_key": "parent"
+                }
+            }
+        })
+
+        m1 = TestModel()
+        m1.set("top", True)
+        m1.save()
+
+        m2 = TestModel()
+        m2.set("parent", m1.get_id())
+        m2.save()
+
+        m1.set("parent", m2.get_id())
+        m1.save()
+
+        c = TestCollection({"top": True}).find(projection={
+            "children": {"children": {"children": 2}}
+        })
+
+        # m1 is a child of m2 but its children are not found again
+        children = c[0].attributes["children"][0].attributes["children"]
+        self.assertEqual(len(children), 1)
+        self.assertEqual(children[0].get_id(), m1.get_id())
+        self.assertNotIn("children", children[0].attributes)
+
+    def test_dereference_entities(self):
+        TestModel, TestCollection = Entity("Test", {
+            "connection": connection_name,
+            "collection": collection_name,
+            "references": {
+                "r": {
+                    "entity": "Test",
+                    "type": "local_one"
+                }
+            }
+        })
+
+        original = TestModel()
+        original.save()
+
+        m = TestModel()
+        m.set("r", original.get_id())
+        m.save()
+
+        c = TestCollection(m.get_id()).find()
+        self.assertEqual(c[0].attributes["r"], original.get_id())
+
+        c.dereference_entities(projection={"r": 2})
+        self.assertEqual(type(c[0].attributes["r"]), TestModel)
+
     # reference_entities
 
     def test_reference_entities(self):
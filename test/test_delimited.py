@@ -3,41 +3,101 @@ import sys; sys.path.append("../")
 
 import unittest
 import copy
+import threading
+
+from collections import OrderedDict
 
 from baemo.delimited import DelimitedStr
 from baemo.delimited import DelimitedDict
+from baemo.delimited import DelimitedPath
+from baemo.delimited import DelimitedOrderedDict
+
+
+class IndexedDelimitedDict(DelimitedDict):
+    indexed = True
 
 
 class TestDelimitedStr(unittest.TestCase):
 
-    # __init__
+    # __new__
 
-    def test___init___no_params(self):
+    def test___new___no_params(self):
         d = DelimitedStr()
-        self.assertEqual(d.keys, [])
+        self.assertEqual(d.keys, ())
         self.assertIsInstance(d, DelimitedStr)
 
-    def test___init___delimited_string_param(self):
+    def test___new___delimited_string_param(self):
         d = DelimitedStr("k1.k2.k3")
-        self.assertEqual(d.keys, ["k1", "k2", "k3"])
+        self.assertEqual(d.keys, ("k1", "k2", "k3"))
 
-    def test___init___delimited_string_and_delimiter_params(self):
+    def test___new___delimited_string_and_delimiter_params(self):
         d = DelimitedStr("k1*k2*k3", delimiter="*")
-        self.assertEqual(d.keys, ["k1", "k2", "k3"])
+        self.assertEqual(d.keys, ("k1", "k2", "k3"))
 
-    # __call__
+    def test___new___delimited_str_param__returns_same_instance(self):
+        d = DelimitedStr("k1.k2.k3")
+        self.assertIs(DelimitedStr(d), d)
+
+    def test___new___interns_instances(self):
+        d1 = DelimitedStr("k1.k2.k3")
+        d2 = DelimitedStr("k1.k2.k3")
+        self.assertIs(d1, d2)
 
-    def test___call___no_params(self):
+    def test___new___interns_instances_by_delimiter(self):
+        d1 = DelimitedStr("k1.k2*k3")
+        d2 = DelimitedStr("k1.k2*k3", delimiter="*")
+        self.assertIsNot(d1, d2)
+        self.assertEqual(d1.keys, ("k1", "k2*k3"))
+        self.assertEqual(d2.keys, ("k1.k2", "k3"))
+
+    def test___new___cache_is_bounded(self):
+        cache_size = DelimitedStr.cache_size
+        DelimitedStr.cache_size = 2
+        try:
+            for i in range(10):
+                DelimitedStr("k{}.k".format(i))
+            self.assertLessEqual(len(DelimitedStr.cache), 2)
+        finally:
+            DelimitedStr.cache_size = cache_size
+
+    def test___new___cache_is_bounded__threads(self):
+        cache_size = DelimitedStr.cache_size
+        DelimitedStr.cache_size = 2
+        errors = []
+
+        def intern(n):
+            try:
+                for i in range(2000):
+                    DelimitedStr("k{}.{}".format(n, i))
+            except Exception as e:
+                errors.append(e)
+
+        threads = [
+            threading.Thread(target=intern, args=(n,)) for n in range(4)
+        ]
+        try:
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            self.assertEqual(errors, [])
+            self.assertLessEqual(len(DelimitedStr.cache), 2)
+        finally:
+            DelimitedStr.cache_size = cache_size
+
+    # __setattr__
+
+    def test___setattr___raises_AttributeError(self):
         d = DelimitedStr("k1.k2.k3")
-        self.assertEqual(d.keys, ["k1", "k2", "k3"])
-        d()
-        self.assertEqual(d.keys, [])
+        with self.assertRaises(AttributeError):
+            d.keys = ("foo",)
 
-    def test___call___delimited_string_param(self):
-        d = DelimitedStr()
-        self.assertEqual(d.keys, [])
-        d("k1.k2.k3")
-        self.assertEqual(d.keys, ["k1", "k2", "k3"])
+    # __copy__
+
+    def test___copy__(self):
+        d = DelimitedStr("k1.k2.k3")
+        self.assertIs(copy.copy(d), d)
+        self.assertIs(copy.deepcopy(d), d)
 
     # __eq__
 
@@ -56,6 +116,11 @@ class TestDelimitedStr(unittest.TestCase):
         d2 = object()
         self.assertFalse(d1 == d2)
 
+    def test___eq____str__returns_True(self):
+        d = DelimitedStr("k1.k2.k3")
+        self.assertTrue(d == "k1.k2.k3")
+        self.assertEqual(hash(d), hash("k1.k2.k3"))
+
     # __ne__
 
     def test___ne____returns_True(self):
@@ -131,29 +196,106 @@ class TestDelimitedStr(unittest.TestCase):
         d = DelimitedStr("k1.k2.k3")
         self.assertEqual(d[:-1], "k1.k2")
 
-    # __setitem__
-
-    def test___setitem__int_index(self):
+    def test___getitem__slice_index__returns_DelimitedStr(self):
         d = DelimitedStr("k1.k2.k3")
-        d[1] = "foo"
-        self.assertEqual(d.keys, ["k1", "foo", "k3"])
+        self.assertIsInstance(d[1:], DelimitedStr)
+        self.assertEqual(d[1:].keys, ("k2", "k3"))
+        self.assertEqual(d[:0].keys, ())
 
-    def test___setitem__slice_index(self):
+    # __setitem__
+
+    def test___setitem____raises_TypeError(self):
         d = DelimitedStr("k1.k2.k3")
-        d[:-1] = ["foo", "bar"]
-        self.assertEqual(d.keys, ["foo", "bar", "k3"])
+        with self.assertRaises(TypeError):
+            d[1] = "foo"
 
     # __delitem__
 
-    def test___delitem__int_index(self):
+    def test___delitem____raises_TypeError(self):
         d = DelimitedStr("k1.k2.k3")
-        del d[1]
-        self.assertEqual(d.keys, ["k1", "k3"])
+        with self.assertRaises(TypeError):
+            del d[1]
 
-    def test___delitem__slice_index(self):
-        d = DelimitedStr("k1.k2.k3")
-        del d[:-1]
-        self.assertEqual(d.keys, ["k3"])
+
+class TestDelimitedPath(unittest.TestCase):
+
+    # __init__
+
+    def test___init__(self):
+        p = DelimitedPath("k1.k2.k3")
+        self.assertEqual(p.key, DelimitedStr("k1.k2.k3"))
+        self.assertEqual(p.parents, ("k1", "k2"))
+        self.assertEqual(p.needle, "k3")
+        self.assertIs(p.owner, DelimitedDict)
+
+    # __call__
+
+    def test___call____returns_reference(self):
+        d = DelimitedDict({"k1.k2": {"k3": "v"}})
+        p = DelimitedPath("k1.k2")
+        self.assertIs(p(d), d.ref("k1.k2"))
+
+    def test___call____container_param__returns_value(self):
+        p = DelimitedPath("k1.k2")
+        self.assertEqual(p({"k1": {"k2": "v"}}), "v")
+
+    def test___call____default_param__returns_default(self):
+        p = DelimitedPath("k1.k2")
+        self.assertEqual(p(DelimitedDict(), "foo"), "foo")
+
+    def test___call____raises_KeyError(self):
+        p = DelimitedPath("k1.k2")
+        with self.assertRaises(KeyError):
+            p(DelimitedDict({"k1": {}}))
+
+    def test___call____raises_TypeError(self):
+        p = DelimitedPath("k1.k2.k3")
+        with self.assertRaises(TypeError):
+            p(DelimitedDict({"k1.k2": "v"}))
+
+    # has
+
+    def test_has__returns_True(self):
+        p = DelimitedPath("k1.k2")
+        self.assertTrue(p.has(DelimitedDict({"k1.k2": "v"})))
+
+    def test_has__returns_False(self):
+        p = DelimitedPath("k1.k2.k3")
+        self.assertFalse(p.has(DelimitedDict({"k1.k2": "v"})))
+
+    # set
+
+    def test_set(self):
+        d = DelimitedDict({"k1.k2": "v"})
+        DelimitedPath("k1.k2").set(d, "foo")
+        self.assertEqual(d.__dict__, {"k1": {"k2": "foo"}})
+
+    def test_set__creates_missing_containers(self):
+        d = DelimitedDict({"k1": 1})
+        DelimitedPath("k1.k2.k3").set(d, "v")
+        self.assertEqual(d.__dict__, {"k1": {"k2": {"k3": "v"}}})
+
+    def test_set__False_create_param__raises_KeyError(self):
+        d = DelimitedDict({"k1": {}})
+        with self.assertRaises(KeyError):
+            DelimitedPath("k1.k2").set(d, "v", create=False)
+
+    def test_set__owner_container(self):
+        d = DelimitedOrderedDict()
+        DelimitedOrderedDict.compile_path("k1.k2").set(d, "v")
+        self.assertEqual(type(d.ref("k1")), OrderedDict)
+
+    # delete
+
+    def test_delete(self):
+        d = DelimitedDict({"k1.k2": "v", "k1.k3": "v"})
+        DelimitedPath("k1.k2").delete(d)
+        self.assertEqual(d.__dict__, {"k1": {"k3": "v"}})
+
+    def test_delete__raises_KeyError(self):
+        d = DelimitedDict({"k1": {}})
+        with self.assertRaises(KeyError):
+            DelimitedPath("k1.k2").delete(d)
 
 
 class TestDelimitedDict(unittest.TestCase):
@@ -235,6 +377,25 @@ class TestDelimitedDict(unittest.TestCase):
         d2 = DelimitedDict({"bar.baz": "foo"})
         self.assertFalse(d1 == d2)
 
+    def test___eq____fingerprints_built(self):
+        d1 = DelimitedDict({"k1.k2": "v"})
+        d2 = DelimitedDict({"k1.k2": "v"})
+        d1.fingerprint()
+        d2.fingerprint()
+        self.assertTrue(d1 == d2)
+        d2.set("k1.k2", "foo")
+        self.assertFalse(d1 == d2)
+
+    def test___eq____write_through_ref_after_fingerprint(self):
+        d1 = DelimitedDict({"k1": {"k2": 1}})
+        d2 = DelimitedDict({"k1": {"k2": 1}})
+        r = d1.ref("k1")
+        d1.fingerprint()
+        d2.fingerprint()
+        r["k3"] = 2
+        d2.set("k1.k3", 2)
+        self.assertTrue(d1 == d2)
+
     def test___eq____different_class__returns_False(self):
         d1 = DelimitedDict({"foo.bar": "baz"})
         d2 = object()
@@ -259,6 +420,14 @@ class TestDelimitedDict(unittest.TestCase):
         h2 = hash(DelimitedDict({"k1.k2.k3": "v"}))
         self.assertTrue(h1 == h2)
 
+    def test___hash____changes_with_data(self):
+        d = DelimitedDict({"k1.k2.k3": "v"})
+        h = hash(d)
+        d.set("k1.k2.k3", "foo")
+        self.assertNotEqual(hash(d), h)
+        d.set("k1.k2.k3", "v")
+        self.assertEqual(hash(d), h)
+
     # __iter__
 
     def test___iter__(self):
@@ -629,6 +798,30 @@ class TestDelimitedDict(unittest.TestCase):
         d.unset("k1.k2.k3", cleanup=True)
         self.assertEqual(d.__dict__, {})
 
+    def test_unset__cleanup_True__keeps_non_empty_containers(self):
+        d = DelimitedDict({"k1.k2.k3": "v", "k1.k4": "v"})
+        d.unset("k1.k2.k3", cleanup=True)
+        self.assertEqual(d.__dict__, {
+            "k1": {
+                "k4": "v"
+            }
+        })
+
+    def test_unset__cleanup_True__deep_document(self):
+        depth = 5000
+        key = ".".join("k{}".format(i) for i in range(depth))
+        d = DelimitedDict()
+        d.set(key, "v")
+        d.set("k0.k1.foo", "bar")
+        d.unset(key, cleanup=True)
+        self.assertEqual(d.__dict__, {
+            "k0": {
+                "k1": {
+                    "foo": "bar"
+                }
+            }
+        })
+
     def test_unset__delimited_key_param(self):
         d = DelimitedDict({"k1.k2.k3": "v"})
         d.unset("k1.k2.k3")
@@ -643,6 +836,217 @@ class TestDelimitedDict(unittest.TestCase):
         with self.assertRaises(KeyError):
             d.unset("foo")
 
+    # set_many
+
+    def test_set_many(self):
+        d = DelimitedDict({"k1.k2": "v", "k3": "v"})
+        d.set_many({"k1.k4": "v", "k3": "foo", "k1.k2": "bar", "k5.k6": "v"})
+        self.assertEqual(d.__dict__, {
+            "k1": {
+                "k2": "bar",
+                "k4": "v"
+            },
+            "k3": "foo",
+            "k5": {
+                "k6": "v"
+            }
+        })
+
+    def test_set_many__overlapping_keys__applied_in_order(self):
+        d = DelimitedDict()
+        d.set_many(OrderedDict([("k1", "v"), ("k1.k2", "v")]))
+        self.assertEqual(d.__dict__, {"k1": {"k2": "v"}})
+        d.set_many(OrderedDict([("k1.k2", "v"), ("k1", "v")]))
+        self.assertEqual(d.__dict__, {"k1": "v"})
+
+    def test_set_many__create_False__raises_KeyError(self):
+        d = DelimitedDict({"k1.k2": "v"})
+        with self.assertRaises(KeyError):
+            d.set_many({"k1.k3": "v"}, create=False)
+        with self.assertRaises(KeyError):
+            d.set_many({"k4.k5": "v"}, create=False)
+
+    def test_set_many__create_False__raises_TypeError(self):
+        d = DelimitedDict({"k1.k2": 1})
+        with self.assertRaises(TypeError):
+            d.set_many({"k1.k2.k3": "v"}, create=False)
+
+    def test_set_many__matches_set(self):
+        keys = ["k1.k2.k3", "k4", "k1.k5", "k1.k2.k6", "k7.k8", "k1.k2.k3"]
+        d1 = DelimitedDict({"k1.k2": "v", "k4.k9": "v"})
+        d2 = copy.deepcopy(d1)
+        for i, key in enumerate(keys):
+            d1.set(key, i)
+        d2.set_many(OrderedDict((k, i) for i, k in enumerate(keys)))
+        self.assertEqual(d1.__dict__, d2.__dict__)
+
+    # unset_many
+
+    def test_unset_many(self):
+        d = DelimitedDict({"k1.k2": "v", "k1.k3": "v", "k4": "v"})
+        d.unset_many(["k1.k2", "k4"])
+        self.assertEqual(d.__dict__, {"k1": {"k3": "v"}})
+
+    def test_unset_many__cleanup_True__removes_empty_containers(self):
+        d = DelimitedDict({"k1.k2.k3": "v", "k1.k2.k4": "v", "k1.k5": "v"})
+        d.unset_many(["k1.k2.k3", "k1.k2.k4"], cleanup=True)
+        self.assertEqual(d.__dict__, {"k1": {"k5": "v"}})
+        d.unset_many(["k1.k5"], cleanup=True)
+        self.assertEqual(d.__dict__, {})
+
+    def test_unset_many__raises_KeyError(self):
+        d = DelimitedDict({"k1.k2": "v"})
+        with self.assertRaises(KeyError):
+            d.unset_many(["k1.k3"])
+        with self.assertRaises(KeyError):
+            d.unset_many(["k1.k2", "k1.k2"])
+
+    # iter_items
+
+    def test_iter_items(self):
+        d = DelimitedDict({"k1.k2.k3": "v", "k1.k4": "v", "k5": {}})
+        self.assertEqual(list(d.iter_items()), list(d.iter_collapsed()))
+        self.assertEqual(list(d.iter_items("k1.k2")), [("k1.k2.k3", "v")])
+        self.assertEqual(list(d.iter_items("k1.k4")), [("k1.k4", "v")])
+        self.assertEqual(list(d.iter_items("k5")), [("k5", {})])
+
+    def test_iter_items__missing_prefix(self):
+        d = DelimitedDict({"k1.k2": "v"})
+        self.assertEqual(list(d.iter_items("foo")), [])
+        self.assertEqual(list(d.iter_items("k1.k2.k3")), [])
+
+    # paths
+
+    def test_paths(self):
+        d = DelimitedDict({"k1.k2.k3": "v", "k1.k4": "v", "k10": "v"})
+        self.assertEqual(d.paths(), ["k1.k2.k3", "k1.k4", "k10"])
+        self.assertEqual(d.paths("k1"), ["k1.k2.k3", "k1.k4"])
+        self.assertEqual(d.paths("foo"), [])
+
+    # count
+
+    def test_count(self):
+        d = DelimitedDict({"k1.k2.k3": "v", "k1.k4": "v", "k5": {}})
+        self.assertEqual(d.count(), 3)
+        self.assertEqual(d.count("k1"), 2)
+        self.assertEqual(d.count("k1.k4"), 1)
+        self.assertEqual(d.count("k5"), 1)
+        self.assertEqual(d.count("foo"), 0)
+        self.assertEqual(d.count("k1.k4.foo"), 0)
+
+    def test_count__indexed_True__maintained_by_writes(self):
+        d = IndexedDelimitedDict({"k1.k2.k3": "v", "k1.k4": "v"})
+        self.assertEqual(d.count("k1"), 2)
+        self.assertEqual(d.count(), 2)
+
+        d.set("k1.k2.k5", {"k6": "v", "k7": "v"})
+        self.assertEqual(d.count("k1.k2"), 3)
+        d.set("k1.k4.k8", "v")
+        self.assertEqual(d.count("k1"), 4)
+        d.unset("k1.k2.k3")
+        d.unset("k1.k2.k5", cleanup=True)
+        self.assertEqual(d.count("k1"), 1)
+        d.push("k9", "v")
+        d.set_many({"k1.k10": "v", "k11": {}})
+        self.assertEqual(d.count(), 4)
+        d.unset_many(["k1.k4.k8", "k1.k10"], cleanup=True)
+        self.assertEqual(d.count(), 2)
+        self.assertEqual(d._index, d._build_index(d.__dict__))
+
+    def test_count__indexed_True__rebuilt_after_ref(self):
+        d = IndexedDelimitedDict({"k1.k2": "v"})
+        self.assertEqual(d.count(), 1)
+        d.ref("k1")["k3"] = "v"
+        self.assertEqual(d.count(), 2)
+
+    # fingerprint
+
+    def test_fingerprint(self):
+        d1 = DelimitedDict({"k1.k2": "v", "k1.k3": [1, 2], "k4": 1})
+        d2 = DelimitedDict({"k4": 1, "k1.k3": [1, 2], "k1.k2": "v"})
+        self.assertEqual(type(d1.fingerprint()), int)
+        self.assertLess(d1.fingerprint(), 2 ** 64)
+        self.assertEqual(d1.fingerprint(), d2.fingerprint())
+        self.assertEqual(d1.fingerprint("k1"), d2.fingerprint("k1"))
+        self.assertNotEqual(d1.fingerprint("k1"), d1.fingerprint())
+        self.assertNotEqual(
+            DelimitedDict({"k1": 1, "k2": 2}).fingerprint(),
+            DelimitedDict({"k1": 2, "k2": 1}).fingerprint()
+        )
+
+    def test_fingerprint__updated_by_writes(self):
+        d = DelimitedDict({"k1.k2.k3": "v", "k1.k4": "v", "k5": "v"})
+        fingerprint = d.fingerprint("k1")
+        d.set("k1.k2.k6", {"k7": "v"})
+        d.push("k1.k8", "v")
+        d.set_many({"k1.k2.k9": "v", "k10": "v"})
+        self.assertNotEqual(d.fingerprint("k1"), fingerprint)
+        self.assertEqual(d.fingerprint(), DelimitedDict(d.get()).fingerprint())
+
+        d.unset("k1.k2.k6.k7", cleanup=True)
+        d.unset_many(["k1.k8", "k1.k2.k9", "k10"])
+        self.assertEqual(d.fingerprint("k1"), fingerprint)
+        self.assertEqual(d._index, d._build_index(d.__dict__))
+
+    def test_fingerprint__mapping_value__matches_container(self):
+        d1 = DelimitedDict({"k1": OrderedDict([("k2", "v")])})
+        d2 = DelimitedDict({"k1": {"k2": "v"}})
+        self.assertEqual(d1.fingerprint(), d2.fingerprint())
+        self.assertEqual(d1.fingerprint("k1.k2"), d2.fingerprint("k1.k2"))
+
+    def test_fingerprint__raises_KeyError(self):
+        d = DelimitedDict({"k1.k2": "v"})
+        with self.assertRaises(KeyError):
+            d.fingerprint("k1.foo")
+
+    # fingerprints_differ
+
+    def test_fingerprints_differ(self):
+        d1 = DelimitedDict({"k1.k2": 1})
+        d2 = DelimitedDict({"k1.k2": 1})
+        self.assertFalse(d1.fingerprints_differ(d2))
+
+        d1.fingerprint()
+        d2.fingerprint()
+        self.assertFalse(d1.fingerprints_differ(d2))
+
+        d2.set("k1.k2", 2)
+        self.assertTrue(d1.fingerprints_differ(d2))
+        self.assertTrue(d1.fingerprints_differ(d2, "k1.k2"))
+        self.assertFalse(d1.fingerprints_differ(d2, "k3"))
+
+        # containers returned by ref can be written without the index
+        d2.ref("k1")["k2"] = 1
+        self.assertFalse(d1.fingerprints_differ(d2))
+        self.assertEqual(d2.fingerprint(), d1.fingerprint())
+
+    def test___eq____fingerprints_differ__data_not_compared(self):
+
+        class Uncomparable(object):
+            def __eq__(self, other):
+                raise AssertionError
+
+            __hash__ = object.__hash__
+
+        d1 = DelimitedDict({"k": Uncomparable()}, expand=False)
+        d2 = DelimitedDict({"k": Uncomparable()}, expand=False)
+        d1.fingerprint()
+        d2.fingerprint()
+        self.assertFalse(d1 == d2)
+
+    # compile_path
+
+    def test_compile_path__returns_DelimitedPath(self):
+        p = DelimitedDict.compile_path("k1.k2")
+        self.assertIsInstance(p, DelimitedPath)
+        self.assertIs(p.owner, DelimitedDict)
+
+    def test_compile_path__returns_cached_DelimitedPath(self):
+        p1 = DelimitedDict.compile_path("k1.k2")
+        p2 = DelimitedDict({"k1.k2": "v"}).compile_path("k1.k2")
+        self.assertIs(p1, p2)
+        self.assertIsNot(p1, DelimitedOrderedDict.compile_path("k1.k2"))
+
     # _merge
 
     def test__merge__dict_params(self):
@@ -740,6 +1144,48 @@ class TestDelimitedDict(unittest.TestCase):
         self.assertEqual(type(c), type(d))
         self.assertEqual(c, {"k1.k2.k3": {}})
 
+    def test__collapse_delimited_notation__deep_document(self):
+        d = v = {}
+        for i in range(5000):
+            v["k"] = {}
+            v = v["k"]
+        v["k"] = "v"
+        c = DelimitedDict._collapse_delimited_notation(d)
+        self.assertEqual(c, {".".join(["k"] * 5001): "v"})
+
+    # diff
+
+    def test_diff(self):
+        d1 = DelimitedDict({"k1.k2": "v", "k1.k3.k4": "v", "k5": "v"})
+        d2 = DelimitedDict({"k1.k2": "v", "k1.k3.k4": "foo", "k6": {}})
+        self.assertEqual(d1.diff(d2), {
+            "$set": {"k1.k3.k4": "foo", "k6": {}},
+            "$unset": {"k5": ""}
+        })
+
+    def test_diff__same_data__returns_empty(self):
+        d = DelimitedDict({"k1.k2": "v"})
+        self.assertEqual(d.diff(d), {})
+        self.assertEqual(d.diff(copy.deepcopy(d)), {})
+
+    def test_diff__container_param(self):
+        d = DelimitedDict({"k1.k2": "v", "k1.k3": "v"})
+        self.assertEqual(d.diff({"k1.k2": "v"}), {
+            "$unset": {"k1.k3": ""}
+        })
+
+    def test_diff__replaced_type__sets_value(self):
+        d1 = DelimitedDict({"k1": {"k2": "v"}, "k3": 1, "k4": {}})
+        d2 = DelimitedDict({"k1": "v", "k3": True, "k4": {"k5": "v"}})
+        self.assertEqual(d1.diff(d2), {
+            "$set": {"k1": "v", "k3": True, "k4": {"k5": "v"}}
+        })
+
+    def test_diff__incorrect_type__raises_TypeError(self):
+        d = DelimitedDict()
+        with self.assertRaises(TypeError):
+            d.diff("foo")
+
     # collapse
 
     def test_collapse(self):
@@ -752,6 +1198,87 @@ class TestDelimitedDict(unittest.TestCase):
         })
         self.assertEqual(d.collapse(), {"k1.k2.k3": "v"})
 
+    def test_collapse__returns_cached_copy(self):
+        d = DelimitedDict({"k1.k2": "v"})
+        c1 = d.collapse()
+        c1["k3"] = "v"
+        c2 = d.collapse()
+        self.assertIsNot(c1, c2)
+        self.assertEqual(c2, {"k1.k2": "v"})
+
+    def test_collapse__set__invalidates_cache(self):
+        d = DelimitedDict({"k1.k2": "v"})
+        d.collapse()
+        d.set("k1.k3", "v")
+        self.assertEqual(d.collapse(), {"k1.k2": "v", "k1.k3": "v"})
+
+    def test_collapse__unset__invalidates_cache(self):
+        d = DelimitedDict({"k1.k2": "v", "k1.k3": "v"})
+        d.collapse()
+        d.unset("k1.k3")
+        self.assertEqual(d.collapse(), {"k1.k2": "v"})
+
+    def test_collapse__push_pull__invalidates_cache(self):
+        d = DelimitedDict({"k1.k2": [1]})
+        d.collapse()
+        d.push("k1.k2", 2)
+        self.assertEqual(d.collapse(), {"k1.k2": [1, 2]})
+        d.pull("k1.k2", 1)
+        self.assertEqual(d.collapse(), {"k1.k2": [2]})
+
+    def test_collapse__call__invalidates_cache(self):
+        d = DelimitedDict({"k1.k2": "v"})
+        d.collapse()
+        d({"k3": "v"})
+        self.assertEqual(d.collapse(), {"k3": "v"})
+
+    def test_collapse__update__invalidates_cache(self):
+        d = DelimitedDict({"k1.k2": "v"})
+        d.collapse()
+        d.update({"k1.k3": "v"})
+        self.assertEqual(d.collapse(), {"k1.k2": "v", "k1.k3": "v"})
+
+    def test_collapse__compiled_path_set__invalidates_cache(self):
+        d = DelimitedDict({"k1.k2": "v"})
+        d.collapse()
+        d.compile_path("k1.k2").set(d, "foo")
+        self.assertEqual(d.collapse(), {"k1.k2": "foo"})
+
+    def test_collapse__ref_value__keeps_cache(self):
+        d = DelimitedDict({"k1.k2": "v"})
+        collapsed = d.collapse()
+        self.assertEqual(d.ref("k1.k2"), "v")
+        self.assertEqual(d["k1.k2"], "v")
+        self.assertEqual(d._collapsed, collapsed)
+
+    def test_collapse__ref_container__invalidates_cache(self):
+        d = DelimitedDict({"k1.k2": "v"})
+        d.collapse()
+        d.ref("k1")["k3"] = "v"
+        self.assertEqual(d.collapse(), {"k1.k2": "v", "k1.k3": "v"})
+
+    def test_collapse__spawn_set__invalidates_cache(self):
+        d1 = DelimitedDict({"k1.k2": "v"})
+        d2 = d1.spawn("k1")
+        d1.collapse()
+        d2.set("k3", "v")
+        self.assertEqual(d1.collapse(), {"k1.k2": "v", "k1.k3": "v"})
+        d1.collapse()
+        d2.compile_path("k2").set(d2, "foo")
+        self.assertEqual(d1.collapse(), {"k1.k2": "foo", "k1.k3": "v"})
+
+    # iter_collapsed
+
+    def test_iter_collapsed(self):
+        d = DelimitedDict({
+            "k1.k2.k3": "v",
+            "k4": {},
+            "k5": "v"
+        })
+        i = d.iter_collapsed()
+        self.assertEqual(next(i), ("k1.k2.k3", "v"))
+        self.assertEqual(list(i), [("k4", {}), ("k5", "v")])
+
     # _expand_delimited_notatoin
 
     def test__expand_delimited_notation(self):
@@ -782,6 +1309,54 @@ class TestDelimitedDict(unittest.TestCase):
             }
         })
 
+    def test__expand_delimited_notation__nested_delimited_string(self):
+        d = {
+            "k1": {
+                "k2.k3": "v"
+            },
+            "k1.k4": "v"
+        }
+        e = DelimitedDict._expand_delimited_notation(d)
+        self.assertEqual(e, {
+            "k1": {
+                "k2": {
+                    "k3": "v"
+                },
+                "k4": "v"
+            }
+        })
+
+    def test__expand_delimited_notation__deep_document(self):
+        d = v = {}
+        for i in range(5000):
+            v["k"] = {}
+            v = v["k"]
+        v["k1.k2"] = "v"
+        e = DelimitedDict._expand_delimited_notation(d)
+        for i in range(5000):
+            e = e["k"]
+        self.assertEqual(e, {"k1": {"k2": "v"}})
+
+    # _has_delimited_keys
+
+    def test__has_delimited_keys__returns_True(self):
+        d = {"k1": {"k2": {"k3.k4": "v"}}}
+        self.assertTrue(DelimitedDict._has_delimited_keys(d))
+
+    def test__has_delimited_keys__returns_False(self):
+        d = {"k1": {"k2": {"k3": "v"}}}
+        self.assertFalse(DelimitedDict._has_delimited_keys(d))
+
+    def test___init____dict_param_without_delimited_keys__copies_dict(self):
+        data = {"k1": {"k2": "v"}, "k3": ["v"]}
+        d = DelimitedDict(data)
+        self.assertEqual(d.__dict__, data)
+        self.assertIsNot(d.__dict__, data)
+        d.set("k1.k2", "foo")
+        data["k4"] = "v"
+        self.assertEqual(d.__dict__, {"k1": {"k2": "foo"}, "k3": ["v"]})
+        self.assertEqual(data, {"k1": {"k2": "v"}, "k3": ["v"], "k4": "v"})
+
     # _format_keyerror
 
     def test__format_keyerror__string_key(self):
@@ -841,5 +1416,145 @@ class TestDelimitedDict(unittest.TestCase):
         )
 
 
+class TestDelimitedDictCopyOnWrite(TestDelimitedDict):
+    """ runs the DelimitedDict tests with copy on write enabled """
+
+    def setUp(self):
+        DelimitedDict.copy_on_write = True
+
+    def tearDown(self):
+        DelimitedDict.copy_on_write = False
+
+    # __init__
+
+    def test___init____dict_param_without_delimited_keys__copies_dict(self):
+        data = {"k1": {"k2": "v"}}
+        d = DelimitedDict(data)
+        self.assertIsNot(d.__dict__, data)
+        self.assertIs(d.__dict__["k1"], data["k1"])
+        d.set("k1.k2", "foo")
+        self.assertEqual(data, {"k1": {"k2": "v"}})
+
+    # clone
+
+    def test_clone__shares_containers(self):
+        d1 = DelimitedDict({"k1.k2.k3": "v", "k4.k5": "v"})
+        d2 = d1.clone()
+        self.assertIsNot(d1.__dict__, d2.__dict__)
+        self.assertIs(d1.__dict__["k1"], d2.__dict__["k1"])
+
+    def test_clone__set__copies_written_path(self):
+        d1 = DelimitedDict({"k1.k2.k3": "v", "k4.k5": "v"})
+        d2 = d1.clone()
+        d1.set("k1.k2.k3", "foo")
+        self.assertEqual(d1.get("k1.k2.k3"), "foo")
+        self.assertEqual(d2.get("k1.k2.k3"), "v")
+        self.assertIs(d1.__dict__["k4"], d2.__dict__["k4"])
+
+    def test_clone__set_on_clone__does_not_modify_original(self):
+        d1 = DelimitedDict({"k1.k2.k3": "v"})
+        d2 = d1.clone()
+        d2.set("k1.k2.k3", "foo")
+        self.assertEqual(d1.get("k1.k2.k3"), "v")
+
+    def test_clone__key_param__does_not_modify_original(self):
+        d1 = DelimitedDict({"k1.k2.k3": "v"})
+        d2 = d1.clone("k1")
+        d2.set("k2.k3", "foo")
+        self.assertEqual(d1.get("k1.k2.k3"), "v")
+        d1.set("k1.k2.k3", "bar")
+        self.assertEqual(d2.get("k2.k3"), "foo")
+
+    def test_clone__push_pull__does_not_modify_clone(self):
+        d1 = DelimitedDict({"k1.k2": [1, 2]})
+        d2 = d1.clone()
+        d1.push("k1.k2", 3)
+        d1.pull("k1.k2", 1)
+        self.assertEqual(d1.get("k1.k2"), [2, 3])
+        self.assertEqual(d2.get("k1.k2"), [1, 2])
+
+    def test_clone__set_many_unset_many__copies_written_paths(self):
+        d1 = DelimitedDict({"k1.k2.k3": "v", "k1.k2.k4": "v", "k5.k6": "v"})
+        d2 = d1.clone()
+        d1.set_many({"k1.k2.k3": "foo", "k1.k7": "bar"})
+        d1.unset_many(["k1.k2.k4"])
+        self.assertEqual(d2.get("k1"), {"k2": {"k3": "v", "k4": "v"}})
+        self.assertIs(d1.__dict__["k5"], d2.__dict__["k5"])
+
+    def test_clone__unset__does_not_modify_clone(self):
+        d1 = DelimitedDict({"k1.k2.k3": "v"})
+        d2 = d1.clone()
+        d1.unset("k1.k2.k3", cleanup=True)
+        self.assertEqual(d1.__dict__, {})
+        self.assertEqual(d2.__dict__, {"k1": {"k2": {"k3": "v"}}})
+
+    def test_clone__ref__returns_private_container(self):
+        d1 = DelimitedDict({"k1.k2.k3": "v"})
+        d2 = d1.clone()
+        d1.ref("k1")["k2"]["k3"] = "foo"
+        self.assertEqual(d2.get("k1.k2.k3"), "v")
+
+    def test_clone__compile_path_set__does_not_modify_clone(self):
+        d1 = DelimitedDict({"k1.k2.k3": "v"})
+        d2 = d1.clone()
+        d1.compile_path("k1.k2.k3").set(d1, "foo")
+        self.assertEqual(d2.get("k1.k2.k3"), "v")
+
+    # __deepcopy__
+
+    def test___deepcopy____shares_containers(self):
+        d1 = DelimitedDict({"k1.k2.k3": "v"})
+        d2 = copy.deepcopy(d1)
+        self.assertIs(d1.__dict__["k1"], d2.__dict__["k1"])
+        d2.set("k1.k2.k3", "foo")
+        self.assertEqual(d1.get("k1.k2.k3"), "v")
+
+    # merge
+
+    def test_merge__shares_containers(self):
+        d = DelimitedDict({"k1.k2": "v", "k3.k4": "v"})
+        m = d.merge({"k1.k5": "v"})
+        self.assertIs(m["k3"], d.__dict__["k3"])
+        self.assertIsNot(m["k1"], d.__dict__["k1"])
+        self.assertEqual(d.__dict__, {"k1": {"k2": "v"}, "k3": {"k4": "v"}})
+        d.set("k3.k4", "foo")
+        self.assertEqual(m["k3"], {"k4": "v"})
+
+    # update
+
+    def test_update__does_not_modify_clone(self):
+        d1 = DelimitedDict({"k1.k2": "v"})
+        d2 = d1.clone()
+        d1.update({"k1.k3": "v"})
+        d1.set("k1.k2", "foo")
+        self.assertEqual(d2.__dict__, {"k1": {"k2": "v"}})
+
+    def test_update__write_below_merged_path__does_not_modify_clone(self):
+        d1 = DelimitedDict({"k1": {"k2": {"k3": [3]}}})
+        d2 = d1.clone()
+        d1.update({"k1.k4": 1})
+        d1.push("k1.k2.k4", 1)
+        d1.set("k1.k2.k3", "foo")
+        self.assertEqual(d2.__dict__, {"k1": {"k2": {"k3": [3]}}})
+
+    def test___init____merge__does_not_modify_original(self):
+        d1 = DelimitedDict({"k1.k2.k3": "v", "k4.k5": "v"})
+        d2 = DelimitedDict(d1.merge({"k1.k6": "v"}))
+        d2.set("k4.k5", "foo")
+        d2.set("k1.k2.k3", "foo")
+        self.assertEqual(d1.__dict__, {
+            "k1": {"k2": {"k3": "v"}},
+            "k4": {"k5": "v"}
+        })
+
+    # get
+
+    def test_get__nested_containers__returns_private_copy(self):
+        d = DelimitedDict({"k1.k2": [{"k3": "v"}]})
+        v = d.get("k1")
+        v["k2"][0]["k3"] = "foo"
+        self.assertEqual(d.get("k1.k2"), [{"k3": "v"}])
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,197 @@
+import sys; sys.path.append("../")
+
+import unittest
+import asyncio
+import threading
+import pymongo
+
+from baemo.connection import Connections
+from baemo.entity import Entity
+from baemo.driver import Operation
+from baemo.driver import Concurrent
+from baemo.driver import Driver
+from baemo.driver import AsyncDriver
+from baemo.driver import ExecutorDriver
+
+
+class TestDriver(unittest.TestCase):
+
+    def setUp(self):
+        global connection_name, collection_name, TestModel
+        connection_name = "baemo"
+        collection_name = "{}_{}".format(
+            self.__class__.__name__,
+            self._testMethodName
+        )
+
+        connection = pymongo.MongoClient(connect=False)[connection_name]
+        Connections.set(connection_name, connection)
+
+        TestModel, TestCollection = Entity("Test", {
+            "connection": connection_name,
+            "collection": collection_name
+        })
+
+    def tearDown(self):
+        global connection_name, collection_name
+        Connections.get(connection_name).drop_collection(collection_name)
+
+    # run
+
+    def test_run(self):
+        def operations():
+            yield Operation(TestModel, "insert_one", {"document": {"k": "v"}})
+            documents = yield Operation(TestModel, "find", {
+                "filter": {},
+                "projection": {"_id": 0}
+            })
+            return documents
+
+        self.assertEqual(Driver().run(operations()), [{"k": "v"}])
+
+    def test_run__raw(self):
+        def operations():
+            yield Operation(TestModel, "insert_one", {"document": {"k": "v"}})
+            return (yield Operation(TestModel, "find_one", raw=dict))
+
+        document, codec_options = Driver().run(operations())
+        self.assertEqual(document["k"], "v")
+        self.assertIs(codec_options.document_class, dict)
+
+    def test_run__throws_errors(self):
+        def operations():
+            try:
+                yield Operation(TestModel, "not_a_method")
+            except Exception as e:
+                return type(e)
+
+        self.assertIsNotNone(Driver().run(operations()))
+
+    def test_run__no_operations(self):
+        def operations():
+            return "v"
+            yield
+
+        self.assertEqual(Driver().run(operations()), "v")
+
+    # run_concurrent
+
+    def test_run_concurrent(self):
+        def operation(value):
+            yield Operation(TestModel, "count_documents", {"filter": {}})
+            return value
+
+        def failing():
+            yield Operation(TestModel, "not_a_method")
+
+        def operations():
+            return (yield Concurrent([
+                operation("v1"),
+                failing(),
+                operation("v2")
+            ]))
+
+        results = Driver().run(operations())
+        self.assertEqual(results[0], ("v1", None))
+        self.assertIsNone(results[1][0])
+        self.assertIsInstance(results[1][1], Exception)
+        self.assertEqual(results[2], ("v2", None))
+
+    def test_run_concurrent__max_workers(self):
+        barrier = threading.Barrier(3, timeout=5)
+
+        # every generator has to run at once to pass the barrier
+        def operation(value):
+            barrier.wait()
+            yield Operation(TestModel, "count_documents", {"filter": {}})
+            return value
+
+        def operations():
+            return (yield Concurrent([operation(i) for i in range(3)]))
+
+        self.assertEqual(
+            Driver(max_workers=3).run(operations()),
+            [(0, None), (1, None), (2, None)]
+        )
+
+    def test_run_concurrent__nested(self):
+        def operation(value):
+            yield Operation(TestModel, "count_documents", {"filter": {}})
+            return value
+
+        def nested(value):
+            return (yield Concurrent([operation(value), operation(value)]))
+
+        def operations():
+            return (yield Concurrent([nested(1), nested(2)]))
+
+        self.assertEqual(Driver(max_workers=1).run(operations()), [
+            ([(1, None), (1, None)], None),
+            ([(2, None), (2, None)], None)
+        ])
+
+
+class TestExecutorDriver(unittest.TestCase):
+
+    def setUp(self):
+        global connection_name, collection_name, TestModel
+        connection_name = "baemo"
+        collection_name = "{}_{}".format(
+            self.__class__.__name__,
+            self._testMethodName
+        )
+
+        connection = pymongo.MongoClient(connect=False)[connection_name]
+        Connections.set(connection_name, connection)
+
+        TestModel, TestCollection = Entity("Test", {
+            "connection": connection_name,
+            "collection": collection_name
+        })
+
+    def tearDown(self):
+        global connection_name, collection_name
+        Connections.get(connection_name).drop_collection(collection_name)
+
+    # run
+
+    def test_run(self):
+        def operations():
+            yield Operation(TestModel, "insert_one", {"document": {"k": "v"}})
+            return (yield Operation(TestModel, "count_documents", {
+                "filter": {}
+            }))
+
+        self.assertEqual(asyncio.run(ExecutorDriver().run(operations())), 1)
+
+    def test_run__synchronous_model_driver(self):
+
+        # operations of models with a Driver are run in the executor
+        def operations():
+            yield Operation(TestModel, "insert_one", {"document": {"k": "v"}})
+            return (yield Operation(TestModel, "find", {
+                "filter": {},
+                "projection": {"_id": 0}
+            }))
+
+        self.assertEqual(
+            asyncio.run(AsyncDriver().run(operations())),
+            [{"k": "v"}]
+        )
+
+    def test_run_concurrent(self):
+        def operation(value):
+            yield Operation(TestModel, "count_documents", {"filter": {}})
+            return value
+
+        def operations():
+            return (yield Concurrent([operation(1), operation(2)]))
+
+        self.assertEqual(
+            asyncio.run(ExecutorDriver().run(operations())),
+            [(1, None), (2, None)]
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,299 @@
+import sys; sys.path.append("../")
+
+import unittest
+import pymongo
+import bson
+
+from baemo.connection import Connections
+from baemo.entity import Entity
+from baemo.driver import Driver
+from baemo.lookup import Lookup
+from baemo.memo import DereferenceMemo
+
+from baemo.exceptions import DereferenceError
+
+
+class RecordingDriver(Driver):
+
+    def __init__(self):
+        super().__init__()
+        self.methods = []
+
+    def execute(self, operation):
+        self.methods.append(operation.method)
+        return super().execute(operation)
+
+
+class TestLookup(unittest.TestCase):
+
+    def setUp(self):
+        global connection_name, collection_name, TestModel, TestCollection
+        connection_name = "baemo"
+        collection_name = "{}_{}".format(
+            self.__class__.__name__,
+            self._testMethodName
+        )
+
+        connection = pymongo.MongoClient(connect=False)[connection_name]
+        Connections.set(connection_name, connection)
+
+        self.driver = RecordingDriver()
+        TestModel, TestCollection = Entity("Test", {
+            "connection": connection_name,
+            "collection": collection_name,
+            "lookup": True,
+            "driver": self.driver,
+            "references": {
+                "r1": {
+                    "entity": "Test",
+                    "type": "local_one"
+                },
+                "r2": {
+                    "entity": "Test",
+                    "type": "local_many"
+                },
+                "r3": {
+                    "entity": "Test",
+                    "type": "foreign_many",
+                    "foreign_key": "parent"
+                },
+                "r4": {
+                    "entity": "Test",
+                    "type": "local_one",
+                    "foreign_key": "code"
+                }
+            }
+        }, {
+            "driver": self.driver
+        })
+
+    def tearDown(self):
+        global connection_name, collection_name
+        Connections.get(connection_name).drop_collection(collection_name)
+
+    # compile
+
+    def test_compile(self):
+        lookups = Lookup.compile(TestModel, {"r1": 2, "r2": {"k": 1}})
+        self.assertEqual([l.key for l in lookups], ["r1", "r2"])
+        self.assertIs(
+            Lookup.compile(TestModel, {"r1": 2, "r2": {"k": 1}}),
+            lookups
+        )
+
+        self.assertEqual(lookups[0].stage(), {"$lookup": {
+            "from": collection_name,
+            "localField": "r1",
+            "foreignField": "_id",
+            "as": "_lookup_0"
+        }})
+        self.assertEqual(lookups[1].stage(), {"$lookup": {
+            "from": collection_name,
+            "localField": "r2",
+            "foreignField": "_id",
+            "as": "_lookup_1",
+            "pipeline": [{"$project": {"k": 1, "_id": 1}}]
+        }})
+
+    def test_compile__nested_projection(self):
+        lookups = Lookup.compile(TestModel, {"r3": {"r1": {"k": 1}}})
+        self.assertEqual(lookups[0].stage(), {"$lookup": {
+            "from": collection_name,
+            "localField": "_id",
+            "foreignField": "parent",
+            "as": "_lookup_2",
+            "pipeline": [{
+                "$project": {"r1": 1, "parent": 1}
+            }, {
+                "$lookup": {
+                    "from": collection_name,
+                    "localField": "r1",
+                    "foreignField": "_id",
+                    "as": "_lookup_0",
+                    "pipeline": [{"$project": {"k": 1, "_id": 1}}]
+                }
+            }]
+        }})
+
+    def test_compile__other_connection(self):
+        Entity("Other", {"connection": "other", "collection": "other"})
+        OtherModel, OtherCollection = Entity("Test", {
+            "connection": connection_name,
+            "collection": collection_name,
+            "references": {
+                "r": {
+                    "entity": "Other",
+                    "type": "local_one"
+                }
+            }
+        })
+        self.assertIsNone(Lookup.compile(OtherModel, {"r": 2}))
+
+    def test_compile__levels(self):
+        self.assertEqual(Lookup.compile(TestModel, {"r3": {"r1": 2}}, 0), [])
+
+        lookups = Lookup.compile(TestModel, {"r3": {"r1": 2}}, 1)
+        self.assertEqual(lookups[0].children, [])
+        self.assertFalse(lookups[0].complete)
+        self.assertNotIn("pipeline", lookups[0].stage())
+
+    def test_compile__custom_foreign_key(self):
+        lookups = Lookup.compile(TestModel, {"r4": 2})
+        self.assertEqual(lookups[0].stage(), {"$lookup": {
+            "from": collection_name,
+            "localField": "r4",
+            "foreignField": "code",
+            "as": "_lookup_3",
+            "pipeline": [{"$match": {"code": {"$ne": None}}}]
+        }})
+
+    def test_pipeline(self):
+        lookups = Lookup.compile(TestModel, {"r1": 2})
+        self.assertEqual(Lookup.pipeline(
+            lookups,
+            filter={"k": "v"},
+            projection={"k": 1},
+            sort=[("k", 1)],
+            skip=1,
+            limit=2
+        ), [
+            {"$match": {"k": "v"}},
+            {"$sort": {"k": 1}},
+            {"$skip": 1},
+            {"$limit": 2},
+            {"$project": {"k": 1}},
+            lookups[0].stage()
+        ])
+
+    # place
+
+    def test_place__nested_documents(self):
+        lookups = Lookup.compile(TestModel, {"r3": {"r1": 2}})
+
+        parent_id = bson.ObjectId()
+        child_id = bson.ObjectId()
+        grandchild_id = bson.ObjectId()
+        document = {
+            "_id": parent_id,
+            "_lookup_2": [{
+                "_id": child_id,
+                "parent": parent_id,
+                "r1": grandchild_id,
+                "_lookup_0": [{"_id": grandchild_id, "k": "v"}]
+            }]
+        }
+
+        m = TestModel()
+        found = Lookup.pop(lookups, document)
+        m._post_find_hook(document)
+        Lookup.place(m, lookups, found)
+
+        self.assertEqual(m.get_id(), parent_id)
+        self.assertEqual(type(m.attributes["r3"]), TestCollection)
+        child = m.attributes["r3"][0]
+        self.assertEqual(child.original.get("r1"), grandchild_id)
+        self.assertEqual(type(child.attributes["r1"]), TestModel)
+        self.assertEqual(child.attributes["r1"].get("k"), "v")
+        self.assertNotIn("_lookup_0", child.attributes)
+
+    def test_place__memo(self):
+        lookups = Lookup.compile(TestModel, {"r1": 2, "r2": 2})
+
+        original_id = bson.ObjectId()
+        document = {
+            "_id": bson.ObjectId(),
+            "r1": original_id,
+            "r2": [original_id],
+            "_lookup_0": [{"_id": original_id}],
+            "_lookup_1": [{"_id": original_id}]
+        }
+
+        m = TestModel()
+        found = Lookup.pop(lookups, document)
+        m._post_find_hook(document)
+        Lookup.place(m, lookups, found, DereferenceMemo())
+
+        # the document found by both lookups is hydrated once
+        self.assertIs(m.attributes["r1"], m.attributes["r2"][0])
+
+    def test_place__missing_local_field(self):
+        lookups = Lookup.compile(TestModel, {"r4": 2})
+
+        # documents found for a missing local field are not placed
+        document = {
+            "_id": bson.ObjectId(),
+            "_lookup_3": [{"_id": bson.ObjectId()}]
+        }
+
+        m = TestModel()
+        found = Lookup.pop(lookups, document)
+        m._post_find_hook(document)
+        Lookup.place(m, lookups, found)
+        self.assertFalse(m.has("r4"))
+
+    # Model.find
+
+    def test_Model_find(self):
+        original = TestModel()
+        original.set("k", "v")
+        original.save()
+
+        missing = bson.ObjectId()
+        m = TestModel()
+        m.set({"r1": original.get_id(), "r2": [original.get_id(), missing]})
+        m.save()
+
+        self.driver.methods = []
+        copy = TestModel(m.get_id()).find(projection={"r1": 2, "r2": 2})
+        self.assertEqual(self.driver.methods, ["aggregate"])
+
+        self.assertEqual(type(copy.attributes["r1"]), TestModel)
+        self.assertEqual(copy.attributes["r1"].get("k"), "v")
+        self.assertEqual(copy.original.get("r1"), original.get_id())
+
+        r2 = copy.attributes["r2"]
+        self.assertEqual(type(r2), TestCollection)
+        self.assertEqual(r2[0].get_id(), original.get_id())
+        self.assertEqual(type(r2[1]), DereferenceError)
+        self.assertEqual(r2[1].data["target"], missing)
+
+    def test_Model_find__dereference_error(self):
+        missing = bson.ObjectId()
+        m = TestModel()
+        m.set("r1", missing)
+        m.save()
+
+        copy = TestModel(m.get_id()).find(projection={"r1": 2})
+        self.assertEqual(type(copy.attributes["r1"]), DereferenceError)
+        self.assertEqual(
+            copy.attributes["r1"].data,
+            {"model": "TestModel", "t": missing}
+        )
+
+    # Collection.find
+
+    def test_Collection_find(self):
+        parents = []
+        for i in range(3):
+            parent = TestModel()
+            parent.set("top", True)
+            parent.save()
+            parents.append(parent)
+            for j in range(i):
+                child = TestModel()
+                child.set("parent", parent.get_id())
+                child.save()
+
+        self.driver.methods = []
+        c = TestCollection({"top": True}).find(projection={"r3": 2})
+        self.assertEqual(self.driver.methods, ["count", "aggregate"])
+        self.assertEqual(len(c), 3)
+
+        for i, m in enumerate(c):
+            self.assertEqual(len(m.attributes["r3"]), i)
+            for child in m.attributes["r3"]:
+                self.assertEqual(child.get("parent"), m.get_id())
+
+
+if __name__ == "__main__":
+    unittest.main()
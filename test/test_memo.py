@@ -0,0 +1,90 @@
+import sys; sys.path.append("../")
+
+import unittest
+import bson
+
+from baemo.entity import Entity
+from baemo.memo import DereferenceMemo
+
+
+class TestDereferenceMemo(unittest.TestCase):
+
+    def setUp(self):
+        global TestModel
+        TestModel, TestCollection = Entity("Test", {
+            "connection": "baemo",
+            "collection": "test"
+        })
+
+    def model(self):
+        return TestModel(bson.ObjectId())
+
+    # key
+
+    def test_key(self):
+        memo = DereferenceMemo()
+        self.assertEqual(
+            memo.key(TestModel, "_id", 1, 2),
+            memo.key(TestModel, "_id", 1)
+        )
+        self.assertEqual(
+            memo.key(TestModel, "_id", [1, 2], {"k": 1}),
+            memo.key(TestModel, "_id", [1, 2], {"k": 1})
+        )
+        self.assertNotEqual(
+            memo.key(TestModel, "_id", 1, {"k": 1}),
+            memo.key(TestModel, "_id", 1)
+        )
+
+    # get, set
+
+    def test_get__shared_with_enter(self):
+        m = self.model()
+        memo = DereferenceMemo()
+        key = memo.key(TestModel, "_id", m.get_id())
+        self.assertIsNone(memo.get(key))
+
+        memo.enter(m).set(key, [m])
+        self.assertEqual(memo.get(key), [m])
+
+    # levels
+
+    def test_levels(self):
+        m1, m2 = self.model(), self.model()
+
+        memo = DereferenceMemo()
+        self.assertIsNone(memo.levels(m1))
+
+        memo = DereferenceMemo(max_depth=2)
+        self.assertEqual(memo.levels(m1), 2)
+        self.assertEqual(memo.enter(m1).levels(m2), 1)
+        self.assertFalse(memo.enter(m1).enter(m2).descends(self.model()))
+
+    def test_levels__cycle(self):
+        m1, m2 = self.model(), self.model()
+        copy = TestModel(m1.get_id())
+
+        memo = DereferenceMemo().enter(m1).enter(m2)
+        self.assertEqual(memo.levels(copy), 0)
+        self.assertTrue(memo.descends(self.model()))
+
+    # add
+
+    def test_add(self):
+        m1, m2, m3 = self.model(), self.model(), self.model()
+        copy = TestModel(m1.get_id())
+
+        memo = DereferenceMemo(max_depth=3)
+        memo.add(m1, m2)
+        memo.add(m2, m3)
+        memo.add(m3, copy)
+        self.assertEqual(memo.levels(m3), 1)
+        self.assertFalse(memo.descends(copy))
+
+        # the first parent is kept
+        memo.add(m1, m3)
+        self.assertEqual(memo.levels(m3), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -2,6 +2,8 @@
 import sys; sys.path.append("../") # noqa
 
 import unittest
+import asyncio
+import threading
 import copy
 import pymongo
 import datetime
@@ -11,8 +13,12 @@ from baemo.connection import Connections
 from baemo.delimited import DelimitedDict
 from baemo.references import References
 from baemo.projection import Projection
+from baemo.raw import RawDocument
 
 from baemo.entity import Entity
+from baemo.model import AsyncModel
+from baemo.driver import AsyncDriver
+from baemo.driver import Driver
 
 from baemo.exceptions import ModelTargetNotSet
 from baemo.exceptions import ModelNotUpdated
@@ -287,6 +293,269 @@ class TestModel(unittest.TestCase):
 
         self.assertEqual(copy.target.get(), {"k": "v"})
 
+
+    def test_find__decodes_attributes(self):
+        global connection_name, collection_name
+
+        TestModel, TestCollection = Entity("Test", {
+            "connection": connection_name,
+            "collection": collection_name
+        })
+
+        m = TestModel()
+        m.set("k1", {"k2": "v"})
+        m.set("k3", [{"k4": "v"}])
+        m.save()
+
+        copy = TestModel(m.get_id()).find()
+        self.assertEqual(type(copy.attributes.__dict__), dict)
+        self.assertEqual(type(copy.original.__dict__), RawDocument)
+        self.assertEqual(copy.attributes, m.attributes)
+        self.assertEqual(copy.original, m.attributes)
+
+        copy.set("k1.k2", "foo")
+        copy.push("k3", "v")
+        self.assertEqual(copy.original.get("k1.k2"), "v")
+        self.assertEqual(copy.original.get("k3"), [{"k4": "v"}])
+
+    def test_find__find_cache(self):
+        global connection_name, collection_name
+
+        TestModel, TestCollection = Entity("Test", {
+            "connection": connection_name,
+            "collection": collection_name,
+            "find_cache": {"max_entries": 10}
+        })
+
+        m = TestModel()
+        m.set({"k1": "v", "k2": "v"})
+        m.save()
+
+        TestModel(m.get_id()).find()
+        TestModel(m.get_id()).find(projection={"k1": 1})
+
+        # the document is gone, cached documents are read
+        connection = Connections.get(connection_name, collection_name)
+        connection.delete_many({})
+        copy = TestModel(m.get_id()).find()
+        self.assertEqual(copy.get(), m.get())
+        self.assertEqual(
+            TestModel(m.get_id()).find(projection={"k1": 1}).get(),
+            {"_id": m.get_id(), "k1": "v"}
+        )
+
+        cache = TestModel.get_find_cache()
+        self.assertEqual(cache.hits, 2)
+        self.assertEqual(cache.misses, 2)
+        self.assertIsNone(Entity("Test", {}, {})[0].get_find_cache())
+
+    def test_find__find_cache__save_invalidates(self):
+        global connection_name, collection_name
+
+        TestModel, TestCollection = Entity("Test", {
+            "connection": connection_name,
+            "collection": collection_name,
+            "find_cache": {"max_entries": 10, "ttl": 60}
+        })
+
+        m = TestModel()
+        m.set("k", "v")
+        m.save()
+
+        copy = TestModel(m.get_id()).find()
+        copy.set("k", "foo")
+        copy.save()
+        self.assertEqual(TestModel(m.get_id()).find().get("k"), "foo")
+
+        copy.delete()
+        copy.save()
+        with self.assertRaises(ModelNotFound):
+            TestModel(m.get_id()).find()
+
+        m = TestModel()
+        m.save()
+        TestModel(m.get_id()).find()
+        c = TestCollection().find()
+        c[0].delete()
+        c.save()
+        with self.assertRaises(ModelNotFound):
+            TestModel(m.get_id()).find()
+
+    def test_find__find_cache__projection_excludes_id(self):
+        global connection_name, collection_name
+
+        TestModel, TestCollection = Entity("Test", {
+            "connection": connection_name,
+            "collection": collection_name,
+            "find_cache": {"max_entries": 10, "ttl": 60}
+        })
+
+        m = TestModel()
+        m.set("k", "v")
+        m.save()
+
+        # cached by the id of the target
+        TestModel(m.get_id()).find(projection={"_id": 0})
+        m.set("k", "foo")
+        m.save()
+        self.assertEqual(
+            TestModel(m.get_id()).find(projection={"_id": 0}).get(),
+            {"k": "foo"}
+        )
+
+        # not cached without an id
+        copy = TestModel().set_target({"k": "foo"})
+        copy.find(projection={"_id": 0})
+        self.assertEqual(len(TestModel.get_find_cache()), 1)
+
+    def test_find__not_found_cache(self):
+        global connection_name, collection_name
+
+        TestModel, TestCollection = Entity("Test", {
+            "connection": connection_name,
+            "collection": collection_name,
+            "not_found_cache": {"max_entries": 10, "ttl": 60}
+        })
+
+        id = bson.ObjectId()
+        with self.assertRaises(ModelNotFound):
+            TestModel(id).find()
+
+        # the document is inserted elsewhere, the miss is cached
+        connection = Connections.get(connection_name, collection_name)
+        connection.insert_one({"_id": id})
+        with self.assertRaises(ModelNotFound):
+            TestModel(id).find()
+
+        cache = TestModel.get_not_found_cache()
+        self.assertEqual(cache.hits, 1)
+        self.assertIsNone(Entity("Test", {}, {})[0].get_not_found_cache())
+
+    def test_find__not_found_cache__expires(self):
+        global connection_name, collection_name
+
+        TestModel, TestCollection = Entity("Test", {
+            "connection": connection_name,
+            "collection": collection_name,
+            "not_found_cache": {"max_entries": 10, "ttl": 0}
+        })
+
+        id = bson.ObjectId()
+        with self.assertRaises(ModelNotFound):
+            TestModel(id).find()
+
+        connection = Connections.get(connection_name, collection_name)
+        connection.insert_one({"_id": id})
+        self.assertEqual(TestModel(id).find().get_id(), id)
+
+    def test_find__not_found_cache__insert_invalidates(self):
+        global connection_name, collection_name
+
+        TestModel, TestCollection = Entity("Test", {
+            "connection": connection_name,
+            "collection": collection_name,
+            "not_found_cache": {"max_entries": 10, "ttl": 60}
+        })
+
+        id = bson.ObjectId()
+        with self.assertRaises(ModelNotFound):
+            TestModel(id).find()
+
+        m = TestModel()
+        m.set("_id", id)
+        m.save()
+        self.assertEqual(TestModel(id).find().get_id(), id)
+
+    def test_find__id_filter(self):
+        global connection_name, collection_name
+
+        TestModel, TestCollection = Entity("Test", {
+            "connection": connection_name,
+            "collection": collection_name,
+            "id_filter": {"capacity": 100}
+        })
+
+        m1 = TestModel()
+        m1.save()
+        self.assertIsNone(TestModel.get_id_filter())
+
+        id_filter = TestModel.build_id_filter()
+        self.assertIs(TestModel.get_id_filter(), id_filter)
+        self.assertIn(m1.get_id(), id_filter)
+
+        # ids missing from the filter are not queried
+        id = bson.ObjectId()
+        connection = Connections.get(connection_name, collection_name)
+        connection.insert_one({"_id": id})
+        with self.assertRaises(ModelNotFound):
+            TestModel(id).find()
+
+        # inserted ids are added, deleted ids are kept and queried
+        m2 = TestModel()
+        m2.save()
+        self.assertEqual(TestModel(m2.get_id()).find().get_id(), m2.get_id())
+
+        m1.delete()
+        m1.save()
+        self.assertIn(m1.get_id(), id_filter)
+        self.assertIn(m2.get_id(), id_filter)
+        with self.assertRaises(ModelNotFound):
+            TestModel(m1.get_id()).find()
+
+        # filters are rebuilt from the collection
+        TestModel.build_id_filter()
+        self.assertEqual(TestModel(id).find().get_id(), id)
+
+        # ids that can not be hashed are queried
+        with self.assertRaises(ModelNotFound):
+            TestModel([m2.get_id()]).find()
+
+    def test_find__lazy_True(self):
+        global connection_name, collection_name
+
+        TestModel, TestCollection = Entity("Test", {
+            "connection": connection_name,
+            "collection": collection_name,
+            "lazy": True
+        })
+
+        m = TestModel()
+        m.set("k1", {"k2": "v"})
+        m.set("k3", [{"k4": "v"}])
+        m.set("k5", "v")
+        m.save()
+
+        copy = TestModel(m.get_id()).find()
+        self.assertEqual(type(copy.attributes.__dict__), RawDocument)
+        self.assertEqual(copy.get("k1.k2"), "v")
+        self.assertNotIn("k3", dict.keys(copy.attributes.__dict__))
+        self.assertIsNotNone(copy.original.__dict__.raw)
+        self.assertEqual(copy.attributes, m.attributes)
+        self.assertEqual(copy.original, m.attributes)
+
+    def test_find__lazy_True__save(self):
+        global connection_name, collection_name
+
+        TestModel, TestCollection = Entity("Test", {
+            "connection": connection_name,
+            "collection": collection_name,
+            "lazy": True
+        })
+
+        m = TestModel()
+        m.set("k1", {"k2": "v"})
+        m.set("k3", "v")
+        m.save()
+
+        m = TestModel(m.get_id()).find()
+        m.set("k1.k2", "foo")
+        m.set("k3", "v")
+        self.assertEqual(m.updates.get(), {"$set": {"k1": {"k2": "foo"}}})
+        m.save()
+
+        copy = TestModel(m.get_id()).find()
+        self.assertEqual(copy.get("k1.k2"), "foo")
+
     # ref
 
     def test_ref__no_params(self):
@@ -515,6 +784,74 @@ class TestModel(unittest.TestCase):
             }
         })
 
+    def test_get__nested_values_are_copies(self):
+        m = TestModel()
+        m.attributes({"k1": {"k2": [{"k3": "v"}]}})
+        data = m.get()
+        data["k1"]["k2"][0]["k3"] = "foo"
+        self.assertEqual(m.get("k1.k2.0.k3", None), None)
+        self.assertEqual(m.attributes.get("k1.k2")[0]["k3"], "v")
+
+    def test_get__delimited_string__inclusive_projection_param(self):
+        m = TestModel()
+        m.attributes({"k1": {"k2": "v", "k3": "v"}, "k4": "v"})
+        self.assertEqual(
+            m.get("k1", projection={"k1": 1}),
+            {"k2": "v", "k3": "v"}
+        )
+        self.assertEqual(m.get("k4", projection={"k1": 1}), "v")
+
+    def test_get__delimited_string__inclusive_projection_of_parent(self):
+        m = TestModel()
+        m.attributes({"k1": {"k2": {"k3": "v", "k4": "v"}, "k5": "v"}})
+        self.assertEqual(
+            m.get("k1.k2", projection={"k1": 1}),
+            {"k3": "v", "k4": "v"}
+        )
+        self.assertEqual(
+            m.get("k1.k2", projection={"k1.k2.k3": 1}),
+            {"k3": "v"}
+        )
+
+    def test_get__delimited_string_through_value__returns_default_value(self):
+        m = TestModel()
+        m.attributes({"k1": "v"})
+        self.assertEqual(m.get("k1.k2", "Default"), "Default")
+        with self.assertRaises(TypeError):
+            m.get("k1.k2")
+
+        m.attributes({"k1": {"k2": 1}})
+        with self.assertRaisesRegex(TypeError, "found int for k2 in k1.k2.k3"):
+            m.get("k1.k2.k3")
+
+    def test_get__nested_entity_in_nested_dict__projection_param(self):
+        child = TestModel()
+        child.attributes({"k1": "v", "k2": "v"})
+        parent = TestModel()
+        parent.attributes({"k": {"child": child}})
+        self.assertEqual(
+            parent.get("k.child", projection={"k": {"child": {"k1": 0}}}),
+            {"k2": "v"}
+        )
+        self.assertEqual(
+            parent.get(projection={"k": {"child": {"k1": 0}}}),
+            {"k": {"child": {"k2": "v"}}}
+        )
+
+    def test_get__nested_collection__projection_param(self):
+        TestModel, TestCollection = Entity("Test", {})
+
+        child = TestModel()
+        child.attributes({"k1": "v", "k2": "v"})
+        children = TestCollection()
+        children.add(child)
+        parent = TestModel()
+        parent.attributes({"children": children})
+        self.assertEqual(
+            parent.get(projection={"children": {"k1": 0}}),
+            {"children": [{"k2": "v"}]}
+        )
+
     # generate_id
 
     def test_generate_id(self):
@@ -550,6 +887,34 @@ class TestModel(unittest.TestCase):
         parent.set("child.k", "foo")
         self.assertEqual(child.attributes.get(), {"k": "foo"})
 
+    def test_set__fingerprints(self):
+        global connection_name, collection_name
+
+        TestModel, TestCollection = Entity("Test", {
+            "connection": connection_name,
+            "collection": collection_name,
+            "fingerprints": True
+        })
+
+        m = TestModel()
+        m.set("k", {"a": [1]})
+        m.save()
+
+        copy = TestModel(m.get_id()).find()
+        self.assertEqual(copy, TestModel(m.get_id()).find())
+        self.assertFalse(copy.attributes.fingerprints_differ(copy.original))
+
+        copy.set("k.a", [2])
+        self.assertTrue(
+            copy.attributes.fingerprints_differ(copy.original, "k.a")
+        )
+        self.assertEqual(copy.updates.get(), {"$set": {"k": {"a": [2]}}})
+        self.assertNotEqual(copy, TestModel(m.get_id()).find())
+
+        copy.set("k.a", [1])
+        self.assertEqual(copy.updates.get(), {})
+        self.assertEqual(copy, TestModel(m.get_id()).find())
+
     def test_set__DereferenceError(self):
         m = TestModel()
         m.attributes({"k": DereferenceError()})
@@ -1029,72 +1394,201 @@ class TestModel(unittest.TestCase):
         m.push("k", "v1")
         self.assertEqual(m.updates.get(), {"$push": {"k": "v1"}})
 
-    # save
+    # diff
 
-    def test_save__insert(self):
+    def test_diff(self):
         m = TestModel()
-        m.attributes({"k": "v"})
+        m.attributes({"k1": "v", "k2": {"k3": "v", "k4": "v"}})
         m.save()
+        m.set("k2.k3", "foo")
+        m.unset("k1")
+        self.assertEqual(m.diff(), {
+            "$set": {"k2.k3": "foo"},
+            "$unset": {"k1": ""}
+        })
 
-        find_result = Connections.get(
-            m.connection,
-            m.collection
-        ).find_one()
-
-        self.assertEqual(find_result, m.attributes.get())
-
-    def test_save__insert__protected_post_insert_hook(self):
+    def test_diff__no_changes(self):
         m = TestModel()
-        m.attributes({"k": "v"})
+        m.set("k", "v")
         m.save()
-        self.assertIn(m.id_attribute, m.attributes)
-        self.assertEqual(
-            type(m.attributes[m.id_attribute]),
-            bson.objectid.ObjectId
-        )
-        self.assertEqual(m.attributes, m.original)
-        self.assertEqual(m.updates.get(), {})
-        self.assertEqual(
-            {m.id_attribute: m.attributes[m.id_attribute]},
-            m.target.get()
-        )
+        self.assertEqual(m.diff(), {})
 
-    def test_save__insert__target_set__updates_empty(self):
-        m = TestModel()
-        m.attributes({"k": "v"})
-        m.save()
-        self.assertEqual(
-            {m.id_attribute: m.attributes[m.id_attribute]},
-            m.target.get()
-        )
-        self.assertEqual(m.updates.get(), {})
+    def test_diff__dereferenced_entities(self):
+        global connection_name, collection_name
 
-        try:
-            m.save()
-        except Exception:
-            self.fail("exception raised")
+        TestModel, TestCollection = Entity("Test", {
+            "connection": connection_name,
+            "collection": collection_name,
+            "references": {
+                "r": {
+                    "entity": "Test",
+                    "type": "local_one",
+                }
+            }
+        })
 
-    def test_save__update(self):
         original = TestModel()
-        original.attributes({"k1": "v"})
-        original_id = original.save().get(original.id_attribute)
+        original.set("k", "v")
+        original.save()
 
         m = TestModel()
-        m.set_target(original_id)
-        m.find()
-        m.set("k2", "v")
+        m.set("r", original.get_id())
         m.save()
 
-        copy = TestModel()
-        copy.set_target(original_id)
-        copy.find()
-        self.assertEqual(m.attributes, copy.attributes)
+        copy = TestModel(m.get_id()).find(projection={"r": 2})
+        self.assertEqual(copy.diff(), {})
 
-    def test_save__update__push_pull_iterators(self):
-        m = TestModel()
-        m.save()
-        m.set("k1.k2.k3", "v")
-        m.push_many("k", ["v", "v", "v"])
+    def test_diff__saved_twice__dereferenced_entities(self):
+        global connection_name, collection_name
+
+        TestModel, TestCollection = Entity("Test", {
+            "connection": connection_name,
+            "collection": collection_name,
+            "record_updates": False,
+            "references": {
+                "r": {
+                    "entity": "Test",
+                    "type": "local_one",
+                },
+                "f": {
+                    "entity": "Test",
+                    "type": "foreign_one",
+                    "foreign_key": "p"
+                }
+            }
+        })
+
+        target = TestModel()
+        target.save()
+
+        m = TestModel()
+        m.set("r", target.get_id())
+        m.set("e", {})
+        m.save()
+
+        child = TestModel()
+        child.set("p", m.get_id())
+        child.save()
+
+        copy = TestModel(m.get_id()).find(projection={"r": 2, "f": 2})
+        self.assertEqual(copy.get("f._id"), child.get_id())
+        copy.set("k", "v")
+        copy.save()
+        self.assertEqual(copy.diff(), {})
+        copy.save()
+        self.assertEqual(copy.diff(), {})
+        self.assertEqual(copy.original.get(), {
+            "_id": m.get_id(),
+            "r": target.get_id(),
+            "e": {},
+            "k": "v"
+        })
+
+    def test_diff__dereference_placeholders(self):
+        global connection_name, collection_name
+
+        TestModel, TestCollection = Entity("Test", {
+            "connection": connection_name,
+            "collection": collection_name,
+            "record_updates": False,
+            "references": {
+                "r": {
+                    "entity": "Test",
+                    "type": "local_one",
+                },
+                "f": {
+                    "entity": "Test",
+                    "type": "foreign_one",
+                    "foreign_key": "k"
+                }
+            }
+        })
+
+        target = bson.ObjectId()
+
+        m = TestModel()
+        m.set("r", target)
+        m.save()
+
+        copy = TestModel(m.get_id()).find(projection={"r": 2, "f": 2})
+        self.assertIsInstance(copy.attributes.ref("r"), DereferenceError)
+        self.assertIsNone(copy.attributes.ref("f"))
+        self.assertEqual(copy.diff(), {})
+
+        copy.set("k", "v")
+        copy.save()
+        self.assertEqual(TestModel(m.get_id()).find().get(), {
+            m.id_attribute: m.get_id(),
+            "r": target,
+            "k": "v"
+        })
+
+    # save
+
+    def test_save__insert(self):
+        m = TestModel()
+        m.attributes({"k": "v"})
+        m.save()
+
+        find_result = Connections.get(
+            m.connection,
+            m.collection
+        ).find_one()
+
+        self.assertEqual(find_result, m.attributes.get())
+
+    def test_save__insert__protected_post_insert_hook(self):
+        m = TestModel()
+        m.attributes({"k": "v"})
+        m.save()
+        self.assertIn(m.id_attribute, m.attributes)
+        self.assertEqual(
+            type(m.attributes[m.id_attribute]),
+            bson.objectid.ObjectId
+        )
+        self.assertEqual(m.attributes, m.original)
+        self.assertEqual(m.updates.get(), {})
+        self.assertEqual(
+            {m.id_attribute: m.attributes[m.id_attribute]},
+            m.target.get()
+        )
+
+    def test_save__insert__target_set__updates_empty(self):
+        m = TestModel()
+        m.attributes({"k": "v"})
+        m.save()
+        self.assertEqual(
+            {m.id_attribute: m.attributes[m.id_attribute]},
+            m.target.get()
+        )
+        self.assertEqual(m.updates.get(), {})
+
+        try:
+            m.save()
+        except Exception:
+            self.fail("exception raised")
+
+    def test_save__update(self):
+        original = TestModel()
+        original.attributes({"k1": "v"})
+        original_id = original.save().get(original.id_attribute)
+
+        m = TestModel()
+        m.set_target(original_id)
+        m.find()
+        m.set("k2", "v")
+        m.save()
+
+        copy = TestModel()
+        copy.set_target(original_id)
+        copy.find()
+        self.assertEqual(m.attributes, copy.attributes)
+
+    def test_save__update__push_pull_iterators(self):
+        m = TestModel()
+        m.save()
+        m.set("k1.k2.k3", "v")
+        m.push_many("k", ["v", "v", "v"])
         m.save()
 
         copy = TestModel(m.get_target()).find()
@@ -1334,8 +1828,135 @@ class TestModel(unittest.TestCase):
             copy.id_attribute: m.get(copy.id_attribute)
         })
 
+    def test_save__update__record_updates_False(self):
+        global connection_name, collection_name
+
+        TestModel, TestCollection = Entity("Test", {
+            "connection": connection_name,
+            "collection": collection_name,
+            "record_updates": False
+        })
+
+        m = TestModel()
+        m.set("k1", "v")
+        m.set("k2.k3", "v")
+        m.save()
+
+        m = TestModel(m.get_id()).find()
+        m.set("k2.k4", "v")
+        m.unset("k1")
+        self.assertEqual(m.updates.get(), {})
+        m.save()
+        self.assertEqual(m._operation["operators"], {
+            "$set": {"k2.k4": "v"},
+            "$unset": {"k1": ""}
+        })
+
+        copy = TestModel(m.get_id()).find()
+        self.assertEqual(copy.attributes, m.attributes)
+
+    def test_save__update__record_updates_False__pre_update_hook(self):
+        global connection_name, collection_name
+
+        class ModelAbstract(object):
+            def pre_update_hook(self):
+                self.set("updated", True)
+
+        TestModel, TestCollection = Entity("Test", {
+            "connection": connection_name,
+            "collection": collection_name,
+            "bases": ModelAbstract,
+            "record_updates": False
+        })
+
+        m = TestModel()
+        m.set("k", "v")
+        m.save()
+        m.set("k", "foo")
+        m.save()
+
+        copy = TestModel(m.get_id()).find()
+        self.assertEqual(copy.get("updated"), True)
+        self.assertEqual(copy.get("k"), "foo")
+
     # dereference_entities
 
+    def test_dereference_entities__concurrent(self):
+        global connection_name, collection_name
+
+        # every reference has to be found at once to pass the barrier
+        class BarrierDriver(Driver):
+            barrier = None
+
+            def execute(self, operation):
+                if self.barrier is not None:
+                    self.barrier.wait()
+                return super().execute(operation)
+
+        driver = BarrierDriver(max_workers=3)
+        TestModel, TestCollection = Entity("Test", {
+            "connection": connection_name,
+            "collection": collection_name,
+            "driver": driver,
+            "references": {
+                "r1": {"entity": "Test", "type": "local_one"},
+                "r2": {"entity": "Test", "type": "local_one"},
+                "r3": {"entity": "Test", "type": "local_one"}
+            }
+        })
+
+        originals = []
+        for i in range(3):
+            original = TestModel()
+            original.set("k", i)
+            original.save()
+            originals.append(original)
+
+        m = TestModel()
+        m.set({
+            "r1": originals[0].get_id(),
+            "r2": originals[1].get_id(),
+            "r3": originals[2].get_id()
+        })
+        m.save()
+
+        copy = TestModel(m.get_id()).find()
+        driver.barrier = threading.Barrier(3, timeout=5)
+        copy.dereference_entities(projection={"r1": 2, "r2": 2, "r3": 2})
+
+        self.assertEqual(copy.attributes["r1"].get("k"), 0)
+        self.assertEqual(copy.attributes["r2"].get("k"), 1)
+        self.assertEqual(copy.attributes["r3"].get("k"), 2)
+
+    def test_dereference_entities__concurrent_error(self):
+        global connection_name, collection_name
+
+        TestModel, TestCollection = Entity("Test", {
+            "connection": connection_name,
+            "collection": collection_name,
+            "driver": Driver(max_workers=3),
+            "references": {
+                "r1": {"entity": "Test", "type": "local_one"},
+                "r2": {"entity": "Missing1", "type": "local_many"},
+                "r3": {"entity": "Missing2", "type": "local_many"}
+            }
+        })
+
+        original = TestModel()
+        original.save()
+
+        m = TestModel()
+        m.set({"r1": original.get_id(), "r2": [1], "r3": [1]})
+        m.save()
+
+        copy = TestModel(m.get_id()).find()
+        with self.assertRaisesRegex(Exception, "Missing1"):
+            copy.dereference_entities(projection={"r1": 2, "r2": 2, "r3": 2})
+
+        # references before the first error are set
+        self.assertEqual(type(copy.attributes["r1"]), TestModel)
+        self.assertEqual(copy.attributes["r2"], [1])
+
     def test_dereference_entities__local_one(self):
         global connection_name, collection_name
 
@@ -1585,6 +2206,116 @@ class TestModel(unittest.TestCase):
 
         self.assertEqual(m.get("r"), None)
 
+    def test_dereference_entities__memo(self):
+        global connection_name, collection_name
+
+        class RecordingDriver(Driver):
+            methods = []
+
+            def execute(self, operation):
+                self.methods.append(operation.method)
+                return super().execute(operation)
+
+        driver = RecordingDriver()
+        TestModel, TestCollection = Entity("Test", {
+            "connection": connection_name,
+            "collection": collection_name,
+            "driver": driver,
+            "references": {
+                "author": {"entity": "Test", "type": "local_one"},
+                "editor": {"entity": "Test", "type": "local_one"},
+                "organization": {"entity": "Test", "type": "local_one"},
+                "owner": {"entity": "Test", "type": "local_one"}
+            }
+        })
+
+        owner = TestModel()
+        owner.save()
+
+        organization = TestModel()
+        organization.set("owner", owner.get_id())
+        organization.save()
+
+        author = TestModel()
+        author.set("organization", organization.get_id())
+        author.save()
+
+        post = TestModel()
+        post.set({"author": author.get_id(), "editor": author.get_id()})
+        post.save()
+
+        driver.methods = []
+        copy = TestModel(post.get_id()).find(projection={
+            "author": {"organization": {"owner": 2}},
+            "editor": {"organization": {"owner": 2}}
+        })
+
+        # the author is found once for both references
+        self.assertEqual(driver.methods, ["find_one"] * 4)
+        self.assertIs(copy.attributes["author"], copy.attributes["editor"])
+        self.assertEqual(
+            copy.get("editor.organization.owner._id"),
+            owner.get_id()
+        )
+
+    def test_dereference_entities__cycle(self):
+        global connection_name, collection_name
+
+        TestModel, TestCollection = Entity("Test", {
+            "connection": connection_name,
+            "collection": collection_name,
+            "references": {
+                "r": {"entity": "Test", "type": "local_one"}
+            }
+        })
+
+        m1 = TestModel()
+        m1.save()
+
+        m2 = TestModel()
+        m2.set("r", m1.get_id())
+        m2.save()
+
+        m1.set("r", m2.get_id())
+        m1.save()
+
+        copy = TestModel(m1.get_id()).find(projection={
+            "r": {"r": {"r": {"r": 2}}}
+        })
+
+        # m1 is found again below m2 but its references are not
+        r = copy.attributes["r"].attributes["r"]
+        self.assertEqual(type(r), TestModel)
+        self.assertEqual(r.get_id(), m1.get_id())
+        self.assertEqual(r.attributes["r"], m2.get_id())
+
+    def test_dereference_entities__max_dereference_depth(self):
+        global connection_name, collection_name
+
+        TestModel, TestCollection = Entity("Test", {
+            "connection": connection_name,
+            "collection": collection_name,
+            "max_dereference_depth": 1,
+            "references": {
+                "r": {"entity": "Test", "type": "local_one"}
+            }
+        })
+
+        m1 = TestModel()
+        m1.save()
+
+        m2 = TestModel()
+        m2.set("r", m1.get_id())
+        m2.save()
+
+        m3 = TestModel()
+        m3.set("r", m2.get_id())
+        m3.save()
+
+        copy = TestModel(m3.get_id()).find(projection={"r": {"r": 2}})
+        self.assertEqual(type(copy.attributes["r"]), TestModel)
+        self.assertEqual(copy.attributes["r"].attributes["r"], m1.get_id())
+
     # reference entities
 
     def test_reference_entities(self):
@@ -1633,5 +2364,365 @@ class TestModel(unittest.TestCase):
         parent.save()
 
 
+class AsyncCursor(object):
+
+    def __init__(self, documents):
+        self.documents = documents
+
+    async def to_list(self, length=None):
+        await asyncio.sleep(0)
+        return list(self.documents)[:length]
+
+
+class AsyncCollection(object):
+    """ an in-process asyncio stand-in for a collection, methods await before
+    calling the pymongo collection it wraps """
+
+    def __init__(self, collection, calls):
+        self.collection = collection
+        self.calls = calls
+
+    @property
+    def codec_options(self):
+        return self.collection.codec_options
+
+    def with_options(self, **kwargs):
+        return AsyncCollection(
+            self.collection.with_options(**kwargs),
+            self.calls
+        )
+
+    def find(self, *args, **kwargs):
+        self.calls.append("find")
+        return AsyncCursor(self.collection.find(*args, **kwargs))
+
+    def __getattr__(self, name):
+        method = getattr(self.collection, name)
+
+        async def call(*args, **kwargs):
+            self.calls.append(name)
+            await asyncio.sleep(0)
+            return method(*args, **kwargs)
+
+        return call
+
+
+class AsyncDatabase(object):
+
+    def __init__(self, database):
+        self.database = database
+        self.calls = []
+
+    def __getitem__(self, name):
+        return AsyncCollection(self.database[name], self.calls)
+
+
+class TestAsyncModel(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        global connection_name, collection_name, TestModel, TestCollection
+
+        connection_name = "baemo"
+        collection_name = "{}_{}".format(
+            self.__class__.__name__,
+            self._testMethodName
+        )
+
+        connection = pymongo.MongoClient(connect=False)[connection_name]
+        Connections.set(connection_name, connection)
+
+        self.database = AsyncDatabase(connection)
+        Connections.set("baemo_async", self.database)
+
+        TestModel, TestCollection = Entity("Test", {
+            "bases": AsyncModel,
+            "connection": "baemo_async",
+            "collection": collection_name,
+            "driver": AsyncDriver()
+        })
+
+    def tearDown(self):
+        global connection_name, collection_name
+        Connections.get(connection_name).drop_collection(collection_name)
+
+    # find
+
+    async def test_find(self):
+        m = TestModel()
+        m.set("k", "v")
+        await m.save()
+
+        copy = await TestModel(m.get_id()).find()
+        self.assertEqual(copy.attributes, m.attributes)
+        self.assertEqual(copy.original, m.attributes)
+        self.assertEqual(self.database.calls, ["insert_one", "find_one"])
+
+    async def test_find__projection_param(self):
+        m = TestModel()
+        m.set({"k1": "v", "k2": "v"})
+        await m.save()
+
+        copy = await TestModel(m.get_id()).find(projection={"k1": 1})
+        self.assertEqual(copy.get(), {"_id": m.get_id(), "k1": "v"})
+
+    async def test_find__not_found(self):
+        with self.assertRaises(ModelNotFound):
+            await TestModel(bson.ObjectId()).find()
+
+    async def test_find__hooks(self):
+        global collection_name
+
+        class Base(object):
+            def pre_find_hook(self):
+                self.set("pre", True)
+
+            def post_find_hook(self):
+                self.set("post", True)
+
+        TestModel, TestCollection = Entity("Test", {
+            "bases": [Base, AsyncModel],
+            "connection": "baemo_async",
+            "collection": collection_name,
+            "driver": AsyncDriver()
+        })
+
+        m = TestModel()
+        await m.save()
+
+        copy = await TestModel(m.get_id()).find()
+        self.assertTrue(copy.get("post"))
+
+    async def test_find__concurrent(self):
+        ids = []
+        for i in range(3):
+            m = TestModel()
+            m.set("k", i)
+            await m.save()
+            ids.append(m.get_id())
+
+        models = await asyncio.gather(*[TestModel(i).find() for i in ids])
+        self.assertEqual([m.get("k") for m in models], [0, 1, 2])
+
+    async def test_find__ExecutorDriver(self):
+        global connection_name, collection_name
+
+        TestModel, TestCollection = Entity("Test", {
+            "bases": AsyncModel,
+            "connection": connection_name,
+            "collection": collection_name
+        })
+
+        m = TestModel()
+        m.set("k", "v")
+        await m.save()
+
+        copy = await TestModel(m.get_id()).find()
+        self.assertEqual(copy.get("k"), "v")
+
+    async def test_find__id_filter(self):
+        global collection_name
+
+        TestModel, TestCollection = Entity("Test", {
+            "bases": AsyncModel,
+            "connection": "baemo_async",
+            "collection": collection_name,
+            "driver": AsyncDriver()
+        })
+
+        m = TestModel()
+        await m.save()
+
+        id_filter = await TestModel.build_id_filter()
+        self.assertIn(m.get_id(), id_filter)
+        self.assertEqual(id_filter.capacity, 2)
+        self.assertEqual(
+            self.database.calls,
+            ["insert_one", "count_documents", "find"]
+        )
+
+        with self.assertRaises(ModelNotFound):
+            await TestModel(bson.ObjectId()).find()
+
+    # dereference_entities
+
+    async def test_dereference_entities__local_one(self):
+        global collection_name
+
+        TestModel, TestCollection = Entity("Test", {
+            "bases": AsyncModel,
+            "connection": "baemo_async",
+            "collection": collection_name,
+            "driver": AsyncDriver(),
+            "references": {
+                "r": {
+                    "entity": "Test",
+                    "type": "local_one"
+                }
+            }
+        })
+
+        original = TestModel()
+        original.set("k", "v")
+        await original.save()
+
+        m = TestModel()
+        m.set("r", original.get_id())
+        await m.save()
+
+        copy = await TestModel(m.get_id()).find(projection={"r": 2})
+        self.assertEqual(type(copy.attributes["r"]), TestModel)
+        self.assertEqual(copy.get("r.k"), "v")
+
+        copy = await TestModel(m.get_id()).find()
+        await copy.dereference_entities(projection={"r": 2})
+        self.assertEqual(copy.get("r.k"), "v")
+
+    # diff
+
+    async def test_diff__cascade(self):
+        global collection_name
+
+        TestModel, TestCollection = Entity("Test", {
+            "bases": AsyncModel,
+            "connection": "baemo_async",
+            "collection": collection_name,
+            "driver": AsyncDriver(),
+            "record_updates": False,
+            "references": {
+                "r": {
+                    "entity": "Test",
+                    "type": "local_one"
+                }
+            }
+        })
+
+        m = TestModel()
+        await m.save()
+
+        r = TestModel()
+        m.set("r", r)
+        self.database.calls.clear()
+        self.assertEqual(await m.diff(cascade=True), {
+            "$set": {"r": r.get_id()}
+        })
+        self.assertEqual(self.database.calls, ["insert_one"])
+        self.assertEqual(
+            (await m.reference_entities(m.attributes, cascade=False)).get(),
+            {"_id": m.get_id(), "r": r.get_id()}
+        )
+
+    async def test_dereference_entities__concurrent(self):
+        global collection_name
+
+        TestModel, TestCollection = Entity("Test", {
+            "bases": AsyncModel,
+            "connection": "baemo_async",
+            "collection": collection_name,
+            "driver": AsyncDriver(),
+            "references": {
+                "r1": {"entity": "Test", "type": "local_one"},
+                "r2": {"entity": "Test", "type": "local_one"}
+            }
+        })
+
+        originals = []
+        for i in range(2):
+            original = TestModel()
+            original.set("k", i)
+            await original.save()
+            originals.append(original)
+
+        m = TestModel()
+        m.set({"r1": originals[0].get_id(), "r2": originals[1].get_id()})
+        await m.save()
+
+        copy = await TestModel(m.get_id()).find(projection={"r1": 2, "r2": 2})
+        self.assertEqual(copy.attributes["r1"].get("k"), 0)
+        self.assertEqual(copy.attributes["r2"].get("k"), 1)
+
+    async def test_dereference_entities__local_many(self):
+        global collection_name
+
+        TestModel, TestCollection = Entity("Test", {
+            "bases": AsyncModel,
+            "connection": "baemo_async",
+            "collection": collection_name,
+            "driver": AsyncDriver(),
+            "references": {
+                "r": {
+                    "entity": "Test",
+                    "type": "local_many"
+                }
+            }
+        })
+
+        original = TestModel()
+        original.set("k", "v")
+        await original.save()
+
+        m = TestModel()
+        m.set("r", [original.get_id(), bson.ObjectId()])
+        await m.save()
+
+        copy = await TestModel(m.get_id()).find(projection={"r": 2})
+        self.assertEqual(type(copy.attributes["r"]), TestCollection)
+        self.assertEqual(copy.attributes["r"][0].get("k"), "v")
+        self.assertEqual(type(copy.attributes["r"][1]), DereferenceError)
+
+    # save
+
+    async def test_save__update(self):
+        m = TestModel()
+        m.set("k", "v")
+        await m.save()
+        m.set("k", "foo")
+        await m.save()
+
+        copy = await TestModel(m.get_id()).find()
+        self.assertEqual(copy.get("k"), "foo")
+        self.assertEqual(m.updates.get(), {})
+
+    async def test_save__delete(self):
+        m = TestModel()
+        await m.save()
+        m.delete()
+        await m.save()
+
+        with self.assertRaises(ModelNotFound):
+            await TestModel(m.get_id()).find()
+
+        with self.assertRaises(ModelNotDeleted):
+            await m.save()
+
+    async def test_save__cascade(self):
+        global collection_name
+
+        TestModel, TestCollection = Entity("Test", {
+            "bases": AsyncModel,
+            "connection": "baemo_async",
+            "collection": collection_name,
+            "driver": AsyncDriver(),
+            "references": {
+                "r": {
+                    "entity": "Test",
+                    "type": "local_one"
+                }
+            }
+        })
+
+        child = TestModel()
+        await child.save()
+
+        m = TestModel()
+        m.set("r", child)
+        await m.save()
+
+        child.set("k", "v")
+        await m.save()
+
+        copy = await TestModel(child.get_id()).find()
+        self.assertEqual(copy.get("k"), "v")
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -4,6 +4,7 @@ import sys; sys.path.append("../")
 import unittest
 
 from baemo.projection import Projection
+from baemo.projection import CompiledProjection
 from baemo.exceptions import ProjectionMalformed
 from baemo.exceptions import ProjectionTypeMismatch
 
@@ -256,7 +257,105 @@ class TestProjection(unittest.TestCase):
         except (ProjectionMalformed, ProjectionTypeMismatch):
             self.fail("exception raised")
 
+    # compile
 
+    def test_compile(self):
+        p = Projection({"k1": 1, "k2": {"k3": 1}})
+        c = p.compile()
+        self.assertEqual(type(c), CompiledProjection)
+        self.assertEqual(c.get(), {"k1": 1, "k2": {"k3": 1}})
+
+
+class TestCompiledProjection(unittest.TestCase):
+
+    # compile
+
+    def test_compile(self):
+        c = CompiledProjection.compile({"k1": 1, "k2": {"k3": 1}})
+        self.assertEqual(c.type, "inclusive")
+        self.assertEqual(type(c["k2"]), CompiledProjection)
+        self.assertEqual(c.get(), {"k1": 1, "k2": {"k3": 1}})
+
+    def test_compile__memoized_by_content(self):
+        c1 = Projection({"k1": 1, "k2": {"k3": 1}}).compile()
+        c2 = CompiledProjection.compile({"k1": 1, "k2": {"k3": 1}})
+        self.assertIs(c1, c2)
+        self.assertEqual(hash(c1), hash(c2))
+
+    def test_compile__delimited_keys(self):
+        c = CompiledProjection.compile({"k1.k2": 0})
+        self.assertEqual(c.get(), {"k1": {"k2": 0}})
+        self.assertEqual(c.type, "exclusive")
+
+    def test_compile__raises_ProjectionMalformed(self):
+        with self.assertRaises(ProjectionMalformed) as cm:
+            CompiledProjection.compile({"k1": {"k2": "foo"}})
+        self.assertEqual(cm.exception.args, ("k1.k2", "foo"))
+
+    def test_compile__raises_ProjectionTypeMismatch(self):
+        with self.assertRaises(ProjectionTypeMismatch):
+            CompiledProjection.compile({"k1": 1, "k2": {"k3": 0}})
+
+    def test_compile__immutable(self):
+        c = CompiledProjection.compile({"k": 1})
+        with self.assertRaises(AttributeError):
+            c.type = "exclusive"
+        with self.assertRaises(TypeError):
+            c["k"] = 0
+
+    # has
+
+    def test_has(self):
+        c = CompiledProjection.compile({"k1": {"k2": 2}})
+        self.assertTrue(c.has("k1.k2"))
+        self.assertFalse(c.has("k1.k3"))
+        self.assertFalse(c.has("k1.k2.k3"))
+
+    # get
+
+    def test_get__key_param(self):
+        c = CompiledProjection.compile({"k1": {"k2": 2}})
+        self.assertEqual(c.get("k1"), {"k2": 2})
+        self.assertEqual(c.get("k1.k2"), 2)
+        self.assertEqual(c.get("k3", None), None)
+        with self.assertRaises(KeyError):
+            c.get("k3")
+
+    # flatten
+
+    def test_flatten(self):
+        c = CompiledProjection.compile({"k1": 1, "k2": 2, "k3": {"k4": 1}})
+        self.assertEqual(c.flatten(), {"k1": 1, "k2": 1, "k3": 1})
+        self.assertEqual(
+            CompiledProjection.compile({"k1": 0, "k2": 2}).flatten(),
+            {"k1": 0}
+        )
+
+    # merge
+
+    def test_merge(self):
+        c1 = CompiledProjection.compile({"k1": 1, "k2": 2, "k3": {"k4": 1}})
+        c2 = CompiledProjection.compile({"k2": -1, "k3": {"k5": 1}})
+        merged = c1.merge(c2)
+        self.assertEqual(merged.get(), {"k1": 1, "k3": {"k4": 1, "k5": 1}})
+        self.assertEqual(c1.get(), {"k1": 1, "k2": 2, "k3": {"k4": 1}})
+
+    def test_merge__memoized(self):
+        c = CompiledProjection.compile({"k1": 1})
+        self.assertIs(c.merge({"k2": 1}), c.merge(Projection({"k2": 1})))
+
+    def test_merge__raises_ProjectionTypeMismatch(self):
+        c = CompiledProjection.compile({"k1": 1})
+        with self.assertRaises(ProjectionTypeMismatch):
+            c.merge({"k2": 0})
+
+    # __eq__
+
+    def test___eq__(self):
+        c = CompiledProjection.compile({"k1": 1})
+        self.assertEqual(c, {"k1": 1})
+        self.assertEqual(c, Projection({"k1": 1}))
+        self.assertNotEqual(c, CompiledProjection.compile({"k1": 0}))
 
 
 if __name__ == "__main__":
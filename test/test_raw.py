@@ -0,0 +1,152 @@
+import sys; sys.path.append("../")
+
+import unittest
+import copy
+import bson
+
+from bson.raw_bson import RawBSONDocument
+
+from baemo.delimited import DelimitedDict
+from baemo.raw import RawDocument
+
+
+class TestRawDocument(unittest.TestCase):
+
+    def setUp(self):
+        self.data = {
+            "k1": "v",
+            "k2": {"k3": "v", "k4": [{"k5": "v"}]},
+            "k6": [1, 2]
+        }
+        self.raw = RawBSONDocument(bson.encode(self.data))
+
+    # __init__
+
+    def test___init____RawBSONDocument_param(self):
+        r = RawDocument(self.raw)
+        self.assertIs(r.raw, self.raw)
+        self.assertEqual(dict.__len__(r), 0)
+
+    def test___init____bytes_param(self):
+        r = RawDocument(bson.encode(self.data))
+        self.assertEqual(r, self.data)
+
+    def test___init____dict_param(self):
+        r = RawDocument(self.data)
+        self.assertIsNone(r.raw)
+        self.assertEqual(r, self.data)
+
+    def test___init____RawDocument_param__shares_raw(self):
+        r1 = RawDocument(self.raw)
+        r1["k1"]
+        r2 = RawDocument(r1)
+        self.assertIs(r2.raw, self.raw)
+        self.assertEqual(list(dict.keys(r2)), ["k1"])
+
+    # __getitem__
+
+    def test___getitem____decodes_value(self):
+        r = RawDocument(self.raw)
+        self.assertEqual(r["k2"], self.data["k2"])
+        self.assertEqual(type(r["k2"]), dict)
+        self.assertEqual(type(r["k2"]["k4"][0]), dict)
+        self.assertEqual(list(dict.keys(r)), ["k2"])
+        self.assertIs(r["k2"], r["k2"])
+
+    def test___getitem____raises_KeyError(self):
+        r = RawDocument(self.raw)
+        with self.assertRaises(KeyError):
+            r["foo"]
+
+    # __contains__
+
+    def test___contains__(self):
+        r = RawDocument(self.raw)
+        self.assertIn("k6", r)
+        self.assertNotIn("foo", r)
+        self.assertEqual(dict.__len__(r), 0)
+
+    # __len__
+
+    def test___len__(self):
+        r = RawDocument(self.raw)
+        self.assertEqual(len(r), 3)
+        self.assertEqual(dict.__len__(r), 0)
+
+    # __eq__
+
+    def test___eq__(self):
+        r = RawDocument(self.raw)
+        self.assertTrue(r == self.data)
+        self.assertTrue(self.data == RawDocument(self.raw))
+        self.assertTrue(RawDocument(self.raw) == RawDocument(self.raw))
+        self.assertFalse(r == {"k1": "v"})
+
+    # __deepcopy__
+
+    def test___deepcopy____returns_dict(self):
+        r = RawDocument(self.raw)
+        r["k2"]["k3"] = "foo"
+        c = copy.deepcopy(r)
+        self.assertEqual(type(c), dict)
+        self.assertEqual(c["k2"]["k3"], "foo")
+        self.assertEqual(c["k6"], [1, 2])
+        self.assertIsNot(c["k2"], r["k2"])
+        self.assertIsNotNone(r.raw)
+
+    # load
+
+    def test_load(self):
+        r = RawDocument(self.raw)
+        r["k2"]["k3"] = "foo"
+        r.load()
+        self.assertIsNone(r.raw)
+        self.assertEqual(list(dict.keys(r)), ["k1", "k2", "k6"])
+        self.assertEqual(r["k2"]["k3"], "foo")
+
+    def test_load__called_by_iteration(self):
+        r = RawDocument(self.raw)
+        self.assertEqual(list(r), ["k1", "k2", "k6"])
+        self.assertIsNone(r.raw)
+
+    # decode
+
+    def test_decode(self):
+        r = RawDocument(self.raw)
+        r["k1"]
+        data = r.decode()
+        self.assertEqual(type(data), dict)
+        self.assertEqual(data, self.data)
+        self.assertIsNot(data["k2"], r["k2"])
+
+    def test_decode__loaded(self):
+        r = RawDocument(self.raw).load()
+        data = r.decode()
+        self.assertEqual(type(data), dict)
+        self.assertEqual(data, self.data)
+
+    # writes
+
+    def test___setitem____loads_document(self):
+        r = RawDocument(self.raw)
+        r["k7"] = "v"
+        self.assertIsNone(r.raw)
+        self.assertEqual(len(r), 4)
+
+    def test___delitem____loads_document(self):
+        r = RawDocument(self.raw)
+        del r["k1"]
+        self.assertEqual(r, {"k2": self.data["k2"], "k6": [1, 2]})
+
+    # DelimitedDict
+
+    def test_DelimitedDict(self):
+        d = DelimitedDict(RawDocument(self.raw), expand=False)
+        self.assertEqual(d.get("k2.k3"), "v")
+        self.assertTrue(d.has("k6"))
+        self.assertEqual(list(dict.keys(d.__dict__)), ["k2", "k6"])
+        self.assertEqual(d.collapse(), DelimitedDict(self.data).collapse())
+
+
+if __name__ == "__main__":
+    unittest.main()
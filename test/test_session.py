@@ -0,0 +1,187 @@
+import sys; sys.path.append("../")
+
+import unittest
+import gc
+import pymongo
+
+from baemo.connection import Connections
+from baemo.entity import Entity
+from baemo.session import Session
+
+from baemo.exceptions import ModelNotFound
+
+
+class TestSession(unittest.TestCase):
+
+    def setUp(self):
+        global connection_name, collection_name, TestModel, TestCollection
+        connection_name = "baemo"
+        collection_name = "{}_{}".format(
+            self.__class__.__name__,
+            self._testMethodName
+        )
+
+        connection = pymongo.MongoClient(connect=False)[connection_name]
+        Connections.set(connection_name, connection)
+
+        TestModel, TestCollection = Entity("Test", {
+            "connection": connection_name,
+            "collection": collection_name
+        })
+
+    def tearDown(self):
+        global connection_name, collection_name
+        Connections.get(connection_name).drop_collection(collection_name)
+
+    # current
+
+    def test_current(self):
+        self.assertIsNone(Session.current())
+        with Session() as s1:
+            self.assertIs(Session.current(), s1)
+            with Session() as s2:
+                self.assertIs(Session.current(), s2)
+            self.assertIs(Session.current(), s1)
+        self.assertIsNone(Session.current())
+
+    # Model.find
+
+    def test_find__returns_found_model(self):
+        m = TestModel()
+        m.set("k", "v")
+        m.save()
+
+        with Session() as session:
+            m1 = TestModel(m.get_id()).find()
+
+            # the document is gone, the state of the model found before is
+            # shared
+            Connections.get(connection_name, collection_name).delete_many({})
+            m2 = TestModel(m.get_id()).find()
+
+            self.assertIs(m2.attributes, m1.attributes)
+            self.assertEqual(m2.get(), m1.get())
+            self.assertIn(m2, session)
+
+        with self.assertRaises(ModelNotFound):
+            TestModel(m.get_id()).find()
+
+    def test_find__populates_self(self):
+        m = TestModel()
+        m.set("k", "v")
+        m.save()
+
+        with Session():
+            m1 = TestModel(m.get_id()).find()
+
+            m2 = TestModel(m.get_id())
+            self.assertIs(m2.find(), m2)
+            self.assertEqual(m2.get(), {"_id": m.get_id(), "k": "v"})
+
+            # changes are seen by both models
+            m2.set("k", "foo")
+            self.assertEqual(m1.get("k"), "foo")
+
+    def test_find__no_session(self):
+        m = TestModel()
+        m.save()
+        self.assertIsNot(
+            TestModel(m.get_id()).find(),
+            TestModel(m.get_id()).find()
+        )
+
+    def test_find__projection_param(self):
+        m = TestModel()
+        m.set({"k1": "v", "k2": "v"})
+        m.save()
+
+        with Session():
+            m1 = TestModel(m.get_id()).find(projection={"k1": 1})
+            m2 = TestModel(m.get_id()).find()
+            m3 = TestModel(m.get_id()).find()
+
+        self.assertIsNot(m1.attributes, m2.attributes)
+        self.assertIs(m2.attributes, m3.attributes)
+        self.assertFalse(m1.has("k2"))
+        self.assertTrue(m2.has("k2"))
+
+    def test_find__delete_evicts_model(self):
+        m = TestModel()
+        m.save()
+
+        with Session() as session:
+            m1 = TestModel(m.get_id()).find()
+            m1.delete()
+            m1.save()
+            self.assertNotIn(m1, session)
+
+            with self.assertRaises(ModelNotFound):
+                TestModel(m.get_id()).find()
+
+    # Collection.find
+
+    def test_Collection_find__adds_models(self):
+        m = TestModel()
+        m.save()
+
+        with Session() as session:
+            c = TestCollection().find()
+            self.assertIn(c[0], session)
+            self.assertIs(
+                TestModel(m.get_id()).find().attributes,
+                c[0].attributes
+            )
+
+    # weak references
+
+    def test_models_are_weak_references(self):
+        m = TestModel()
+        m.save()
+
+        with Session() as session:
+            TestModel(m.get_id()).find()
+            gc.collect()
+            self.assertEqual(len(session), 0)
+
+    # evict
+
+    def test_evict(self):
+        m = TestModel()
+        m.save()
+
+        with Session() as session:
+            m1 = TestModel(m.get_id()).find()
+            session.evict(m1)
+            self.assertNotIn(m1, session)
+            self.assertIsNot(
+                TestModel(m.get_id()).find().attributes,
+                m1.attributes
+            )
+
+    def test_evict__id_param(self):
+        m = TestModel()
+        m.save()
+
+        with Session() as session:
+            m1 = TestModel(m.get_id()).find()
+            session.evict(TestModel, m.get_id())
+            self.assertNotIn(m1, session)
+
+    # clear
+
+    def test_clear(self):
+        m = TestModel()
+        m.save()
+
+        with Session() as session:
+            m1 = TestModel(m.get_id()).find()
+            session.clear()
+            self.assertEqual(len(session), 0)
+            self.assertIsNot(
+                TestModel(m.get_id()).find().attributes,
+                m1.attributes
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -8,6 +8,7 @@ from collections import OrderedDict
 from baemo.delimited import DelimitedDict
 from baemo.sort import Sort
 from baemo.sort import SortOperator
+from baemo.sort import CompiledSort
 from baemo.references import References
 from baemo.exceptions import SortMalformed
 
@@ -153,6 +154,11 @@ class TestSort(unittest.TestCase):
         s = Sort([("k1", 1), ("k2", 1)])
         self.assertEqual(Sort._flatten(s), [("k1", 1), ("k2", 1)])
 
+    def test__flatten__remove_param(self):
+        s = Sort([("k1.k2", 1), ("k1.k3", -1), ("k4", 1), ("k10", 1)])
+        r = Sort([("k1", 1), ("k4", 1)])
+        self.assertEqual(Sort._flatten(s, remove=r), [("k10", 1)])
+
     # flatten
 
     def test_flatten(self):
@@ -185,6 +191,80 @@ class TestSort(unittest.TestCase):
         with self.assertRaises(SortMalformed):
             s.validate()
 
+    # compile
+
+    def test_compile(self):
+        s = Sort([("k1.k2", 1), ("k3", -1)])
+        c = s.compile()
+        self.assertEqual(type(c), CompiledSort)
+        self.assertEqual(c.flatten(), [("k1.k2", 1), ("k3", -1)])
+
+
+class TestCompiledSort(unittest.TestCase):
+
+    # compile
+
+    def test_compile__memoized_by_content(self):
+        c1 = Sort([("k1", 1), ("k2", -1)]).compile()
+        c2 = CompiledSort.compile([("k1", 1), ("k2", -1)])
+        self.assertIs(c1, c2)
+        self.assertIsNot(c1, CompiledSort.compile([("k2", -1), ("k1", 1)]))
+
+    def test_compile__tuple_param(self):
+        self.assertEqual(CompiledSort.compile(("k", 1)).flatten(), [("k", 1)])
+
+    def test_compile__delimited_keys(self):
+        c = CompiledSort.compile([("k1.k2", 1), ("k3", 1), ("k1.k4", -1)])
+        self.assertEqual(
+            c.flatten(),
+            Sort([("k1.k2", 1), ("k3", 1), ("k1.k4", -1)]).flatten()
+        )
+
+    def test_compile__SortOperator_value(self):
+        s = Sort([("$natural", OrderedDict([("foo", 1)]))])
+        c = s.compile()
+        self.assertEqual(c.flatten(), s.flatten())
+        self.assertIs(c, Sort([("$natural", OrderedDict([("foo", 1)]))]).compile())
+
+    def test_compile__raises_SortMalformed(self):
+        with self.assertRaises(SortMalformed):
+            CompiledSort.compile([("k", "foo")])
+        with self.assertRaises(SortMalformed):
+            CompiledSort.compile([("k1.k2", 2)])
+
+    def test_compile__immutable(self):
+        c = CompiledSort.compile([("k", 1)])
+        with self.assertRaises(AttributeError):
+            c.items = ()
+
+    # flatten
+
+    def test_flatten__returns_copy(self):
+        c = CompiledSort.compile([("k", 1)])
+        c.flatten().append(("foo", 1))
+        self.assertEqual(c.flatten(), [("k", 1)])
+
+    def test_flatten__remove_param(self):
+        c = CompiledSort.compile(
+            [("k1.k2", 1), ("k1.k3", -1), ("k4", 1), ("k10", 1)]
+        )
+        r = Sort([("k1", 1), ("k4", 1)])
+        self.assertEqual(c.flatten(remove=r), [("k10", 1)])
+
+    # merge
+
+    def test_merge(self):
+        c = CompiledSort.compile([("k1.k2", 1), ("k3", 1)])
+        merged = c.merge([("k1.k4", -1), ("k3", -1)])
+        s = Sort([("k1.k2", 1), ("k3", 1)])
+        s.update([("k1.k4", -1), ("k3", -1)])
+        self.assertEqual(merged.flatten(), s.flatten())
+        self.assertEqual(c.flatten(), [("k1.k2", 1), ("k3", 1)])
+
+    def test_merge__memoized(self):
+        c = CompiledSort.compile([("k1", 1)])
+        self.assertIs(c.merge(("k2", 1)), c.merge(Sort([("k2", 1)])))
+
 
 if __name__ == "__main__":
     unittest.main()